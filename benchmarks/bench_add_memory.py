@@ -0,0 +1,69 @@
+"""
+Memory of the scan and walk of fds add as the number of files grows.
+
+The number of directories is fixed and only the number of files grows. The size tree kept for the
+whole add only holds the directories, so its memory stays flat, while a tree with every file in it
+(keep_files=True) grows with the files. Beyond the tree, the peak only holds the listings of the few
+directories being scanned or looked ahead at, so here it follows the size of the largest directory.
+
+    python benchmarks/bench_add_memory.py [--dirs 50] [--files 10000,20000,40000,80000]
+"""
+import argparse
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fds.services.scanner import ParallelScanner  # noqa: E402
+from fds.services.size_tree import SizeTree  # noqa: E402
+
+
+def make_tree(root: str, dirs: int, files: int) -> None:
+    for d in range(dirs):
+        directory = os.path.join(root, f"dir{d}")
+        os.makedirs(directory)
+        for f in range(files // dirs):
+            with open(os.path.join(directory, f"file{f}.bin"), "wb") as fp:
+                fp.write(b"x")
+
+
+def measure(root: str, keep_files: bool):
+    tracemalloc.start()
+    with ParallelScanner(1) as scanner:
+        tree = SizeTree.build(root, scanner=scanner, keep_files=keep_files)
+        # Only what the tree keeps, not the garbage of the scan
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+        walked = 0
+        for _, _, entries in scanner.walk_entries(root):
+            walked += len(entries)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del tree
+    return walked, retained, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dirs", type=int, default=50)
+    parser.add_argument("--files", default="10000,20000,40000,80000")
+    args = parser.parse_args()
+    print(f"{'files':>8} {'tree (dirs only)':>18} {'peak':>10} {'tree (with files)':>18} {'peak':>10}")
+    for files in map(int, args.files.split(",")):
+        root = tempfile.mkdtemp(prefix="fds-bench-")
+        try:
+            make_tree(root, args.dirs, files)
+            walked, dirs_only, dirs_only_peak = measure(root, keep_files=False)
+            _, with_files, with_files_peak = measure(root, keep_files=True)
+        finally:
+            shutil.rmtree(root)
+        print(f"{walked:>8} {dirs_only / 1024:>15.0f} KB {dirs_only_peak / 1024:>7.0f} KB "
+              f"{with_files / 1024:>15.0f} KB {with_files_peak / 1024:>7.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Latency of fds status with and without the fds daemon.
+
+Both are timed end to end, from a new fds process, against a stub repository with a few files
+(git init and dvc init --subdir). Without the daemon every run pays for starting python, importing fds
+and running git status and dvc status. With the daemon, the fds process only forwards the command.
+
+    python benchmarks/bench_daemon.py [--runs 10] [--files 100]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from bench_startup import get_env, make_stub_repo, wall_clock
+
+
+def fds(args, cwd):
+    subprocess.run([sys.executable, "-m", "fds.cli", *args], cwd=cwd, env=get_env(), check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--files", type=int, default=100)
+    args = parser.parse_args()
+    root = tempfile.mkdtemp(prefix="fds-bench-")
+    try:
+        if not make_stub_repo(root):
+            sys.exit("git and dvc are needed")
+        for i in range(args.files):
+            with open(os.path.join(root, f"file{i}.txt"), "w") as f:
+                f.write("x" * i)
+        cold = wall_clock(["status"], root, args.runs)
+        fds(["daemon", "start"], root)
+        try:
+            warm = wall_clock(["status"], root, args.runs)
+        finally:
+            fds(["daemon", "stop"], root)
+    finally:
+        shutil.rmtree(root)
+    print(f"fds status without daemon: {cold:.0f} ms")
+    print(f"fds status with daemon:    {warm:.0f} ms ({cold / warm:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Throughput of the parallel pre-hashing of large files, against plain dvc add.
+
+Hashing alone is timed with one job and with one job per core, in MB/s and MB/s per core busy hashing.
+Then the same files are added to a stub repository (git init and dvc init --subdir) three ways:
+the dvc executable, dvc in process without pre-hashing (FDS_PREHASH_JOBS=0) and dvc in process with it.
+Every add starts from an empty dvc cache and state. The files are read once beforehand, so every run
+reads them from the page cache: this measures the hashing, not the disk.
+
+    python benchmarks/bench_prehash.py [--files 4] [--size 256]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_startup import get_env, make_stub_repo  # noqa: E402
+from fds.services.dvc_backend import InProcessDvcBackend  # noqa: E402
+import fds.services.prehash as prehash  # noqa: E402
+from fds.services.prehash import PreHasher, md5_file  # noqa: E402
+from fds.services.repo_root import invalidate_repo_roots  # noqa: E402
+
+BLOCK = 1024 * 1024
+
+
+def make_files(root: str, files: int, size: int) -> list:
+    paths = []
+    block = os.urandom(BLOCK)
+    for i in range(files):
+        path = os.path.join(root, f"data{i}.bin")
+        with open(path, "wb") as f:
+            # Different contents in every file, so that none of them is already in the cache
+            f.write(i.to_bytes(8, "little"))
+            for _ in range(size):
+                f.write(block)
+        paths.append(path)
+    return paths
+
+
+def reset(root: str) -> None:
+    """
+    Untrack the files again, with an empty cache and state
+    """
+    for name in os.listdir(root):
+        if name.endswith(".bin.dvc") or name == ".gitignore":
+            os.remove(os.path.join(root, name))
+    for name in ("cache", "tmp"):
+        shutil.rmtree(os.path.join(root, ".dvc", name), ignore_errors=True)
+
+
+def timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def in_process_add(paths: list) -> None:
+    backend = InProcessDvcBackend()
+    try:
+        backend.add([os.path.basename(path) for path in paths])
+    finally:
+        backend.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--size", type=int, default=256, help="size of every file, in MB")
+    args = parser.parse_args()
+    cores = os.cpu_count() or 1
+    root = tempfile.mkdtemp(prefix="fds-bench-")
+    cwd = os.getcwd()
+    try:
+        if not make_stub_repo(root):
+            sys.exit("git and dvc are needed")
+        paths = make_files(root, args.files, args.size)
+        total = args.files * args.size
+        for path in paths:
+            md5_file(path)
+
+        print(f"{args.files} files of {args.size} MB, {cores} cores")
+        for jobs in sorted({1, cores}):
+            duration = timed(lambda: PreHasher(jobs=jobs, min_size=0).hash_files(paths))
+            busy = min(jobs, cores, args.files)
+            print(f"hashing, {jobs} jobs: {total / duration:.0f} MB/s, {total / duration / busy:.0f} MB/s per core")
+
+        os.chdir(root)
+        invalidate_repo_roots()
+        results = []
+        reset(root)
+        results.append(("dvc add", timed(lambda: subprocess.run(
+            ["dvc", "add", "-q", *[os.path.basename(path) for path in paths]], env=get_env(), check=True))))
+        for name, jobs in (("in process, without pre-hashing", 0), ("in process, pre-hashed", cores)):
+            reset(root)
+            # What FDS_PREHASH_JOBS sets
+            prehash.PREHASH_JOBS = jobs
+            results.append((name, timed(lambda: in_process_add(paths))))
+        for name, duration in results:
+            print(f"{name}: {duration:.2f} s, {total / duration:.0f} MB/s")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
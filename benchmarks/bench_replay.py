@@ -0,0 +1,77 @@
+"""
+Time spent in fds itself, apart from git and dvc.
+
+Every command is run once with FDS_TRACE, recording the git and dvc commands it runs, then timed with FDS_REPLAY,
+which answers those commands from the trace instantly. The replayed runs only do what fds decides, so they
+are deterministic, and compared to the real runs they show how much of a command is git and dvc.
+Both run against a stub repository (git init and dvc init --subdir) with small and large files.
+
+    python benchmarks/bench_replay.py [--runs 5] [--files 200]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from bench_startup import get_env, make_stub_repo
+
+COMMANDS = [
+    ["status"],
+    ["status", "--json"],
+]
+
+
+def fds(args: List[str], cwd: str, env: Optional[Dict[str, str]] = None) -> float:
+    """
+    :return: the wall clock time of running fds, in milliseconds
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "fds.cli", *args], cwd=cwd, env={**get_env(), **(env or {})},
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def read_trace(path: str) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--files", type=int, default=200)
+    args = parser.parse_args()
+    root = tempfile.mkdtemp(prefix="fds-bench-")
+    traces = tempfile.mkdtemp(prefix="fds-traces-")
+    try:
+        if not make_stub_repo(root):
+            sys.exit("git and dvc are needed")
+        for i in range(args.files):
+            with open(os.path.join(root, f"file{i}.txt"), "wb") as f:
+                f.write(os.urandom(20 * 1024 if i % 10 == 0 else 100))
+        for command in COMMANDS:
+            trace = os.path.join(traces, f"{'_'.join(command)}.jsonl")
+            # Warm the toolchain cache, so the recorded run runs the same commands as the replayed ones
+            fds(command, root)
+            fds(command, root, {"FDS_TRACE": trace})
+            recorded = read_trace(trace)
+            real = statistics.median(fds(command, root) for _ in range(args.runs))
+            replayed = statistics.median(fds(command, root, {"FDS_REPLAY": trace}) for _ in range(args.runs))
+            print(f"fds {' '.join(command)}: {real:.0f} ms, {replayed:.0f} ms without git and dvc")
+            for record in recorded:
+                shown = record["command"] if isinstance(record["command"], str) else " ".join(record["command"])
+                print(f"  {shown}: {record['duration']:.0f} ms, exit code {record['returncode']}, "
+                      f"{record['stdout_size']} bytes of output")
+    finally:
+        shutil.rmtree(root)
+        shutil.rmtree(traces)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Cold start of the fds CLI.
+
+Every run is a new interpreter, as when fds is run from a shell. The imports are timed with
+python -X importtime, and fds --help and fds status are timed end to end against a stub repository
+(git init and dvc init --subdir, without files). fds status also pays for git and dvc themselves.
+
+Exits with 1 when a budget is exceeded, or when importing fds.cli (all that fds --help needs)
+loads one of the modules only some commands need. The budgets are in milliseconds and depend on the machine.
+
+    python benchmarks/bench_startup.py [--runs 5] [--import-budget 150] [--help-budget 400] [--status-budget 4000]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules which fds --help must not import
+LAZY_MODULES = ("fds.run", "requests", "humanize", "yaml", "colorama", "asyncio", "sqlite3")
+
+
+def get_env() -> Dict[str, str]:
+    return {**os.environ, "PYTHONPATH": ROOT, "FDS_NO_UPDATE_CHECK": "1"}
+
+
+def import_times(module: str) -> Dict[str, int]:
+    """
+    :return: the cumulative import time of every module imported by importing the module, in microseconds
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], env=get_env(),
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def wall_clock(args: List[str], cwd: str, runs: int) -> float:
+    """
+    :return: the median wall clock time of running fds with the arguments, in milliseconds
+    """
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "fds.cli", *args], cwd=cwd, env=get_env(),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def make_stub_repo(root: str) -> bool:
+    """
+    :return: whether the repository could be made, git and dvc are needed
+    """
+    if shutil.which("git") is None or shutil.which("dvc") is None:
+        return False
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+    subprocess.run(["dvc", "init", "-q", "--subdir"], cwd=root, check=True)
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget", type=float, default=150)
+    parser.add_argument("--help-budget", type=float, default=400)
+    parser.add_argument("--status-budget", type=float, default=4000)
+    args = parser.parse_args()
+    failures = []
+
+    # Warm the bytecode cache, only the first run ever would pay for compiling
+    import_times("fds.run")
+    times = import_times("fds.cli")
+    import_ms = times["fds.cli"] / 1000
+    print(f"import fds.cli: {import_ms:.0f} ms")
+    slowest = sorted(((cumulative, name) for name, cumulative in times.items() if name.startswith("fds")), reverse=True)
+    for cumulative, name in slowest[:5]:
+        print(f"  {name}: {cumulative / 1000:.1f} ms")
+    if import_ms > args.import_budget:
+        failures.append(f"import fds.cli took {import_ms:.0f} ms, budget {args.import_budget:.0f} ms")
+    eager = [module for module in LAZY_MODULES if module in times]
+    if eager:
+        failures.append(f"import fds.cli imports {', '.join(eager)}")
+    run_ms = import_times("fds.run")["fds.run"] / 1000
+    print(f"import fds.run: {run_ms:.0f} ms")
+
+    root = tempfile.mkdtemp(prefix="fds-bench-")
+    try:
+        help_ms = wall_clock(["--help"], root, args.runs)
+        print(f"fds --help: {help_ms:.0f} ms")
+        if help_ms > args.help_budget:
+            failures.append(f"fds --help took {help_ms:.0f} ms, budget {args.help_budget:.0f} ms")
+        if make_stub_repo(root):
+            status_ms = wall_clock(["status"], root, args.runs)
+            print(f"fds status: {status_ms:.0f} ms")
+            if status_ms > args.status_budget:
+                failures.append(f"fds status took {status_ms:.0f} ms, budget {args.status_budget:.0f} ms")
+        else:
+            print("fds status: skipped, git and dvc are needed")
+    finally:
+        shutil.rmtree(root)
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
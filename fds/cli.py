@@ -2,11 +2,9 @@ import argparse
 import logging
 import sys
 
+from fds.domain.commands import Commands
 from fds.logger import Logger
 
-# Argument parser stuff
-from fds.run import Run
-from fds.services.pretty_print import PrettyPrint
 
 arg_parser = argparse.ArgumentParser(description="One command for all your git and dvc needs",
                                      prog="fds")
@@ -18,10 +16,25 @@ parser_init = command_subparser.add_parser('init', help='initialize a git and dv
 
 # status
 parser_status = command_subparser.add_parser('status', help='get status of your git and dvc repository')
+parser_status.add_argument('targets', help="only check these files/folders", nargs='*')
+parser_status.add_argument('--json', help="print the status as json", action="store_true", default=False)
 
 # add
 parser_add = command_subparser.add_parser('add', help='add files/folders to git and dvc repository')
-parser_add.add_argument('add_command', help="choose what to add using . will add everything", nargs='+')
+parser_add.add_argument('add_command', help="choose what to add using . will add everything", nargs='*')
+parser_add.add_argument('--rebuild-index', help="ignore the scan index in .fds and rescan everything",
+                        action="store_true", default=False)
+parser_add.add_argument('-j', '--jobs', help="number of threads scanning the workspace, default $FDS_JOBS or 8",
+                        type=int, default=None)
+parser_add.add_argument('--auto', help="don't prompt, use the rules of .fds.yaml and its default action",
+                        action="store_true", default=False)
+parser_add.add_argument('--forget', help="forget the skip/ignore/git decisions of previous adds for these paths",
+                        nargs='+', metavar="PATH", default=None)
+parser_add_plan_grp = parser_add.add_mutually_exclusive_group()
+parser_add_plan_grp.add_argument('--plan', help="only scan and write the suggested decisions to a json file",
+                                 metavar="PLAN_FILE", default=None)
+parser_add_plan_grp.add_argument('--apply', help="execute the decisions of a file written by --plan, without scanning",
+                                 metavar="PLAN_FILE", default=None)
 
 # COMMIT
 parser_commit = command_subparser.add_parser('commit', help='commits added changes to git and dvc repository',
@@ -45,6 +58,8 @@ parser_push.add_argument(
     help="A git branch that you want to push to (accepts refspec), defaults to current branch",
     nargs='?'
 )
+parser_push.add_argument('--parallel', help="push to git and dvc at the same time, credentials are asked for after",
+                         action="store_true", default=False)
 # save
 parser_save = command_subparser.add_parser(
     'save',
@@ -53,6 +68,12 @@ parser_save = command_subparser.add_parser(
 parser_save.add_argument('-gr', '--git-remote', help="git remote name, default 'origin'", default="origin")
 parser_save.add_argument('-dr', '--dvc-remote', help="dvc remote name, default 'origin'", default="origin")
 parser_save.add_argument('message', help="save message")
+parser_save.add_argument('--rebuild-index', help="ignore the scan index in .fds and rescan everything",
+                         action="store_true", default=False)
+parser_save.add_argument('-j', '--jobs', help="number of threads scanning the workspace, default $FDS_JOBS or 8",
+                         type=int, default=None)
+parser_save.add_argument('--auto', help="don't prompt, use the rules of .fds.yaml and its default action",
+                         action="store_true", default=False)
 
 # clone
 parser_clone = command_subparser.add_parser('clone', help='clone git repository and pull dvc repository based on '
@@ -61,10 +82,27 @@ parser_clone.add_argument('url', help="url of the git repository")
 parser_clone.add_argument('folder_name', nargs="*", help="Optional folder name to clone into", default=[None])
 parser_clone.add_argument('-dr', '--dvc-remote', help="Optional DVC remote name", default="origin")
 
+# ignore
+parser_ignore = command_subparser.add_parser('ignore', help='maintain the .gitignore and .dvcignore files')
+parser_ignore.add_argument('--compact', help="collapse many ignored siblings into a directory or glob pattern",
+                           action="store_true", default=False)
+parser_ignore.add_argument('-y', "--yes", help="Don't ask for confirmation for every compaction",
+                           action="store_true", default=False)
+
+# daemon
+parser_daemon = command_subparser.add_parser('daemon', help='keep fds loaded for this repository, '
+                                                            'so that fds status answers faster')
+parser_daemon.add_argument('action', help="start, stop or show the daemon of this repository",
+                           choices=["start", "stop", "status"])
+
 # argument for log level
 arg_parser.add_argument("-v", "--verbose", help="set log level to DEBUG",
                         action="store_true", default=False)
 
+# argument for dry run
+arg_parser.add_argument("--dry-run", help="print the git and dvc commands which would change something, "
+                                          "instead of running them", action="store_true", default=False)
+
 # argument for version
 arg_parser.add_argument("-V", "--version", help="Show current version",
                         action="store_true", default=False)
@@ -79,6 +117,16 @@ def main(args=None):
     if args is None:
         args = sys.argv[1:]
     parsed_args = parse_args(args=args)
+    if parsed_args["command"] == Commands.STATUS.value and not parsed_args["verbose"] and not parsed_args["version"] \
+            and not parsed_args["dry_run"]:
+        # Answered by the daemon of the repository, if one is running
+        from fds.services.daemon import forward
+        result = forward(args)
+        if result is not None:
+            sys.exit(result)
+    # Imported once the arguments are parsed, so that --help doesn't pay for them
+    from fds.run import Run
+    from fds.services.pretty_print import PrettyPrint
     printer = PrettyPrint()
     if bool(parsed_args["verbose"]):
         Logger.set_logging_level(logging.DEBUG)
@@ -10,6 +10,8 @@ class Commands(Enum):
     PUSH = "push"
     SAVE = "save"
     CLONE = "clone"
+    IGNORE = "ignore"
+    DAEMON = "daemon"
     VERSION = "version"
 
 
@@ -1,3 +1,32 @@
 import os
 
 MAX_THRESHOLD_SIZE = int(os.getenv('MAX_THRESHOLD_SIZE', 10 * 1024 * 1024))  # 10 MB
+# How ignore rules are evaluated: inprocess, subprocess (git/dvc check-ignore) or verify (both, reporting differences)
+IGNORE_CHECK_MODE = os.getenv('FDS_IGNORE_CHECK', 'inprocess')
+# Trust the mtime of unchanged directories in the scan index, without lstat-ing their files (for network filesystems)
+SCAN_INDEX_TRUST_MTIME = os.getenv('FDS_INDEX_TRUST_MTIME', '').lower() in ('1', 'true', 'yes')
+# Number of threads listing and stat-ing directories in parallel, overridden by --jobs
+SCAN_JOBS = int(os.getenv('FDS_JOBS', 8))
+# Number of walk steps of fds add prepared in the background while waiting for the user
+PREFETCH_SIZE = int(os.getenv('FDS_PREFETCH', 64))
+# Size limit of the arguments of a single command, in bytes (0 uses the limit of the system)
+ARG_MAX = int(os.getenv('FDS_ARG_MAX', 0))
+# Don't look up the latest version of fds on PyPI
+NO_UPDATE_CHECK = os.getenv('FDS_NO_UPDATE_CHECK', '').lower() in ('1', 'true', 'yes')
+# Seconds the latest version of fds found on PyPI is remembered, failures to reach PyPI included
+UPDATE_CHECK_TTL = int(os.getenv('FDS_UPDATE_CHECK_TTL', 24 * 60 * 60))
+# Seconds the fds daemon waits for a command before it stops
+DAEMON_IDLE_TIMEOUT = int(os.getenv('FDS_DAEMON_IDLE_TIMEOUT', 30 * 60))
+# How dvc commands are run: auto (in process if the importable dvc is the same version as the dvc executable),
+# inprocess or subprocess
+DVC_BACKEND = os.getenv('FDS_DVC_BACKEND', 'auto')
+# Append every git and dvc command fds runs, with its duration and result, to this JSONL file
+TRACE_FILE = os.getenv('FDS_TRACE')
+# Answer the git and dvc commands from this file written with FDS_TRACE, instead of running them
+REPLAY_FILE = os.getenv('FDS_REPLAY')
+# Files at least this large are hashed in parallel before dvc add, which then reuses their hashes
+PREHASH_MIN_SIZE = int(os.getenv('FDS_PREHASH_MIN_SIZE', 16 * 1024 * 1024))  # 16 MB
+# Number of files hashed at the same time before dvc add, one per core if not set, 0 leaves the hashing to dvc
+PREHASH_JOBS = int(os.environ['FDS_PREHASH_JOBS']) if os.getenv('FDS_PREHASH_JOBS') else None
+# Bytes hashed at once by the pre-hashing
+PREHASH_CHUNK_SIZE = int(os.getenv('FDS_PREHASH_CHUNK_SIZE', 8 * 1024 * 1024))  # 8 MB
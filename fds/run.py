@@ -1,17 +1,20 @@
 import enum
-from shutil import which
-import requests
 from pathlib import Path
 import sys
+from typing import List
 
 from fds.domain.commands import Commands
 from fds.logger import Logger
 from fds.services.dvc_service import DVCService
+from fds.services.executor import Executor, get_executor
 from fds.services.fds_service import FdsService
-from fds.services.types import InnerService
+from fds.services.types import AddOptions, InnerService
 from fds.services.git_service import GitService
+from fds.services.hook_scheduler import Hook, HookScheduler
 from fds.services.pretty_print import PrettyPrint
-from fds.utils import execute_command, rerun_in_new_shell_and_exit, get_confirm_from_user
+from fds.services.toolchain import Toolchain
+from fds.services.update_check import UpdateCheck
+from fds.utils import execute_command, get_confirm_from_user
 from .version import __version__
 
 
@@ -33,23 +36,43 @@ class HooksRunner(object):
         self.service = service
         self.printer = printer
         self.logger = logger
+        self.update_checker = UpdateCheck()
+        self.toolchain = Toolchain.get()
+        self.scheduler = HookScheduler(logger)
 
+        # Runs after the command, the latest version is looked up in the background meanwhile
         self.update_check = [
-            (self.ExitCodes.FDS_UPDATE_FAILED.value, self._ensure_fds_updated)
+            Hook("fds_updated", self.ExitCodes.FDS_UPDATE_FAILED.value, self._is_fds_updated, self._ensure_fds_updated),
         ]
 
         self.pre_git_dvc_hooks = [
-            (self.ExitCodes.DVC_INSTALL_FAILED.value, self._ensure_dvc_installed),
-            (self.ExitCodes.GIT_INSTALL_FAILED.value, self._ensure_git_installed),
+            Hook("dvc_installed", self.ExitCodes.DVC_INSTALL_FAILED.value, self._is_dvc_installed,
+                 self._ensure_dvc_installed),
+            Hook("git_installed", self.ExitCodes.GIT_INSTALL_FAILED.value, self._is_git_installed,
+                 self._ensure_git_installed),
         ]
 
+        # Can be run along with pre_git_dvc_hooks, they are only ensured if git and dvc are installed
         self.pre_execute_hooks = [
-            (self.ExitCodes.GIT_INITIALIZE_FAILED.value, self._ensure_git_initialized),
-            (self.ExitCodes.DVC_INITIALIZE_FAILED.value, self._ensure_dvc_initialized),
+            Hook("git_initialized", self.ExitCodes.GIT_INITIALIZE_FAILED.value,
+                 self.service.git_service.is_initialized, self._ensure_git_initialized,
+                 after=("dvc_installed", "git_installed")),
+            Hook("dvc_initialized", self.ExitCodes.DVC_INITIALIZE_FAILED.value,
+                 self.service.dvc_service.is_initialized, self._ensure_dvc_initialized,
+                 after=("dvc_installed", "git_installed", "git_initialized")),
         ]
 
+    def _is_dvc_installed(self):
+        return self.toolchain.find("dvc") is not None
+
+    def _is_git_installed(self):
+        return self.toolchain.find("git") is not None
+
+    def _is_fds_updated(self):
+        return self.update_checker.get_newer_version(__version__) is None
+
     def _ensure_dvc_installed(self):
-        if which("dvc") is not None:
+        if self._is_dvc_installed():
             return 0
 
         ret_code = 1
@@ -66,16 +89,26 @@ class HooksRunner(object):
         return ret_code
 
     def _ensure_git_installed(self):
-        if which("git") is None:
+        if not self._is_git_installed():
             self.printer.error("git executable is not found, please install git from https://git-scm.com/downloads")
             return sys.exit(-1)
         return 0
 
+    def start_update_check(self):
+        self.update_checker.start()
+
+    @staticmethod
+    def can_offer_update(as_json: bool) -> bool:
+        """
+        The update is offered with a prompt on stdout, so not when another program reads the output,
+        or when nobody is there to answer
+        :param as_json: The command prints json, e.g. for dashboards
+        """
+        return not as_json and all(stream is not None and stream.isatty() for stream in (sys.stdin, sys.stdout))
+
     def _ensure_fds_updated(self):
-        r = requests.get("https://pypi.python.org/pypi/fastds/json")
-        data = r.json()
-        latest_version = data["info"]["version"]
-        if latest_version == __version__:
+        latest_version = self.update_checker.get_newer_version(__version__)
+        if latest_version is None:
             return 0
         answer = get_confirm_from_user(f"You are using fds version {__version__}, however version {latest_version}"
                                        f" is available.Should we upgrade using `pip3 install fastds --upgrade`", True)
@@ -84,8 +117,7 @@ class HooksRunner(object):
 
         print("\nUpgrading package.\n")
         execute_command(["pip3 install fastds --upgrade"], shell=True, capture_output=False)
-        print("\nfds upgraded. Running command...\n")
-        rerun_in_new_shell_and_exit()
+        print("\nfds upgraded.\n")
         return 0
 
     def __ensure_initialized(
@@ -118,21 +150,20 @@ class HooksRunner(object):
     def _ensure_dvc_initialized(self):
         return self.__ensure_initialized("dvc", self.service.dvc_service)
 
-    def run(self, hooks):
-        # Check if dvc is installed
-        ret_code = 0
-        for exit_code, hook in hooks:
-            self.logger.debug(f"Running {hook.__qualname__}")
-            failed = hook()
-            if failed:
-                ret_code |= exit_code
-        return ret_code
+    def run(self, hooks: List[Hook]) -> int:
+        """
+        Run hooks, checking them at the same time and ensuring them one at a time
+        :return: the exit codes of the failed hooks, or-ed together
+        """
+        return self.scheduler.run(hooks)
 
 
 class Run(object):
     def __init__(self, arguments: dict):
         self.logger = Logger.get_logger("fds.Run")
         self.arguments = arguments
+        if arguments.get("dry_run"):
+            Executor.set(get_executor(dry_run=True))
         self.service = FdsService(GitService(), DVCService())
         self.printer = PrettyPrint()
         self.hooks_runner = HooksRunner(
@@ -141,23 +172,46 @@ class Run(object):
             self.logger,
         )
 
+    @staticmethod
+    def __get_add_options(arguments: dict) -> AddOptions:
+        return AddOptions(
+            rebuild_index=arguments.get("rebuild_index", False),
+            jobs=arguments.get("jobs"),
+            auto=arguments.get("auto", False),
+            plan=arguments.get("plan"),
+            apply=arguments.get("apply"),
+        )
+
     def execute(self):
         arguments = self.arguments
         self.logger.debug(f"arguments passed: {arguments}")
 
+        offer_update = self.hooks_runner.can_offer_update(arguments.get("json", False))
+        if offer_update:
+            self.hooks_runner.start_update_check()
+        try:
+            ret_code = self.__execute_command()
+        finally:
+            self.service.dvc_service.close()
+        if ret_code == 0 and offer_update:
+            # Only offered once the command is done, if the latest version is known by then
+            self.hooks_runner.run(self.hooks_runner.update_check)
+        return ret_code
+
+    def __execute_command(self):
+        arguments = self.arguments
         # No need to run any hooks
         if arguments.get(Commands.VERSION.value):
             self.service.version()
-            # Do version check after showing the version
-            self.hooks_runner.run(self.hooks_runner.update_check)
             return 0
 
-        hook_ret_code = self.hooks_runner.run(self.hooks_runner.update_check)
-        if hook_ret_code != 0:
-            return hook_ret_code
-
-        # Run pre execute hooks pre git and dvc init hooks
-        hook_ret_code = self.hooks_runner.run(self.hooks_runner.pre_git_dvc_hooks)
+        if arguments["command"] in (Commands.INIT.value, Commands.CLONE.value):
+            # Run pre execute hooks pre git and dvc init hooks
+            hooks = self.hooks_runner.pre_git_dvc_hooks
+        else:
+            # Checked at the same time, ensured after git and dvc are installed
+            hooks = self.hooks_runner.pre_git_dvc_hooks + self.hooks_runner.pre_execute_hooks
+        hook_ret_code = self.hooks_runner.run(hooks)
         if hook_ret_code != 0:
             return hook_ret_code
         if arguments["command"] == Commands.INIT.value:
@@ -169,18 +223,18 @@ class Run(object):
             self.service.clone(arguments["url"], arguments["folder_name"][0], arguments["dvc_remote"])
             return 0
 
-        # Run pre execute hooks After git and dvc are initialized
-        hook_ret_code = self.hooks_runner.run(self.hooks_runner.pre_execute_hooks)
-        if hook_ret_code != 0:
-            return hook_ret_code
-
         if arguments["command"] == Commands.STATUS.value:
             # Run status command stuff
-            self.service.status()
+            self.service.status(arguments.get("targets"), arguments.get("json", False))
             return 0
         elif arguments["command"] == Commands.ADD.value:
             # Run add command stuff
-            self.service.add(arguments["add_command"])
+            if arguments.get("forget"):
+                self.service.forget(arguments["forget"])
+                return 0
+            if not arguments["add_command"] and arguments.get("apply") is None:
+                raise Exception("Choose what to add, using . will add everything")
+            self.service.add(arguments["add_command"], self.__get_add_options(arguments))
             return 0
         elif arguments["command"] == Commands.COMMIT.value:
             if len(arguments.get("message", [])) == 1:
@@ -194,11 +248,21 @@ class Run(object):
             return 0
         elif arguments["command"] == Commands.PUSH.value:
             # Run push command stuff
-            self.service.push(arguments["git_remote"], arguments["dvc_remote"], arguments["branch"])
+            self.service.push(arguments["git_remote"], arguments["dvc_remote"], arguments["branch"],
+                              arguments.get("parallel", False))
+            return 0
+        elif arguments["command"] == Commands.IGNORE.value:
+            if not arguments.get("compact"):
+                raise Exception("Nothing to do, use fds ignore --compact")
+            self.service.compact_ignores(arguments["yes"])
+            return 0
+        elif arguments["command"] == Commands.DAEMON.value:
+            self.service.daemon(arguments["action"])
             return 0
         elif arguments["command"] == Commands.SAVE.value:
             # Run save command stuff
-            self.service.save(arguments["message"], arguments["git_remote"], arguments["dvc_remote"])
+            self.service.save(arguments["message"], arguments["git_remote"], arguments["dvc_remote"],
+                              self.__get_add_options(arguments))
             return 0
         else:
             raise Exception("Invalid operation")
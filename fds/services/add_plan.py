@@ -0,0 +1,82 @@
+import json
+import os
+from dataclasses import dataclass, asdict, field
+from typing import List, Optional
+
+from fds.services.rules import ACTIONS
+from fds.utils import write_file_atomically
+
+# Step Into is not a decision, the walk of the plan already looked at what is inside
+PLAN_ACTIONS = [action for action in ACTIONS if action != "step_into"]
+
+
+@dataclass
+class PlanCandidate:
+    # Path relative to the repository root, `/` separated
+    path: str
+    # file or dir
+    type: str
+    size: int
+    file_count: Optional[int]
+    # One of PLAN_ACTIONS
+    action: str
+
+
+@dataclass
+class AddPlan:
+    """
+    Decisions of fds add, written by `fds add --plan` and executed by `fds add --apply`
+    """
+    # The paths given to fds add, relative to the repository root
+    paths: List[str]
+    threshold: int
+    # Largest first
+    candidates: List[PlanCandidate] = field(default_factory=list)
+
+    VERSION = 1
+
+    def get_paths(self, repo_path: str) -> List[str]:
+        """
+        The paths given to fds add, relative to the current directory
+        """
+        return [os.path.relpath(os.path.join(repo_path, path)) for path in self.paths]
+
+    def rank(self) -> None:
+        self.candidates.sort(key=lambda candidate: (-candidate.size, candidate.path))
+
+    def save(self, filename: str) -> None:
+        """
+        Write the plan as json, atomically so a failed write never leaves half a plan behind
+        :param filename: The file to write to
+        """
+        data = {"version": self.VERSION, "paths": self.paths, "threshold": self.threshold,
+                "candidates": [asdict(candidate) for candidate in self.candidates]}
+        write_file_atomically(filename, json.dumps(data, indent=2) + "\n")
+
+    @classmethod
+    def load(cls, filename: str) -> 'AddPlan':
+        """
+        Read a plan, checking the (possibly hand edited) actions
+        :param filename: The file written by `fds add --plan`
+        :return: AddPlan
+        """
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise Exception(f"Can't read the plan {filename}: {e}")
+        if not isinstance(data, dict) or data.get("version") != cls.VERSION:
+            raise Exception(f"{filename} is not a plan written by this version of fds add --plan")
+        try:
+            candidates = [PlanCandidate(**candidate) for candidate in data["candidates"]]
+            plan = cls(list(data["paths"]), int(data["threshold"]), candidates)
+        except (KeyError, TypeError, ValueError) as e:
+            raise Exception(f"{filename} is not a valid plan: {e}")
+        for candidate in plan.candidates:
+            if candidate.action == "step_into":
+                # Its contents are not in the plan, the git add which follows would take all of it
+                raise Exception(f"{filename}: {candidate.path} can't be stepped into when applying, "
+                                f"run fds add --plan on it to plan what is inside")
+            if candidate.action not in PLAN_ACTIONS:
+                raise Exception(f"{filename}: action of {candidate.path} should be one of {PLAN_ACTIONS}")
+        return plan
@@ -0,0 +1,97 @@
+import os
+import sys
+from typing import Callable, Iterator, List, Optional, Sequence
+
+from fds.domain.constants import ARG_MAX
+from fds.logger import Logger
+from fds.utils import execute_command
+
+# Room left for what the kernel counts besides the arguments, e.g. the auxiliary vector
+_ARG_MAX_HEADROOM = 4096
+# Windows limits the whole command line to 32767 characters
+_WINDOWS_ARG_MAX = 32767
+# Linux also limits every single argument to 32 pages
+_MAX_ARG_STRLEN = 32 * 4096
+
+
+def get_arg_max() -> int:
+    """
+    Number of bytes the arguments of a command can take, what the environment takes is left out
+    :return: the limit, FDS_ARG_MAX if set
+    """
+    if ARG_MAX > 0:
+        return ARG_MAX
+    if sys.platform == "win32":
+        return _WINDOWS_ARG_MAX
+    try:
+        arg_max = os.sysconf("SC_ARG_MAX")
+    except (AttributeError, ValueError, OSError):
+        arg_max = -1
+    if arg_max <= 0:
+        # The POSIX minimum
+        arg_max = 4096
+    env_size = sum(_get_arg_size(f"{key}={value}") for key, value in os.environ.items())
+    return max(arg_max - env_size - _ARG_MAX_HEADROOM, 1024)
+
+
+def _get_arg_size(arg: str) -> int:
+    # The string, its NUL terminator and its pointer in argv
+    return len(os.fsencode(arg)) + 1 + 8
+
+
+def chunk_arguments(command: Sequence[str], args: Sequence[str], trailing: Sequence[str] = (),
+                    limit: Optional[int] = None) -> Iterator[List[str]]:
+    """
+    Split the arguments of a command so that every invocation stays below the argument size limit
+    :param command: The command and its options, repeated in every invocation
+    :param args: The arguments to split
+    :param trailing: Arguments repeated at the end of every invocation, e.g. pathspec excludes
+    :param limit: Size limit of an invocation, defaults to get_arg_max()
+    :return: iterator of the arguments of every invocation, at least one argument each
+    """
+    if limit is None:
+        limit = get_arg_max()
+    fixed = sum(_get_arg_size(arg) for arg in command) + sum(_get_arg_size(arg) for arg in trailing)
+    chunk: List[str] = []
+    chunk_size = fixed
+    for arg in args:
+        arg_size = _get_arg_size(arg)
+        if arg_size > _MAX_ARG_STRLEN or fixed + arg_size > limit:
+            raise Exception(f"Path is too long to be passed to {command[0]}: {arg[:100]}...")
+        if chunk and chunk_size + arg_size > limit:
+            yield chunk
+            chunk, chunk_size = [], fixed
+        chunk.append(arg)
+        chunk_size += arg_size
+    if chunk:
+        yield chunk
+
+
+def execute_in_chunks(command: List[str], args: Sequence[str], trailing: Sequence[str] = (),
+                      report: Optional[Callable[[str], None]] = None, capture_output: bool = True) -> None:
+    """
+    Run a command on many arguments, in as few invocations as the argument size limit allows.
+    A failing invocation doesn't stop the next ones, the failures are raised together at the end
+    :param command: The command and its options
+    :param args: The arguments, e.g. paths
+    :param trailing: Arguments repeated at the end of every invocation
+    :param report: Called with the progress of every invocation, only if there is more than one
+    :param capture_output: Capture the output of the command instead of showing it
+    """
+    logger = Logger.get_logger("fds.BulkCommand")
+    chunks = list(chunk_arguments(command, args, trailing))
+    failures = []
+    done = 0
+    for number, chunk in enumerate(chunks, 1):
+        if report is not None and len(chunks) > 1:
+            report(f"{' '.join(command)}: {number}/{len(chunks)} ({done + len(chunk)}/{len(args)} paths)")
+        try:
+            execute_command(command + chunk + list(trailing), capture_output=capture_output)
+        except Exception as e:
+            logger.error(f"{' '.join(command)} failed for {chunk[0]} to {chunk[-1]} ({len(chunk)} paths): {e}")
+            failures.append((chunk, e))
+        done += len(chunk)
+    if failures:
+        failed_paths = sum(len(chunk) for chunk, _ in failures)
+        raise Exception(f"{' '.join(command)} failed for {failed_paths} of {len(args)} paths "
+                        f"({len(failures)} of {len(chunks)} invocations): {failures[0][1]}")
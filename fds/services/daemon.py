@@ -0,0 +1,384 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fds.domain.constants import DAEMON_IDLE_TIMEOUT
+from fds.logger import Logger
+from fds.services.fds_dir import FDS_DIR
+from fds.services.repo_root import ExoticLayout, find_dvc_root, find_git_root, invalidate_repo_roots
+
+SOCKET_FILE_NAME = "daemon.sock"
+LOG_FILE_NAME = "daemon.log"
+# Commands the daemon runs, the other ones may prompt so they always run in the fds process
+FORWARDED_COMMANDS = ("status",)
+# Longest path of a unix socket is 108 bytes on Linux and 104 on macOS
+_MAX_SOCKET_PATH = 100
+# Seconds `fds daemon start` waits for the daemon to answer
+_START_TIMEOUT = 10
+
+_ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
+
+class Fallback(Exception):
+    """
+    The daemon can't run the command, the fds process has to
+    """
+
+
+def get_socket_path(root: str) -> str:
+    path = os.path.join(root, FDS_DIR, SOCKET_FILE_NAME)
+    if len(os.fsencode(path)) <= _MAX_SOCKET_PATH:
+        return path
+    digest = hashlib.sha1(os.fsencode(root)).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"fds-{os.getuid()}-{digest}.sock")
+
+
+def get_settings_env() -> Dict[str, str]:
+    """
+    The environment the result of a command depends on, read once by fds when it starts
+    """
+    return {key: value for key, value in os.environ.items()
+            if key.startswith("FDS_") or key in ("MAX_THRESHOLD_SIZE", "PATH")}
+
+
+def get_code_fingerprint() -> float:
+    """
+    Changes when fds is upgraded or edited, the daemon has to be restarted then
+    """
+    package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    latest = 0.0
+    for directory, _, files in os.walk(package):
+        for name in files:
+            if name.endswith(".py"):
+                latest = max(latest, os.stat(os.path.join(directory, name)).st_mtime)
+    return latest
+
+
+def _get_files_fingerprint(paths: List[str]) -> Tuple[Optional[Tuple[int, int]], ...]:
+    fingerprint = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            fingerprint.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+
+def send_request(socket_path: str, request: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Send a request to the daemon, one json line each way
+    :raises OSError: if no daemon listens on the socket
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("The fds daemon closed the connection")
+    return json.loads(line)
+
+
+def ping(socket_path: str) -> Optional[Dict[str, Any]]:
+    """
+    :return: the state of the daemon, None if there is none
+    """
+    try:
+        return send_request(socket_path, {"command": "ping"}, timeout=_START_TIMEOUT)
+    except (OSError, ValueError):
+        return None
+
+
+def forward(args: List[str]) -> Optional[int]:
+    """
+    Run a command in the daemon of the repository, if one is running
+    :param args: The arguments of fds
+    :return: the exit code of the command, None if it has to run in this process
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    try:
+        root = find_git_root()
+    except ExoticLayout:
+        return None
+    if root is None:
+        return None
+    socket_path = get_socket_path(root)
+    if not os.path.exists(socket_path):
+        return None
+    logger = Logger.get_logger("fds.Daemon")
+    try:
+        response = send_request(socket_path, {"command": "run", "args": args, "cwd": os.getcwd(),
+                                              "env": get_settings_env()})
+    except (OSError, ValueError) as e:
+        logger.debug(f"The fds daemon didn't answer: {e}")
+        return None
+    if "fallback" in response:
+        logger.debug(f"Running in process: {response['fallback']}")
+        return None
+    output = response["output"]
+    # Like colorama does for fds itself
+    if sys.stdout.isatty():
+        output += "\x1b[0m" if output else ""
+    else:
+        output = _ANSI_ESCAPE.sub("", output)
+    sys.stdout.write(output)
+    sys.stdout.flush()
+    return response["exit"]
+
+
+def start_daemon(root: str) -> str:
+    """
+    Start the daemon of a repository, in the background
+    :return: message for the user
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        raise Exception("The fds daemon needs unix sockets, which this platform doesn't have")
+    from fds.services.fds_dir import get_fds_dir
+    socket_path = get_socket_path(root)
+    state = ping(socket_path)
+    if state is not None:
+        return f"fds daemon already running (pid {state['pid']})"
+    log_path = os.path.join(get_fds_dir(root), LOG_FILE_NAME)
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen([sys.executable, "-m", "fds.services.daemon", root], cwd=root,
+                                   stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True)
+    deadline = time.monotonic() + _START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise Exception(f"fds daemon failed to start, see {log_path}")
+        state = ping(socket_path)
+        if state is not None:
+            return f"fds daemon started (pid {state['pid']}), it stops after {DAEMON_IDLE_TIMEOUT} seconds idle"
+        time.sleep(0.05)
+    process.terminate()
+    raise Exception(f"fds daemon didn't answer in {_START_TIMEOUT} seconds, see {log_path}")
+
+
+def stop_daemon(root: str) -> str:
+    try:
+        send_request(get_socket_path(root), {"command": "stop"}, timeout=_START_TIMEOUT)
+    except (OSError, ValueError):
+        return "fds daemon is not running"
+    return "fds daemon stopped"
+
+
+def get_daemon_status(root: str) -> str:
+    state = ping(get_socket_path(root))
+    if state is None:
+        return "fds daemon is not running"
+    return (f"fds daemon running (pid {state['pid']}) for {state['root']}, "
+            f"up {time.time() - state['started_at']:.0f} seconds, {state['requests']} commands run")
+
+
+class FdsDaemon(object):
+    """
+    Keeps fds loaded for a repository, and runs the commands forwarded by the fds CLI one at a time.
+
+    What stays warm: the imported modules, the toolchain, the compiled ignore matchers and, when dvc runs in
+    process, one dvc.repo.Repo per dvc repository. The ignore matchers and the toolchain check the mtimes of what
+    they cached. The Repo is reset before every command, and opened again when the dvc config changed. When fds
+    itself changes, or the settings of a command differ from the daemon's, the command is sent back to run in process.
+    """
+
+    def __init__(self, root: str, socket_path: Optional[str] = None, idle_timeout: float = DAEMON_IDLE_TIMEOUT):
+        self.logger = Logger.get_logger("fds.Daemon")
+        self.root = os.path.abspath(root)
+        self.socket_path = socket_path or get_socket_path(self.root)
+        self.idle_timeout = idle_timeout
+        self.started_at = time.time()
+        self.requests = 0
+        self.running = False
+        self.code_fingerprint = get_code_fingerprint()
+        self.env = get_settings_env()
+        # dvc root -> Repo and the fingerprint of its config
+        self.dvc_repos: Dict[str, Tuple[Any, Tuple]] = {}
+
+    def serve(self) -> None:
+        """
+        Answer requests until stopped, or idle for idle_timeout seconds
+        """
+        from fds.services.pretty_print import PrettyPrint
+        # Initialized once, before stdout is captured
+        PrettyPrint()
+        self.__warm_up()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(self.socket_path)
+            os.chmod(self.socket_path, 0o600)
+            server.listen(16)
+            server.settimeout(self.idle_timeout)
+            self.running = True
+            self.logger.info(f"fds daemon {os.getpid()} listening on {self.socket_path}")
+            while self.running:
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    self.logger.info(f"Stopping after {self.idle_timeout} seconds idle")
+                    break
+                with connection:
+                    self.__answer(connection)
+        finally:
+            self.running = False
+            server.close()
+            with contextlib.suppress(OSError):
+                os.remove(self.socket_path)
+            for repo, _ in self.dvc_repos.values():
+                repo.close()
+
+    def __warm_up(self) -> None:
+        # Loaded before listening, so that even the first command doesn't pay for it
+        import fds.services.fds_service  # noqa: F401
+        from fds.services.dvc_backend import get_dvc_backend
+        dvc_root = find_dvc_root(self.root)
+        if dvc_root is None:
+            return
+        try:
+            in_process = get_dvc_backend().in_process
+        except Exception as e:
+            # The commands report it themselves
+            self.logger.debug(f"Not opening the dvc repository: {e}")
+            return
+        if in_process:
+            self.get_dvc_repo(dvc_root)
+
+    def __answer(self, connection: socket.socket) -> None:
+        connection.settimeout(None)
+        try:
+            with connection.makefile("rb") as f:
+                request = json.loads(f.readline())
+            response = self.handle(request)
+            connection.sendall(json.dumps(response).encode() + b"\n")
+        except (OSError, ValueError) as e:
+            # The client went away, or didn't speak our protocol
+            self.logger.warning(f"Bad request: {e}")
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        command = request.get("command")
+        if command == "ping":
+            return {"pid": os.getpid(), "root": self.root, "started_at": self.started_at, "requests": self.requests}
+        if command == "stop":
+            self.running = False
+            return {"stopped": True}
+        if command == "run":
+            return self.run(request)
+        return {"error": f"Unknown command {command}"}
+
+    def run(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run a command of the fds CLI, capturing what it prints
+        :param request: args, cwd and env of the command
+        :return: exit code and output of the command, or why it has to run in process
+        """
+        if get_code_fingerprint() != self.code_fingerprint:
+            self.running = False
+            return {"fallback": "fds changed since the daemon started, the daemon stops"}
+        if request.get("env") != self.env:
+            return {"fallback": "the settings differ from the ones of the daemon"}
+        from fds.services.pretty_print import PrettyPrint
+        self.requests += 1
+        start = time.perf_counter()
+        output = io.StringIO()
+        try:
+            os.chdir(request["cwd"])
+            # Repositories could have been made or deleted since
+            invalidate_repo_roots()
+            with contextlib.redirect_stdout(output):
+                try:
+                    exit_code = self.__run_command(request["args"])
+                except Fallback:
+                    raise
+                except Exception as e:
+                    # Same as the fds CLI
+                    PrettyPrint().error(str(e))
+                    exit_code = 1
+        except (Fallback, OSError) as e:
+            return {"fallback": str(e)}
+        finally:
+            os.chdir(self.root)
+        self.logger.info(f"{' '.join(request['args'])} took {(time.perf_counter() - start) * 1000:.1f} ms")
+        return {"exit": exit_code, "output": output.getvalue()}
+
+    def __run_command(self, args: List[str]) -> int:
+        from fds.cli import parse_args
+        from fds.services.dvc_backend import InProcessDvcBackend, get_dvc_backend
+        from fds.services.dvc_service import DVCService
+        from fds.services.fds_service import FdsService
+        from fds.services.git_service import GitService
+        try:
+            arguments = parse_args(args)
+        except SystemExit:
+            raise Fallback("invalid arguments")
+        if arguments["command"] not in FORWARDED_COMMANDS or arguments.get("version"):
+            raise Fallback(f"{arguments['command']} is not run by the daemon")
+        git_service = GitService()
+        dvc_service = DVCService()
+        # fds asks to initialize them, which the daemon can't
+        if not git_service.is_initialized() or not dvc_service.is_initialized():
+            raise Fallback("git or dvc is not initialized")
+        # Same backend as fds would pick, only running in process with the warm Repo
+        backend = get_dvc_backend()
+        if backend.in_process:
+            repo = self.get_dvc_repo(os.path.abspath(dvc_service.repo_path))
+            if repo is not None:
+                backend = InProcessDvcBackend(repo)
+        dvc_service.backend = backend
+        FdsService(git_service, dvc_service).status(arguments["targets"], arguments["json"])
+        return 0
+
+    def get_dvc_repo(self, dvc_root: str) -> Optional[Any]:
+        """
+        :return: the Repo of a dvc repository, None if dvc can't be imported
+        """
+        try:
+            from dvc.repo import Repo
+        except ImportError:
+            return None
+        fingerprint = _get_files_fingerprint([os.path.join(dvc_root, ".dvc", "config"),
+                                              os.path.join(dvc_root, ".dvc", "config.local")])
+        cached = self.dvc_repos.get(dvc_root)
+        if cached is not None:
+            repo, cached_fingerprint = cached
+            if cached_fingerprint == fingerprint and self.__reset_repo(repo):
+                return repo
+            repo.close()
+        repo = Repo(dvc_root)
+        self.dvc_repos[dvc_root] = (repo, fingerprint)
+        return repo
+
+    def __reset_repo(self, repo: Any) -> bool:
+        """
+        Forget the index of a cached Repo, the .dvc files and outputs could have changed.
+        Repo._reset is private to dvc, when a version doesn't have it the Repo is opened again instead.
+        :return: whether the Repo can be used again
+        """
+        reset = getattr(repo, "_reset", None)
+        if not callable(reset):
+            return False
+        try:
+            reset()
+        except Exception as e:
+            self.logger.warning(f"Couldn't reset the dvc repository, opening it again: {e}")
+            return False
+        return True
+
+
+def main() -> None:
+    FdsDaemon(sys.argv[1]).serve()
+
+
+if __name__ == "__main__":
+    main()
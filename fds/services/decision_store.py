@@ -0,0 +1,116 @@
+import os
+import sqlite3
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+from fds.logger import Logger
+from fds.services.fds_dir import FDS_DIR, get_fds_dir
+from fds.services.scan_index import INDEX_ERRORS
+
+DECISIONS_FILE_NAME = "decisions.sqlite"
+
+# Decisions which leave nothing behind that tells fds add not to ask again,
+# unlike adding to dvc which creates a .dvc file and ignores the path
+REMEMBERED_ACTIONS = ("git", "ignore", "skip")
+
+
+class DecisionStore(object):
+    """
+    Decisions of fds add, stored in .fds/decisions.sqlite
+
+    A decision is keyed by the path, relative to the repository root, and the (size, mtime) the path had
+    when it was decided. As soon as a path changes it is asked about again.
+    All the decisions are loaded in memory, they are only a handful of large paths.
+    """
+
+    def __init__(self, repo_path: str, dry_run: bool = False):
+        """
+        :param repo_path: The repository root
+        :param dry_run: Only read the decisions of previous runs, the new ones are kept in memory
+        """
+        self.logger = Logger.get_logger("fds.DecisionStore")
+        self.dry_run = dry_run
+        # Not even the .fds directory is created in a dry run
+        fds_dir = os.path.join(repo_path, FDS_DIR) if dry_run else get_fds_dir(repo_path)
+        self.path = os.path.join(fds_dir, DECISIONS_FILE_NAME)
+        self.connection: Optional[sqlite3.Connection] = None
+        self.decisions: Dict[str, Tuple[str, int, int]] = {}
+        try:
+            self.connection = self.__connect()
+            if self.connection is not None:
+                for path, action, size, mtime_ns in self.connection.execute("SELECT * FROM decisions"):
+                    self.decisions[path] = (action, size, mtime_ns)
+        except INDEX_ERRORS as e:
+            # Losing the decisions only means asking again
+            self.logger.warning(f"Can't read the decisions of previous runs ({e}), starting from scratch")
+            self.__reset()
+        if self.dry_run:
+            # Without a connection, put and forget only change the decisions in memory
+            self.close()
+
+    def __connect(self) -> Optional[sqlite3.Connection]:
+        if self.dry_run:
+            if not os.path.exists(self.path):
+                return None
+            return sqlite3.connect(f"file:{quote(os.path.abspath(self.path))}?mode=ro", uri=True, timeout=30)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("CREATE TABLE IF NOT EXISTS decisions "
+                           "(path TEXT PRIMARY KEY, action TEXT, size INTEGER, mtime_ns INTEGER)")
+        return connection
+
+    def __reset(self) -> None:
+        self.close()
+        if os.path.exists(self.path) and not self.dry_run:
+            os.remove(self.path)
+        self.decisions = {}
+
+    def get(self, path: str, size: int, mtime_ns: int) -> Optional[str]:
+        """
+        Get the decision for a path, if the path didn't change since
+        :param path: Path relative to the repository root
+        :param size: Current size of the path
+        :param mtime_ns: Current mtime of the path
+        :return: the action, None if there is no decision or the path changed
+        """
+        decision = self.decisions.get(path)
+        if decision is None or decision[1:] != (size, mtime_ns):
+            return None
+        return decision[0]
+
+    def put(self, path: str, action: str, size: int, mtime_ns: int) -> None:
+        """
+        Remember a decision, right away so that it survives an interrupted add
+        """
+        self.decisions[path] = (action, size, mtime_ns)
+        if self.connection is None:
+            return
+        try:
+            self.connection.execute("INSERT OR REPLACE INTO decisions VALUES (?, ?, ?, ?)",
+                                    (path, action, size, mtime_ns))
+            self.connection.commit()
+        except INDEX_ERRORS as e:
+            self.logger.warning(f"Can't remember the decision for {path} ({e})")
+
+    def forget(self, path: str) -> int:
+        """
+        Forget the decisions for a path and everything inside it
+        :param path: Path relative to the repository root, '.' forgets everything
+        :return: number of decisions forgotten
+        """
+        forgotten = [decided for decided in self.decisions
+                     if path == os.curdir or decided == path or decided.startswith(path + "/")]
+        for decided in forgotten:
+            del self.decisions[decided]
+        if self.connection is not None:
+            try:
+                self.connection.executemany("DELETE FROM decisions WHERE path = ?", ((p,) for p in forgotten))
+                self.connection.commit()
+            except INDEX_ERRORS as e:
+                self.logger.warning(f"Can't forget the decisions ({e})")
+                self.__reset()
+        return len(forgotten)
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,367 @@
+import abc
+import contextlib
+import importlib.util
+import json
+import logging
+import os
+import re
+from subprocess import CompletedProcess
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from fds.domain.constants import DVC_BACKEND
+from fds.logger import Logger
+from fds.services.bulk_command import execute_in_chunks
+from fds.services.executor import Executor
+from fds.services.prehash import PreHasher
+from fds.services.repo_root import find_dvc_root
+from fds.services.toolchain import Toolchain, parse_version
+from fds.utils import convert_bytes_to_string, execute_command, execute_commands, invalidate_ignore_checks
+
+DVC_BACKENDS = ("auto", "inprocess", "subprocess")
+# Oldest dvc whose Repo API the in process backend uses
+MIN_IN_PROCESS_VERSION = (3, 0)
+
+# The dvc loggers print like the dvc CLI once set up, only done once per process
+_logging_setup = False
+
+
+class DvcBackend(abc.ABC):
+    """
+    How DVCService runs the dvc commands
+    """
+    # Whether the commands run in this process, so there is nothing to run at the same time as other commands
+    in_process: bool = False
+
+    @abc.abstractmethod
+    def status(self, targets: Optional[List[str]] = None) -> CompletedProcess:
+        """
+        Machine readable status, parsed by fds status
+        :param targets: Only check these directories, .dvc files and outputs
+        :return: CompletedProcess, as if `dvc status --json` had run, whatever its return code
+        """
+        pass
+
+    @abc.abstractmethod
+    def add(self, paths: List[str], report: Optional[Callable[[str], Any]] = None) -> None:
+        """
+        :param paths: Files and directories to track with dvc
+        :param report: Called with the progress, if the paths are added in several steps
+        """
+        pass
+
+    @abc.abstractmethod
+    def commit(self, force: bool) -> None:
+        """
+        :param force: commit all changed files without confirmation
+        """
+        pass
+
+    @abc.abstractmethod
+    def push(self, remote: Optional[str]) -> CompletedProcess:
+        """
+        Push to a remote, showing the output of dvc
+        :param remote: The dvc remote, None for the default remote
+        :return: CompletedProcess, whatever its return code
+        """
+        pass
+
+    @abc.abstractmethod
+    def pull(self, remote: str) -> CompletedProcess:
+        """
+        Pull from a remote, showing the output of dvc
+        :return: CompletedProcess, whatever its return code
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_remotes(self) -> Dict[str, str]:
+        """
+        :return: dict of remote name to url
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_default_remote(self) -> str:
+        pass
+
+    @abc.abstractmethod
+    def add_remote(self, name: str, url: str) -> None:
+        """
+        Add a remote to the local config, which is not committed
+        """
+        pass
+
+    @abc.abstractmethod
+    def modify_remote(self, name: str, option: str, value: str) -> None:
+        """
+        Set an option of a remote in the local config, which is not committed
+        """
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SubprocessDvcBackend(DvcBackend):
+    """
+    Runs the dvc executable, every command pays for starting dvc and reading the repository again
+    """
+
+    @staticmethod
+    def get_status_command(targets: Optional[List[str]] = None) -> List[str]:
+        return ["dvc", "status", "--json"] + (["-R"] + targets if targets else [])
+
+    @staticmethod
+    def get_push_command(remote: Optional[str]) -> List[str]:
+        push_cmd = ["dvc", "push"]
+        if remote:
+            push_cmd.append("-r")
+            push_cmd.append(remote)
+        return push_cmd
+
+    def status(self, targets: Optional[List[str]] = None) -> CompletedProcess:
+        return execute_commands([self.get_status_command(targets)])[0]
+
+    def add(self, paths: List[str], report: Optional[Callable[[str], Any]] = None) -> None:
+        # As few invocations as possible for performance, but each one within the argument size limit
+        execute_in_chunks(['dvc', 'add'], paths, report=report, capture_output=False)
+
+    def commit(self, force: bool) -> None:
+        commit_cmd = ["dvc", "commit", "-q"]
+        if force:
+            commit_cmd.append("-f")
+        execute_command(commit_cmd, capture_output=False)
+
+    def push(self, remote: Optional[str]) -> CompletedProcess:
+        return execute_command(self.get_push_command(remote), capture_output=False,
+                               capture_output_and_write_to_stdout=True)
+
+    def pull(self, remote: str) -> CompletedProcess:
+        return execute_command(["dvc", "pull", "-r", remote], capture_output=False,
+                               capture_output_and_write_to_stdout=True)
+
+    def get_remotes(self) -> Dict[str, str]:
+        config_list_cmd = execute_command(["dvc", "remote", "list"], capture_output=True)
+        raw_config_list = convert_bytes_to_string(config_list_cmd.stdout).split("\n")
+        config_list_dict = {}
+        for config_list in raw_config_list:
+            # Tab separated before dvc 3, aligned with spaces and the default remote marked since
+            remote_name_with_url = re.sub(r"\s+\(default\)$", "", config_list.strip()).split(None, 1)
+            if (len(remote_name_with_url) == 2):
+                config_list_dict[remote_name_with_url[0]] = str(remote_name_with_url[1])
+        return config_list_dict
+
+    def get_default_remote(self) -> str:
+        default_remote_cmd = execute_command(["dvc", "remote", "default"], capture_output=True)
+        return convert_bytes_to_string(default_remote_cmd.stdout).strip()
+
+    def add_remote(self, name: str, url: str) -> None:
+        execute_command(["dvc", "remote", "add", "--local", name, url])
+
+    def modify_remote(self, name: str, option: str, value: str) -> None:
+        execute_command(["dvc", "remote", "modify", name, "--local", option, value], capture_output=False)
+
+
+class InProcessDvcBackend(SubprocessDvcBackend):
+    """
+    Runs dvc in this process, with one dvc.repo.Repo for the whole fds command, so dvc is imported once
+    and the repository is read once instead of once per dvc command.
+
+    Push and pull still run the dvc executable: they are dominated by the transfer, and asking for credentials
+    relies on what the dvc CLI prints.
+    """
+    in_process = True
+
+    def __init__(self, repo: Optional[Any] = None):
+        """
+        :param repo: A Repo to use instead of opening one, it is left open, e.g. the one the fds daemon keeps
+        """
+        self.repo = repo
+        self.__owned = repo is None
+
+    def get_repo(self) -> Any:
+        """
+        :return: the Repo of the dvc repository of the working directory, opened on first use
+        """
+        if self.repo is not None and not self.__owned:
+            return self.repo
+        root = find_dvc_root()
+        if root is None:
+            raise Exception("You are not inside of a DVC repository")
+        # The working directory changes, e.g. into a clone
+        if self.repo is not None and os.path.realpath(self.repo.root_dir) == os.path.realpath(root):
+            return self.repo
+        self.close()
+        from dvc.repo import Repo
+        _setup_dvc_logging()
+        self.repo = Repo(root)
+        return self.repo
+
+    def close(self) -> None:
+        if self.repo is not None and self.__owned:
+            self.repo.close()
+            self.repo = None
+
+    def status(self, targets: Optional[List[str]] = None) -> CompletedProcess:
+        from dvc.exceptions import DvcException
+        from dvc.repo import lock_repo
+        command = self.get_status_command(targets)
+        repo = self.get_repo()
+        try:
+            with lock_repo(repo):
+                status = repo.status(targets=targets or None, recursive=bool(targets))
+        except DvcException as e:
+            return CompletedProcess(command, 1, b"", f"ERROR: {e}".encode())
+        return CompletedProcess(command, 0, json.dumps(status).encode(), b"")
+
+    def add(self, paths: List[str], report: Optional[Callable[[str], Any]] = None) -> None:
+        # No argument size limit in process, so all the paths at once
+        with self.__running("add"):
+            repo = self.get_repo()
+            self.__prehash(repo, paths, report)
+            repo.add(paths)
+
+    @staticmethod
+    def __prehash(repo: Any, paths: List[str], report: Optional[Callable[[str], Any]]) -> None:
+        """
+        Hash the large files in parallel and hand the hashes to dvc through its state database, where dvc looks up
+        a file before hashing it, then store them in the cache, so that dvc add only writes the .dvc files
+        and links the files from the cache
+        """
+        hashed = PreHasher(report=report).hash_files(paths)
+        if not hashed:
+            return
+        from dvc_data.hashfile.hash_info import HashInfo
+        # The stat the hash was computed for: if the file changes after all, dvc doesn't find it and hashes it again
+        repo.state.save_many([(path, HashInfo("md5", file.md5), {"ino": file.inode, "mtime": file.mtime, "size": file.size})
+                              for path, file in hashed.items()], repo.fs)
+        cache = repo.cache.local
+        # Like dvc add, the cache types of the repository decide how files get into the cache
+        hardlink = next(iter(cache.cache_types), None) == "hardlink"
+        cache.add(list(hashed), repo.fs, [file.md5 for file in hashed.values()], hardlink=hardlink,
+                  jobs=min(len(hashed), os.cpu_count() or 1))
+
+    def commit(self, force: bool) -> None:
+        # Quiet, like dvc commit -q, but still prompting to confirm the changed files unless forced
+        with self.__running("commit"), _quiet():
+            self.get_repo().commit(force=force)
+
+    def __get_config(self) -> Any:
+        config = self.get_repo().config
+        # Read again, the dvc executable could have changed it since the Repo was opened
+        config.load()
+        return config
+
+    def get_remotes(self) -> Dict[str, str]:
+        return {name: str(remote["url"]) for name, remote in self.__get_config()["remote"].items()}
+
+    def get_default_remote(self) -> str:
+        default_remote = self.__get_config()["core"].get("remote")
+        if default_remote is None:
+            # Fails like `dvc remote default`
+            raise Exception("No default remote set")
+        return default_remote
+
+    def add_remote(self, name: str, url: str) -> None:
+        with self.__running("remote add"), self.get_repo().config.edit("local") as conf:
+            if name in conf["remote"]:
+                raise Exception(f"remote '{name}' already exists")
+            conf["remote"][name] = {"url": url}
+
+    def modify_remote(self, name: str, option: str, value: str) -> None:
+        repo = self.get_repo()
+        with self.__running("remote modify"), repo.config.edit("local") as conf:
+            if name not in conf["remote"] and name not in repo.config.load_config_to_level("local")["remote"]:
+                raise Exception(f"remote '{name}' doesn't exist")
+            conf["remote"].setdefault(name, {})[option] = value
+
+    @contextlib.contextmanager
+    def __running(self, command: str) -> Iterator[None]:
+        from dvc.exceptions import DvcException
+        try:
+            yield
+        except DvcException as e:
+            raise Exception(f"dvc {command} failed: {e}")
+        finally:
+            # Like after running dvc, the ignore files could have changed
+            invalidate_ignore_checks()
+
+
+def _setup_dvc_logging() -> None:
+    global _logging_setup
+    if not _logging_setup:
+        from dvc.logger import setup
+        setup()
+        _logging_setup = True
+
+
+@contextlib.contextmanager
+def _quiet() -> Iterator[None]:
+    logger = logging.getLogger("dvc")
+    level = logger.level
+    logger.setLevel(logging.CRITICAL)
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
+
+
+def get_importable_dvc_version() -> Optional[str]:
+    """
+    :return: the version of the importable dvc, without importing it, None if unknown
+    """
+    try:
+        from importlib.metadata import PackageNotFoundError, version
+    except ImportError:
+        # Before python 3.8, only with the backport. dvc 3 needs python 3.8 anyway
+        try:
+            from importlib_metadata import PackageNotFoundError, version
+        except ImportError:
+            return None
+    try:
+        return version("dvc")
+    except PackageNotFoundError:
+        return None
+
+
+def get_in_process_incompatibility() -> Optional[str]:
+    """
+    Check if dvc can run in process: it has to be importable, recent enough, and the same version
+    as the dvc executable, so that fds writes the same files whichever way it runs dvc
+    :return: why dvc can't run in process, None if it can
+    """
+    if importlib.util.find_spec("dvc") is None:
+        return "dvc can't be imported"
+    version = get_importable_dvc_version()
+    if version is None:
+        return "the version of the importable dvc is unknown"
+    if parse_version(version) < MIN_IN_PROCESS_VERSION:
+        return f"dvc {version} is older than {'.'.join(map(str, MIN_IN_PROCESS_VERSION))}"
+    toolchain = Toolchain.get()
+    if toolchain.find("dvc") is not None:
+        executable_version = toolchain.get_version("dvc")
+        if executable_version != version:
+            return f"the dvc executable is version {executable_version}, the importable dvc {version}"
+    return None
+
+
+def get_dvc_backend(mode: Optional[str] = None) -> DvcBackend:
+    """
+    :param mode: auto, inprocess or subprocess, FDS_DVC_BACKEND if not given
+    :return: the in process backend if dvc can run in process and the mode allows it, else the subprocess one
+    """
+    mode = mode or DVC_BACKEND
+    if mode not in DVC_BACKENDS:
+        raise Exception(f"Unknown dvc backend {mode}, choose one of {', '.join(DVC_BACKENDS)}")
+    if mode == "subprocess":
+        return SubprocessDvcBackend()
+    if not Executor.get().allows_in_process:
+        Logger.get_logger("fds.DvcBackend").debug("Running the dvc executable, the commands are traced or replayed")
+        return SubprocessDvcBackend()
+    incompatibility = get_in_process_incompatibility()
+    if incompatibility is None:
+        return InProcessDvcBackend()
+    if mode == "inprocess":
+        raise Exception(f"dvc can't run in process: {incompatibility}")
+    Logger.get_logger("fds.DvcBackend").debug(f"Running the dvc executable, {incompatibility}")
+    return SubprocessDvcBackend()
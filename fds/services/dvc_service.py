@@ -2,14 +2,30 @@ import os
 from dataclasses import dataclass
 from enum import Enum
 from subprocess import CompletedProcess
-from typing import Any, List, Optional, Tuple, Callable
-from fds.domain.constants import MAX_THRESHOLD_SIZE
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Callable
+from fds.domain.constants import MAX_THRESHOLD_SIZE, SCAN_INDEX_TRUST_MTIME, PREFETCH_SIZE
 from fds.logger import Logger
+from fds.services.add_plan import AddPlan, PlanCandidate
+from fds.services.decision_store import DecisionStore, REMEMBERED_ACTIONS
+from fds.services.dvc_backend import DvcBackend, SubprocessDvcBackend, get_dvc_backend
+from fds.services.executor import Executor
+from fds.services.fds_dir import FDS_DIR
+from fds.services.ignore_writer import Compaction, IgnoreWriter
+from fds.services.path_trie import PathTrie
+from fds.services.prefetch import Prefetcher
 from fds.services.pretty_print import PrettyPrint
-from fds.services.types import DvcAdd, InnerService
-from fds.utils import get_size_of_path, convert_bytes_to_readable, convert_bytes_to_string, execute_command, \
-    append_line_to_file, check_git_ignore, check_dvc_ignore, does_file_exist, \
-    construct_dvc_url_from_git_url_dagshub, get_input_from_user, get_expand_input_from_user, get_list_choice_from_user
+from fds.services.repo_root import find_dvc_root, invalidate_repo_roots
+from fds.services.rules import ACTIONS, CHOICE_ACTIONS, RuleCandidate, RuleSet, RULES_FILE_NAME
+from fds.services.scan_index import ScanIndex
+from fds.services.scanner import ParallelScanner, ScanEntry, get_file_size, scan_dir
+from fds.services.size_probe import LazySize, SizeProbe, probe_size
+from fds.services.size_tree import SizeTree
+from fds.services.toolchain import Toolchain
+from fds.services.types import AddOptions, DvcAdd, InnerService
+from fds.utils import convert_bytes_to_string, execute_command, \
+    check_git_ignore_paths, check_dvc_ignore_paths, is_git_ignored, is_dvc_ignored, does_file_exist, \
+    construct_dvc_url_from_git_url_dagshub, get_input_from_user, get_expand_input_from_user, get_list_choice_from_user, \
+    get_confirm_from_user
 
 
 # Choices for DVC
@@ -28,6 +44,18 @@ class AddToDvc:
     file_to_skip: Optional[str]
 
 
+@dataclass
+class WalkStep:
+    root: str
+    dirs: List[str]
+    files: List[str]
+    # Sizes of the files, from the listing
+    file_sizes: Dict[str, int]
+    # Ignore status of the root, its dirs and files, and dvc ignore status of its large paths, checked ahead
+    git_ignored: Dict[str, bool]
+    dvc_ignored: Dict[str, bool]
+
+
 class DVCService(InnerService):
     """
     DVC Service responsible for all the dvc commands of fds
@@ -38,19 +66,49 @@ class DVCService(InnerService):
         self.logger = Logger.get_logger("fds.DVCService")
         self.printer = PrettyPrint()
         self.selection_message_count = 0
+        # Ignore status of the paths about to be checked, queried ahead in batches
+        self.__git_ignored: Dict[str, bool] = {}
+        self.__dvc_ignored: Dict[str, bool] = {}
+        # Paths ignored during add, the ignore files are only written at the end so the checks ahead stay valid
+        self.__ignore_writer = IgnoreWriter(dry_run=Executor.get().dry_run)
+        # Directories decided in the current add, the walk running ahead doesn't descend into them
+        self.__decided = PathTrie()
+        # Sizes of the files of the directory being decided
+        self.__file_sizes: Dict[str, int] = {}
+        # Decisions of previous runs, open during add
+        self.__decisions: Optional[DecisionStore] = None
+        # Routing rules of .fds.yaml, loaded on add
+        self.__rules = RuleSet([])
+        self.__auto = False
+        # While planning (fds add --plan) the decisions are only recorded
+        self.__plan: Optional[AddPlan] = None
+        # How the dvc commands run, chosen on first use
+        self.__backend: Optional[DvcBackend] = None
 
     @staticmethod
     def get_repo_path():
-
-        path_cmd = execute_command(["dvc", "root"], capture_output=True, ignorable_return_codes=[0, 253])
-        stderr = convert_bytes_to_string(path_cmd.stderr).strip()
+        repo_path = find_dvc_root()
         # If its not inside dvc directory, then it means dvc is not initalized yet
-        if "not inside of a DVC repository" in stderr:
-            repo_path = os.path.curdir
-        else:
-            absolute_path = convert_bytes_to_string(path_cmd.stdout).strip()
-            repo_path = os.path.abspath(os.path.join(os.path.curdir, absolute_path))
-        return repo_path
+        return os.path.curdir if repo_path is None else repo_path
+
+    @property
+    def backend(self) -> DvcBackend:
+        if self.__backend is None:
+            self.__backend = get_dvc_backend()
+            self.logger.debug(f"Running dvc with {type(self.__backend).__name__}")
+        return self.__backend
+
+    @backend.setter
+    def backend(self, backend: DvcBackend) -> None:
+        self.close()
+        self.__backend = backend
+
+    def close(self) -> None:
+        """
+        Close the dvc repository, if it was opened in process
+        """
+        if self.__backend is not None:
+            self.__backend.close()
 
     def is_initialized(self):
         return does_file_exist(f"{self.repo_path}/.dvc")
@@ -64,8 +122,27 @@ class DVCService(InnerService):
         if self.is_initialized():
             return "DVC already initialized"
         execute_command(["dvc", "init", "--subdir"])
+        invalidate_repo_roots()
         return "DVC initialized successfully"
 
+    @staticmethod
+    def get_status_command(targets: Optional[List[str]] = None) -> List[str]:
+        """
+        Machine readable status, parsed by fds status
+        :param targets: Only check these directories, .dvc files and outputs
+        :return: the dvc status command
+        """
+        return SubprocessDvcBackend.get_status_command(targets)
+
+    @staticmethod
+    def get_plain_status_command(targets: Optional[List[str]] = None) -> List[str]:
+        """
+        Status as dvc shows it, shown by fds status with older versions of git
+        :param targets: Only check these directories, .dvc files and outputs
+        :return: the dvc status command
+        """
+        return ["dvc", "status"] + (["-R"] + targets if targets else [])
+
     def status(self) -> Any:
         """
         Responsible for running dvc status
@@ -81,21 +158,19 @@ class DVCService(InnerService):
         """
         if os.path.abspath(directory) == self.repo_path:
             return True
-        git_output = check_git_ignore(directory)
-        if convert_bytes_to_string(git_output.stdout) != '':
-            return True
-        return False
+        ignored = self.__git_ignored.pop(directory, None)
+        if ignored is None:
+            ignored = is_git_ignored(directory)
+        return ignored
 
-    def __skip_already_added(self, root, dirs) -> None:
-        # Check if current file is git ignored (this is very similar to adding to dvc also,
-        # because as soon as we add to dvc it gets ignored)
-        for d in dirs:
-            directory = f"{root}/{d}"
-            if self.__should_skip_list_add(directory):
-                dirs.remove(d)
+    def __is_dvc_ignored(self, file_or_dir: str) -> bool:
+        ignored = self.__dvc_ignored.pop(file_or_dir, None)
+        if ignored is None:
+            ignored = is_dvc_ignored(file_or_dir)
+        return ignored
 
     @staticmethod
-    def _get_choice(file_or_dir_to_check: str, path_size: int, file_dir_type: str) -> str:
+    def _get_choice(file_or_dir_to_check: str, path_size: LazySize, file_dir_type: str) -> str:
         choices = [{
             "key": "d",
             "name": "Add to DVC",
@@ -121,40 +196,139 @@ class DVCService(InnerService):
             })
 
         answer = get_expand_input_from_user(f"What would you like to do with {file_dir_type} {file_or_dir_to_check} of "
-                                            f"{convert_bytes_to_readable(path_size)}?", choices, DvcChoices.ADD_TO_DVC.value, False)
+                                            f"{path_size}?", choices, DvcChoices.ADD_TO_DVC.value, False)
+        return answer
+
+    def __probe_size(self, size_tree: SizeTree, file_or_dir: str) -> SizeProbe:
+        path_size = self.__file_sizes.get(file_or_dir)
+        if path_size is None:
+            path_size = size_tree.get_size(file_or_dir)
+        if path_size is not None:
+            return SizeProbe(path_size, True)
+        # Not part of the scanned tree, only size it as far as the threshold decision needs
+        return probe_size(file_or_dir, MAX_THRESHOLD_SIZE)
+
+    def __get_relative_path(self, file_or_dir: str) -> str:
+        # Relative to the repository root and `/` separated, like the rules and plans
+        return os.path.relpath(os.path.abspath(file_or_dir), self.repo_path).replace(os.sep, '/')
+
+    def __get_rule_choice(self, file_or_dir: str, path_size: LazySize, size_tree: SizeTree) -> Optional[str]:
+        is_dir = os.path.isdir(file_or_dir)
+        candidate = RuleCandidate(self.__get_relative_path(file_or_dir), is_dir, path_size.get,
+                                  size_tree.get_file_count(file_or_dir) if is_dir else 1)
+        # A plan suggests an action for everything, the user edits it instead of answering prompts
+        answer = self.__rules.get_choice(candidate, self.__auto or self.__plan is not None)
+        if answer is not None:
+            self.logger.debug(f"{file_or_dir}: {answer} (from {RULES_FILE_NAME})")
         return answer
 
+    def __add_to_plan(self, file_or_dir: str, size: int, file_count: Optional[int], answer: str) -> None:
+        self.__plan.candidates.append(PlanCandidate(
+            path=self.__get_relative_path(file_or_dir),
+            type="dir" if os.path.isdir(file_or_dir) else "file",
+            size=size,
+            file_count=file_count,
+            action=CHOICE_ACTIONS[answer],
+        ))
+
+    def __ignore(self, file_or_dir: str) -> None:
+        self.__ignore_writer.add(file_or_dir)
+
+    @staticmethod
+    def __confirm_compaction(compaction: Compaction) -> bool:
+        return get_confirm_from_user(f"Replace {len(compaction.lines)} paths of {compaction.ignore_file} "
+                                     f"with {compaction.pattern}?", False)
+
+    def __flush_ignores(self) -> None:
+        # Without prompts, the ignore files are only appended to
+        self.__ignore_writer.flush(None if self.__auto else self.__confirm_compaction)
+
+    @staticmethod
+    def __get_fingerprint(file_or_dir: str, size_tree: SizeTree) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.lstat(file_or_dir)
+        except OSError:
+            return None
+        size = size_tree.get_size(file_or_dir)
+        if size is None:
+            if os.path.isdir(file_or_dir):
+                return None
+            size = get_file_size(st)
+        return size, st.st_mtime_ns
+
+    def __get_remembered_choice(self, file_or_dir: str, size_tree: SizeTree) -> Optional[str]:
+        # A plan is reviewed anyway, so it suggests what the rules say
+        if self.__decisions is None or self.__plan is not None:
+            return None
+        fingerprint = self.__get_fingerprint(file_or_dir, size_tree)
+        if fingerprint is None:
+            return None
+        action = self.__decisions.get(self.__get_relative_path(file_or_dir), *fingerprint)
+        return None if action is None else ACTIONS[action]
+
+    def __remember_choice(self, file_or_dir: str, answer: str, size_tree: SizeTree) -> None:
+        action = CHOICE_ACTIONS.get(answer)
+        if self.__decisions is None or action not in REMEMBERED_ACTIONS:
+            return
+        fingerprint = self.__get_fingerprint(file_or_dir, size_tree)
+        if fingerprint is not None:
+            self.__decisions.put(self.__get_relative_path(file_or_dir), action, *fingerprint)
+
     def __get_to_add_to_dvc(
         self,
         file_or_dir_to_check: str,
         dirs: List[str],
-        file_dir_type: str
+        file_dir_type: str,
+        size_tree: SizeTree
     ) -> AddToDvc:
         """
         Returns the tuple (file/folder to be added to dvc, folder to be ignored)
         :param file_or_dir_to_check: File or folder to check if its to be added or ignored
         :param dirs: folders in the current walk
         :param file_dir_type: Type indicating whether its file or Dir
+        :param size_tree: Size tree of the path being walked, to read the sizes from
         :return: AddToDvc dataclass
         """
         if not self.__should_skip_list_add(file_or_dir_to_check):
-            path_size = get_size_of_path(file_or_dir_to_check)
-            # Dont need to traverse deep in case of dir, if the dir is below the threshold size
-            if path_size < MAX_THRESHOLD_SIZE:
-                if os.path.isdir(file_or_dir_to_check):
+            # Decided in a previous run and unchanged since, so don't even size it again
+            answer = self.__get_remembered_choice(file_or_dir_to_check, size_tree)
+            if answer is not None:
+                self.logger.debug(f"{file_or_dir_to_check}: {answer} (decided before)")
+            else:
+                probe = self.__probe_size(size_tree, file_or_dir_to_check)
+                # Dont need to traverse deep in case of dir, if the dir is below the threshold size
+                if probe.size < MAX_THRESHOLD_SIZE:
+                    if os.path.isdir(file_or_dir_to_check):
+                        return AddToDvc(None, file_or_dir_to_check, None)
+                    return AddToDvc(None, None, None)
+                # If the file or dir is greater than threshold and is dvc ignored
+                if self.__is_dvc_ignored(file_or_dir_to_check):
+                    # Everything inside is dvc ignored too, so prune the whole subtree from the walk
+                    [dirs.remove(d) for d in list(dirs)]
                     return AddToDvc(None, file_or_dir_to_check, None)
-                return AddToDvc(None, None, None)
-            # If the file or dir is greater than threshold and is dvc ignored
-            dvc_output = check_dvc_ignore(file_or_dir_to_check)
-            if convert_bytes_to_string(dvc_output.stdout) != '':
-                return AddToDvc(None, file_or_dir_to_check, None)
-            # Show the message only when files are shown and only once per add
-            if self.selection_message_count == 0:
-                self.selection_message_count = 1
-                self.printer.warn('========== Make your selection, Press "h" for help ==========')
-            answer = DVCService._get_choice(file_or_dir_to_check=file_or_dir_to_check,
-                                            path_size=path_size,
-                                            file_dir_type=file_dir_type)
+                # The exact size is only needed to be shown, so compute it in the background until then
+                path_size = LazySize(file_or_dir_to_check, probe.size if probe.exact else None)
+                # Only paths without a matching rule are prompted for
+                answer = self.__get_rule_choice(file_or_dir_to_check, path_size, size_tree)
+                if self.__plan is not None:
+                    if answer == DvcChoices.STEP_INTO.value:
+                        # Only what is inside is planned
+                        return AddToDvc(None, None, None)
+                    self.__add_to_plan(file_or_dir_to_check, path_size.get(),
+                                       size_tree.get_file_count(file_or_dir_to_check) if file_dir_type == "Dir" else 1,
+                                       answer)
+                    # Decided, so neither step into it nor look at its files
+                    [dirs.remove(d) for d in list(dirs)]
+                    return AddToDvc(None, file_or_dir_to_check, None)
+                if answer is None:
+                    # Show the message only when files are shown and only once per add
+                    if self.selection_message_count == 0:
+                        self.selection_message_count = 1
+                        self.printer.warn('========== Make your selection, Press "h" for help ==========')
+                    answer = DVCService._get_choice(file_or_dir_to_check=file_or_dir_to_check,
+                                                    path_size=path_size,
+                                                    file_dir_type=file_dir_type)
+                    self.__remember_choice(file_or_dir_to_check, answer, size_tree)
             if answer == DvcChoices.ADD_TO_DVC.value:
                 # Dont need to traverse deep
                 [dirs.remove(d) for d in list(dirs)]
@@ -168,81 +342,208 @@ class DVCService(InnerService):
                 [dirs.remove(d) for d in list(dirs)]
                 return AddToDvc(None, None, file_or_dir_to_check)
             elif answer == DvcChoices.IGNORE.value:
-                # We should ignore the ./ in beginning when adding to gitignore
-                # Add files to gitignore
-                append_line_to_file(".gitignore",
-                                    file_or_dir_to_check[file_or_dir_to_check.startswith('./') and 2:])
-                # Also add to dvcignore
-                append_line_to_file(".dvcignore",
-                                    file_or_dir_to_check[file_or_dir_to_check.startswith('./') and 2:])
+                # Add files to gitignore and dvcignore
+                self.__ignore(file_or_dir_to_check)
                 # Dont need to traverse deep
                 [dirs.remove(d) for d in list(dirs)]
                 return AddToDvc(None, None, None)
         return AddToDvc(None, None, None)
 
-    def __add(self, paths_to_be_checked: List[str]) -> DvcAdd:
+    def __add(self, paths_to_be_checked: List[str], index: ScanIndex, scanner: ParallelScanner) -> DvcAdd:
         chosen_files_or_folders = []
-        # Keep track of dirs which are below threshold size, so we dont iterate the files inside these dirs
-        ignored_dirs = []
         # Skipped files/folders are those that are not to be tracked by git or dvc and just skipped by the users
         skipped_dirs = []
         # May be add all the folders given in the .gitignore
-        folders_to_exclude = ['.git', '.dvc']
+        folders_to_exclude = ['.git', '.dvc', FDS_DIR]
         paths_to_walk = list(map(lambda path: os.path.normpath(os.path.join(os.path.curdir, path)), paths_to_be_checked))
         for path_to_walk in paths_to_walk:
+            self.__file_sizes = {}
+            # Scan the sizes of the whole path once, instead of re-sizing every dir and file of the walk.
+            # Only the directories are kept, so the memory doesn't grow with the number of files
+            size_tree = SizeTree.build(path_to_walk, folders_to_exclude, index, scanner, keep_files=False)
             # if argument is to add a file
-            if os.path.isfile(path_to_walk) and get_size_of_path(path_to_walk) >= MAX_THRESHOLD_SIZE:
-                # Keep the file in chosen list
-                chosen_files_or_folders.append(path_to_walk)
-            for (root, dirs, files) in os.walk(path_to_walk, topdown=True, followlinks=False):
-                # Now skip the un-necessary folders
-                [dirs.remove(d) for d in list(dirs) if d in folders_to_exclude]
-                # Skip the already added files/folders
-                self.__skip_already_added(root, dirs)
-                # First check root
-                add_to_dvc = self.__get_to_add_to_dvc(root, dirs, "Dir")
-                if add_to_dvc.file_to_ignore is not None:
-                    ignored_dirs.append(add_to_dvc.file_to_ignore)
-                if add_to_dvc.file_to_add is not None:
-                    chosen_files_or_folders.append(add_to_dvc.file_to_add)
-                if add_to_dvc.file_to_skip is not None:
-                    skipped_dirs.append(add_to_dvc.file_to_skip)
+            if os.path.isfile(path_to_walk) and self.__probe_size(size_tree, path_to_walk).size >= MAX_THRESHOLD_SIZE:
+                if self.__plan is not None:
+                    self.__add_to_plan(path_to_walk, size_tree.get_size(path_to_walk), 1, ACTIONS["dvc"])
                 else:
-                    # Only if they dont select the directory then ask for files,
-                    # otherwise ignore asking about files of the directory
-                    # We are also showing if the user chooses to skip because the user
-                    # might not know there is a large file in the directory and choose skip
-                    # because he doesn't want the entire directory to be added.
-
-                    # If the root is skipped because it is below threshold size then we don't need to check files
-                    if root in ignored_dirs:
-                        continue
-                    # If the root is added already then we dont need to scan for files
-                    if root in chosen_files_or_folders:
-                        continue
-                    # Then check files
-                    for file in files:
-                        add_to_dvc = self.__get_to_add_to_dvc(f"{root}/{file}", [], "File")
-                        if add_to_dvc.file_to_ignore is not None:
-                            ignored_dirs.append(add_to_dvc.file_to_ignore)
-                        if add_to_dvc.file_to_add is not None:
-                            chosen_files_or_folders.append(add_to_dvc.file_to_add)
-                        if add_to_dvc.file_to_skip is not None:
-                            skipped_dirs.append(add_to_dvc.file_to_skip)
+                    # Keep the file in chosen list
+                    chosen_files_or_folders.append(path_to_walk)
+            # Streams walk -> filter -> decide, the walk running ahead in the background,
+            # so the next question is ready while the user answers
+            steps = self.__walk(path_to_walk, folders_to_exclude, size_tree, index, scanner)
+            with Prefetcher(steps, PREFETCH_SIZE) as prefetched_steps:
+                for add_to_dvc in self.__decide(prefetched_steps, size_tree):
+                    if add_to_dvc.file_to_add is not None:
+                        chosen_files_or_folders.append(add_to_dvc.file_to_add)
+                    if add_to_dvc.file_to_skip is not None:
+                        skipped_dirs.append(add_to_dvc.file_to_skip)
         self.logger.debug(f"Chosen folders to be added to dvc are {chosen_files_or_folders}")
-        if len(chosen_files_or_folders) > 0:
-            self.printer.warn("Adding to dvc...")
-            # executing a oneliner for performance
-            execute_command(['dvc', 'add'] + chosen_files_or_folders, capture_output=False)
+        self.__dvc_add(chosen_files_or_folders)
         return DvcAdd(chosen_files_or_folders, skipped_dirs)
 
-    def add(self, paths_to_be_checked: List[str]) -> DvcAdd:
+    def __dvc_add(self, paths: List[str]) -> None:
+        if len(paths) == 0:
+            return
+        self.printer.warn("Adding to dvc...")
+        self.backend.add(paths, report=self.printer.warn)
+
+    @staticmethod
+    def __list_dir(index: ScanIndex, directory: str) -> List[ScanEntry]:
+        # The size tree only kept the directories, the files come from the listing the scan just recorded
+        try:
+            entries = index.get_listing(directory, os.lstat(directory))
+        except OSError:
+            return []
+        if entries is None:
+            entries = scan_dir(directory)
+        return entries
+
+    def __walk(self, path_to_walk: str, folders_to_exclude: List[str], size_tree: SizeTree, index: ScanIndex,
+               scanner: ParallelScanner) -> Iterator[WalkStep]:
+        """
+        Walk a path, checking ahead everything the decisions need which doesn't depend on the user
+        """
+        # Walk in sorted depth first order, so the questions come in the same order on every run
+        for (root, dirs, file_entries) in scanner.walk_entries(path_to_walk, folders_to_exclude,
+                                                               lambda directory: self.__list_dir(index, directory)):
+            if self.__decided.contains_ancestor(root):
+                dirs.clear()
+                continue
+            if self.__get_remembered_choice(root, size_tree) is not None:
+                # Decided in a previous run, nothing inside will be asked about
+                dirs.clear()
+            directories = [f"{root}/{d}" for d in dirs]
+            files = [entry[0] for entry in file_entries]
+            file_sizes = {f"{root}/{entry[0]}": entry[2] for entry in file_entries}
+            git_ignored = check_git_ignore_paths([root] + directories + list(file_sizes))
+            # Skip the already added folders (this is very similar to adding to dvc also,
+            # because as soon as we add to dvc it gets ignored)
+            dirs[:] = [d for d, directory in zip(dirs, directories) if not git_ignored[directory]]
+            root_size = size_tree.get_size(root)
+            large = [path for path, size in file_sizes.items() if size >= MAX_THRESHOLD_SIZE]
+            if (root_size or 0) >= MAX_THRESHOLD_SIZE:
+                large.insert(0, root)
+            dvc_ignored = check_dvc_ignore_paths(large) if large else {}
+            step = WalkStep(root, list(dirs), files, file_sizes, git_ignored, dvc_ignored)
+            if (root_size is not None and root_size < MAX_THRESHOLD_SIZE) or dvc_ignored.get(root, False):
+                # Nothing inside will be asked about
+                dirs.clear()
+            yield step
+
+    def __decide(self, steps: Iterator[WalkStep], size_tree: SizeTree) -> Iterator[AddToDvc]:
+        """
+        Decide about the directories and files of the walk, prompting the user if needed
+        """
+        for step in steps:
+            root, dirs, files = step.root, step.dirs, step.files
+            # The walk ran ahead, so it doesn't know yet about the latest decisions
+            if self.__decided.contains_ancestor(root):
+                continue
+            # Only the root and its files are looked up, so keep just the checks of this step
+            self.__git_ignored, self.__dvc_ignored = step.git_ignored, step.dvc_ignored
+            self.__file_sizes = step.file_sizes
+            has_dirs = len(dirs) > 0
+            # First check root
+            add_to_dvc = self.__get_to_add_to_dvc(root, dirs, "Dir", size_tree)
+            if has_dirs and not dirs:
+                # Decided for the whole directory, so don't walk into it
+                self.__decided.add(root)
+            yield add_to_dvc
+            # Only if they dont select the directory then ask for files,
+            # otherwise ignore asking about files of the directory
+            # We are also showing if the user chooses to skip because the user
+            # might not know there is a large file in the directory and choose skip
+            # because he doesn't want the entire directory to be added.
+            # If the root is below threshold size, added or skipped then we don't need to check files
+            if add_to_dvc.file_to_ignore is not None or add_to_dvc.file_to_add is not None \
+                    or add_to_dvc.file_to_skip is not None:
+                continue
+            # Then check files
+            for file in files:
+                yield self.__get_to_add_to_dvc(f"{root}/{file}", [], "File", size_tree)
+
+    def add(self, paths_to_be_checked: List[str], options: Optional[AddOptions] = None) -> DvcAdd:
         """
         Add files into dvc
         :param paths_to_be_checked: paths_to_be_checked is a list which can either be ['.'] or list of paths to be checked
+        :param options: Options of the scan
+        :return: DvcAdd dataclass
+        """
+        options = options or AddOptions()
+        self.__rules = RuleSet.load(self.repo_path)
+        self.__auto = options.auto
+        self.__decided = PathTrie()
+        dry_run = Executor.get().dry_run
+        index = ScanIndex(self.repo_path, rebuild=options.rebuild_index, trust_mtime=SCAN_INDEX_TRUST_MTIME,
+                          in_memory=dry_run)
+        self.__decisions = DecisionStore(self.repo_path, dry_run=dry_run)
+        try:
+            with ParallelScanner(options.jobs) as scanner:
+                dvc_add = self.__add(paths_to_be_checked, index, scanner)
+            self.__flush_ignores()
+            return dvc_add
+        finally:
+            # Keep what was ignored before an interruption
+            self.__ignore_writer.flush()
+            index.close()
+            self.__decisions.close()
+            self.__decisions = None
+            LazySize.shutdown()
+
+    def forget(self, paths: List[str]) -> int:
+        """
+        Forget the Skip/Ignore/Git decisions of previous adds, so the paths are asked about again
+        :param paths: The paths to forget, including everything inside them
+        :return: number of decisions forgotten
+        """
+        decisions = DecisionStore(self.repo_path, dry_run=Executor.get().dry_run)
+        try:
+            return sum(decisions.forget(self.__get_relative_path(path)) for path in paths)
+        finally:
+            decisions.close()
+
+    def plan(self, paths_to_be_checked: List[str], options: Optional[AddOptions] = None) -> AddPlan:
+        """
+        Scan like add, but only record what would be prompted for, with the action suggested by the rules
+        :param paths_to_be_checked: paths_to_be_checked is a list which can either be ['.'] or list of paths to be checked
+        :param options: Options of the scan
+        :return: AddPlan with the candidates ranked largest first
+        """
+        self.__plan = AddPlan([self.__get_relative_path(path) for path in paths_to_be_checked], MAX_THRESHOLD_SIZE)
+        try:
+            self.add(paths_to_be_checked, options)
+            plan = self.__plan
+        finally:
+            self.__plan = None
+        plan.rank()
+        return plan
+
+    def apply(self, plan: AddPlan) -> DvcAdd:
+        """
+        Execute the decisions of a plan, without scanning again.
+        Applying the same plan again only re-adds what changed since.
+        :param plan: The plan, possibly edited
         :return: DvcAdd dataclass
         """
-        return self.__add(paths_to_be_checked)
+        chosen_files_or_folders = []
+        skipped = []
+        for candidate in plan.candidates:
+            path = os.path.relpath(os.path.join(self.repo_path, candidate.path))
+            if not os.path.lexists(path):
+                self.printer.warn(f"{candidate.path} doesn't exist anymore, skipping it")
+                continue
+            if candidate.action == "dvc":
+                chosen_files_or_folders.append(path)
+            elif candidate.action == "ignore":
+                self.__ignore(path)
+            elif candidate.action == "skip":
+                skipped.append(path)
+            # git is left to the git add which follows, AddPlan.load rejected any other action
+        # The plan was reviewed already, so no prompt to compact
+        self.__ignore_writer.flush()
+        self.logger.debug(f"Chosen folders to be added to dvc are {chosen_files_or_folders}")
+        self.__dvc_add(chosen_files_or_folders)
+        return DvcAdd(chosen_files_or_folders, skipped)
 
     def commit(self, auto_confirm: bool) -> Any:
         """
@@ -250,23 +551,11 @@ class DVCService(InnerService):
         :param auto_confirm: commit all changed files without confirmation
         """
         # In case something is added by user and not committed, we will take care of it
-        commit_cmd = ["dvc", "commit", "-q"]
-        if auto_confirm:
-            commit_cmd.append("-f")
-        execute_command(commit_cmd, capture_output=False)
+        self.backend.commit(force=auto_confirm)
 
     @staticmethod
-    def __execute_push_command(remote: str) -> CompletedProcess:
-        push_cmd = ["dvc", "push"]
-        # We will only retry once
-        if remote:
-            push_cmd.append("-r")
-            push_cmd.append(remote)
-        return execute_command(
-            push_cmd,
-            capture_output=False,
-            capture_output_and_write_to_stdout=True
-        )
+    def get_push_command(remote: str) -> List[str]:
+        return SubprocessDvcBackend.get_push_command(remote)
 
     def __handle_dagshub_remote(self) -> Tuple[str, str]:
         self.printer.warn("Please enter your credentials, so we can pull from DAGsHub remote")
@@ -286,32 +575,27 @@ class DVCService(InnerService):
                 self.printer.warn("Please enter your credentials, so we can pull from your dvc remote")
                 user_name = get_input_from_user("Enter your dvc username")
                 password = get_input_from_user("Enter your dvc password", type="password")
-            dvc_remote_modify = ["dvc", "remote", "modify", remote, "--local"]
             # Add auth basic
-            execute_command(dvc_remote_modify+["auth", "basic"], capture_output=False)
+            self.backend.modify_remote(remote, "auth", "basic")
             # Add username
-            execute_command(dvc_remote_modify+["user", user_name], capture_output=False)
+            self.backend.modify_remote(remote, "user", user_name)
             # Add password
-            execute_command(dvc_remote_modify+["user", password], capture_output=False)
+            self.backend.modify_remote(remote, "user", password)
             # Try to push again
             output_bytes = handler()
             if output_bytes.returncode != 0:
                 # Not giving any message because we already print the message in execute_command
                 raise Exception()
 
-    def push(self, remote: str) -> Any:
-        self.__handle_dvc_auth(remote, lambda: self.__execute_push_command(remote))
-
-    @staticmethod
-    def __get_remotes_list() -> dict:
-        config_list_cmd = execute_command(["dvc", "remote", "list"], capture_output=True)
-        raw_config_list = convert_bytes_to_string(config_list_cmd.stdout).split("\n")
-        config_list_dict = {}
-        for config_list in raw_config_list:
-            remote_name_with_url = config_list.split("\t")
-            if (len(remote_name_with_url) == 2):
-                config_list_dict[remote_name_with_url[0]] = str(remote_name_with_url[1])
-        return config_list_dict
+    def push(self, remote: str, pushed: Optional[CompletedProcess] = None) -> Any:
+        """
+        Push to the dvc remote, asking for credentials if needed
+        :param remote: The dvc remote
+        :param pushed: Result of a push already run (e.g. along with git push), retried only if it needs credentials
+        """
+        attempts = [pushed] if pushed is not None else []
+        # We will only retry once
+        self.__handle_dvc_auth(remote, lambda: attempts.pop() if attempts else self.backend.push(remote))
 
     @staticmethod
     def _show_choice_of_remotes(remotes: dict) -> str:
@@ -343,7 +627,7 @@ class DVCService(InnerService):
                 # then construct a dagshub url from the git url
                 dvc_url = construct_dvc_url_from_git_url_dagshub(git_url)
                 # find it from the remote
-                remote_list = DVCService.__get_remotes_list()
+                remote_list = self.backend.get_remotes()
                 for remote, url in remote_list.items():
                     if url == dvc_url:
                         remote_name = remote
@@ -351,25 +635,21 @@ class DVCService(InnerService):
                 if remote_name is None:
                     # if url is not in remote, then add it to remote and use that remote
                     remote_name = "dagshub"
-                    execute_command(["dvc", "remote", "add", "--local", remote_name, dvc_url])
+                    self.backend.add_remote(remote_name, dvc_url)
             else:
                 # If its not dagshub url, then check if there exists a default remote
-                default_remote_cmd = execute_command(["dvc", "remote", "default"], capture_output=True)
-                default_remote = convert_bytes_to_string(default_remote_cmd.stdout).strip()
+                default_remote = self.backend.get_default_remote()
                 if default_remote == "" or "No default remote set":
                     # No default remote defined
                     # So show all the remotes to user and let user choose
-                    remote_list = DVCService.__get_remotes_list()
+                    remote_list = self.backend.get_remotes()
                     remote_name = DVCService._show_choice_of_remotes(remote_list)
                     # If the user chooses to cancel pull
                     if remote_name not in remote_list:
                         return 0
                 else:
                     remote_name = default_remote
-        self.__handle_dvc_auth(remote_name, lambda: execute_command(
-            ["dvc", "pull", "-r", remote_name],
-            capture_output=False,
-            capture_output_and_write_to_stdout=True))
+        self.__handle_dvc_auth(remote_name, lambda: self.backend.pull(remote_name))
 
     @staticmethod
     def version() -> str:
@@ -377,4 +657,4 @@ class DVCService(InnerService):
         Return current version of dvc
         :return:
         """
-        return convert_bytes_to_string(execute_command(["dvc", "--version"], capture_output=True).stdout)
+        return Toolchain.get().get_version("dvc")
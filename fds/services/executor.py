@@ -0,0 +1,459 @@
+import abc
+import codecs
+import collections
+import json
+import os
+import selectors
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, Tuple, Union
+
+from fds.domain.constants import REPLAY_FILE, TRACE_FILE
+
+Command = Union[str, List[str]]
+
+# Commands which only read, they still run in a dry run since what fds does next depends on their output
+READ_ONLY_COMMANDS = {
+    "git": [["status"], ["rev-parse"], ["check-ignore"], ["ls-files"], ["remote", "get-url"]],
+    "dvc": [["status"], ["check-ignore"], ["remote", "list"]],
+}
+# Bytes read from the pipes of a streamed command at once
+STREAM_CHUNK_SIZE = 64 * 1024
+# Bytes kept of the end of the output of a streamed command, e.g. for the 401 Unauthorized check of dvc push
+STREAM_TAIL_SIZE = 64 * 1024
+
+
+class Output(Enum):
+    # Returned in the CompletedProcess
+    CAPTURE = "capture"
+    # Written to stdout and stderr as it comes, only its end is returned in the CompletedProcess
+    STREAM = "stream"
+    # Only written to the terminal, the command may prompt
+    TERMINAL = "terminal"
+
+
+@dataclass
+class CommandRecord:
+    """
+    A command run by fds, as written to the trace
+    """
+    command: Command
+    cwd: str
+    output: str
+    # Milliseconds, until the result was available
+    duration: float
+    returncode: int
+    # None when the output went to the terminal
+    stdout_size: Optional[int] = None
+    stderr_size: Optional[int] = None
+    # The output itself, so that the command can be replayed
+    stdout: Optional[str] = None
+    stderr: Optional[str] = None
+    # Commands run at the same time share the batch
+    batch: Optional[int] = None
+
+
+def get_command_key(command: Command) -> str:
+    return json.dumps(command)
+
+
+def format_command(command: Command) -> str:
+    """
+    The command as it would be typed in a shell
+    """
+    if isinstance(command, str):
+        return command
+    # Not shlex.join, which only exists from python 3.8
+    return " ".join(shlex.quote(arg) for arg in command)
+
+
+def is_read_only(command: Command) -> bool:
+    """
+    Check if a command only reads, e.g. git status or any `--version`
+    """
+    if isinstance(command, str):
+        # Shell commands, e.g. pip install
+        return False
+    args = command[1:]
+    if args == ["--version"]:
+        return True
+    if os.path.basename(command[0]) == "dvc" and args == ["remote", "default"]:
+        # Without a name it only shows the default remote
+        return True
+    prefixes = READ_ONLY_COMMANDS.get(os.path.basename(command[0]), [])
+    return any(args[:len(prefix)] == prefix for prefix in prefixes)
+
+
+def _encode(data: Optional[str]) -> Optional[bytes]:
+    return None if data is None else data.encode("utf-8", errors="surrogateescape")
+
+
+def _decode(data: Optional[bytes]) -> Optional[str]:
+    # Any output survives the trace, even if it isn't utf-8
+    return None if data is None else data.decode("utf-8", errors="surrogateescape")
+
+
+async def execute_command_async(command: List[str], env: Optional[Mapping[str, str]] = None) -> subprocess.CompletedProcess:
+    """
+    Run a command in the running event loop, capturing its output
+    :param command: The command to run
+    :param env: Variables to add to the environment of the command
+    :return: CompletedProcess, whatever the return code
+    """
+    import asyncio
+    try:
+        process = await asyncio.create_subprocess_exec(*command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                                       env={**os.environ, **env} if env else None)
+    except OSError as e:
+        # Same as a shell, which fails with 127 when the command is not found
+        return subprocess.CompletedProcess(command, 127, b'', str(e).encode())
+    stdout, stderr = await process.communicate()
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+class TailBuffer(object):
+    """
+    Ring buffer of the last bytes written to it, what comes before is dropped
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.__chunks: Deque[bytes] = collections.deque()
+        self.__length = 0
+
+    def write(self, data: bytes) -> None:
+        self.__chunks.append(data)
+        self.__length += len(data)
+        # Whole chunks are dropped once the others hold enough, the rest is cut when read
+        while self.__chunks and self.__length - len(self.__chunks[0]) >= self.size:
+            self.__length -= len(self.__chunks.popleft())
+
+    def getvalue(self) -> bytes:
+        data = b''.join(self.__chunks)
+        return data[max(0, len(data) - self.size):]
+
+
+def pump_output(process: subprocess.Popen, tail_size: int = STREAM_TAIL_SIZE) -> Tuple[bytes, bytes]:
+    """
+    Write the output of a process to stdout and stderr as it comes, in chunks rather than lines, so that a partial
+    line, e.g. a progress bar redrawn after a carriage return, doesn't hold up the other pipe.
+    The pipes are read until they are closed, so nothing written just before the process exits is lost
+    :param process: Started with stdout and stderr piped
+    :param tail_size: Bytes kept of the end of each output
+    :return: the ends of stdout and stderr
+    """
+    tails = (TailBuffer(tail_size), TailBuffer(tail_size))
+    with selectors.DefaultSelector() as selector:
+        for pipe, target, tail in ((process.stdout, sys.stdout, tails[0]), (process.stderr, sys.stderr, tails[1])):
+            # Decoded incrementally, a chunk can end in the middle of a character
+            selector.register(pipe, selectors.EVENT_READ,
+                              (target, codecs.getincrementaldecoder("utf-8")(errors="replace"), tail))
+        while selector.get_map():
+            for key, _ in selector.select():
+                target, decoder, tail = key.data
+                chunk = os.read(key.fd, STREAM_CHUNK_SIZE)
+                if chunk:
+                    tail.write(chunk)
+                    text = decoder.decode(chunk)
+                else:
+                    selector.unregister(key.fileobj)
+                    text = decoder.decode(b'', final=True)
+                if text:
+                    target.write(text)
+                    target.flush()
+    return tails[0].getvalue(), tails[1].getvalue()
+
+
+class Executor(abc.ABC):
+    """
+    Runs the git and dvc commands of fds, all of them go through Executor.get()
+    """
+
+    _instance: Optional['Executor'] = None
+    # Whether dvc may run in process, without going through the executor. Only when the commands just run,
+    # so that no dvc command is missing from a trace or runs in a dry run
+    allows_in_process: bool = False
+    # Whether the commands which change something are only shown, fds then doesn't write to the workspace either
+    dry_run: bool = False
+
+    @classmethod
+    def get(cls) -> 'Executor':
+        if cls._instance is None:
+            cls._instance = get_executor()
+        return cls._instance
+
+    @classmethod
+    def set(cls, executor: Optional['Executor']) -> None:
+        """
+        :param executor: The executor of the next commands, None to go back to the one of the settings
+        """
+        cls._instance = executor
+
+    @abc.abstractmethod
+    def run(self, command: Command, shell: bool = False, output: Output = Output.CAPTURE,
+            input_data: Optional[bytes] = None) -> subprocess.CompletedProcess:
+        """
+        Run a command
+        :param command: The command, a string if shell
+        :param shell: Run the command in a shell
+        :param output: Where the output of the command goes
+        :param input_data: Written to the stdin of the command, if the output is captured
+        :return: CompletedProcess, whatever the return code, without stdout and stderr if the output went to the terminal
+        """
+        pass
+
+    @abc.abstractmethod
+    def run_concurrently(self, commands: List[List[str]],
+                         on_result: Optional[Callable[[int, subprocess.CompletedProcess], Any]] = None,
+                         env: Optional[Mapping[str, str]] = None) -> List[subprocess.CompletedProcess]:
+        """
+        Run independent commands at the same time, capturing their output
+        :param commands: The commands to run
+        :param on_result: Called with the index and the result of every command, in the order of the commands,
+                          as soon as the command and all the ones before it are done
+        :param env: Variables to add to the environment of the commands
+        :return: list of CompletedProcess, in the order of the commands, whatever their return code
+        """
+        pass
+
+
+class SubprocessExecutor(Executor):
+    """
+    Runs the commands
+    """
+    allows_in_process = True
+
+    def __init__(self, tail_size: int = STREAM_TAIL_SIZE):
+        """
+        :param tail_size: Bytes kept of the end of the output of the streamed commands
+        """
+        self.tail_size = tail_size
+
+    def run(self, command: Command, shell: bool = False, output: Output = Output.CAPTURE,
+            input_data: Optional[bytes] = None) -> subprocess.CompletedProcess:
+        if output == Output.CAPTURE:
+            # capture_output is not available in python 3.6, so using PIPE manually
+            return subprocess.run(command, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                  input=input_data)
+        if output == Output.TERMINAL:
+            return subprocess.run(command, shell=shell)
+        with subprocess.Popen(command, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+            stdout, stderr = pump_output(process, self.tail_size)
+        # Only the end of the output, however much the command printed
+        return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+    def run_concurrently(self, commands: List[List[str]],
+                         on_result: Optional[Callable[[int, subprocess.CompletedProcess], Any]] = None,
+                         env: Optional[Mapping[str, str]] = None) -> List[subprocess.CompletedProcess]:
+        if sys.version_info < (3, 8) and threading.current_thread() is not threading.main_thread():
+            # Before python 3.8, asyncio can only wait for processes from the main thread
+            return self.__run_on_threads(commands, on_result, env)
+        import asyncio
+
+        async def run() -> List[subprocess.CompletedProcess]:
+            tasks = [asyncio.ensure_future(execute_command_async(command, env)) for command in commands]
+            results = []
+            try:
+                for index, task in enumerate(tasks):
+                    results.append(await task)
+                    if on_result is not None:
+                        on_result(index, results[-1])
+            finally:
+                for task in tasks:
+                    task.cancel()
+            return results
+
+        # Not asyncio.run, which only exists from python 3.7
+        loop = asyncio.new_event_loop()
+        try:
+            # Also attaches the child watcher to the loop before python 3.8
+            asyncio.set_event_loop(loop)
+            return loop.run_until_complete(run())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    @staticmethod
+    def __run_on_threads(commands: List[List[str]],
+                         on_result: Optional[Callable[[int, subprocess.CompletedProcess], Any]] = None,
+                         env: Optional[Mapping[str, str]] = None) -> List[subprocess.CompletedProcess]:
+        def run(command: List[str]) -> subprocess.CompletedProcess:
+            try:
+                return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                      env={**os.environ, **env} if env else None)
+            except OSError as e:
+                # Same as execute_command_async
+                return subprocess.CompletedProcess(command, 127, b'', str(e).encode())
+
+        from concurrent.futures import ThreadPoolExecutor
+        results = []
+        with ThreadPoolExecutor(max_workers=len(commands) or 1, thread_name_prefix="fds-command") as executor:
+            for index, result in enumerate(executor.map(run, commands)):
+                results.append(result)
+                if on_result is not None:
+                    on_result(index, result)
+        return results
+
+
+class RecordingExecutor(Executor):
+    """
+    Runs the commands with another executor, and appends every command and its result to a JSONL trace:
+    its cwd, how long it took, its exit code, and its output with its size
+    """
+
+    def __init__(self, executor: Executor, trace_path: str):
+        self.executor = executor
+        self.trace_path = trace_path
+        self.__batches = 0
+        self.__lock = threading.Lock()
+
+    def __record(self, record: CommandRecord) -> None:
+        # Commands can be run from several threads, e.g. by the hooks
+        with self.__lock, open(self.trace_path, "a") as f:
+            f.write(json.dumps(asdict(record)) + "\n")
+
+    @staticmethod
+    def __get_record(result: subprocess.CompletedProcess, output: Output, start: float,
+                     batch: Optional[int] = None) -> CommandRecord:
+        return CommandRecord(
+            command=result.args,
+            cwd=os.getcwd(),
+            output=output.value,
+            duration=(time.perf_counter() - start) * 1000,
+            returncode=result.returncode,
+            stdout_size=None if result.stdout is None else len(result.stdout),
+            stderr_size=None if result.stderr is None else len(result.stderr),
+            stdout=_decode(result.stdout),
+            stderr=_decode(result.stderr),
+            batch=batch,
+        )
+
+    def run(self, command: Command, shell: bool = False, output: Output = Output.CAPTURE,
+            input_data: Optional[bytes] = None) -> subprocess.CompletedProcess:
+        start = time.perf_counter()
+        result = self.executor.run(command, shell=shell, output=output, input_data=input_data)
+        self.__record(self.__get_record(result, output, start))
+        return result
+
+    def run_concurrently(self, commands: List[List[str]],
+                         on_result: Optional[Callable[[int, subprocess.CompletedProcess], Any]] = None,
+                         env: Optional[Mapping[str, str]] = None) -> List[subprocess.CompletedProcess]:
+        with self.__lock:
+            self.__batches += 1
+            batch = self.__batches
+        start = time.perf_counter()
+
+        def record(index: int, result: subprocess.CompletedProcess) -> None:
+            self.__record(self.__get_record(result, Output.CAPTURE, start, batch))
+            if on_result is not None:
+                on_result(index, result)
+
+        return self.executor.run_concurrently(commands, record, env)
+
+
+class ReplayExecutor(Executor):
+    """
+    Answers the commands with their results in a trace written by RecordingExecutor, instantly and without running them.
+    A command run several times gets its results in the order they were recorded.
+    """
+
+    def __init__(self, trace_path: str):
+        self.trace_path = trace_path
+        self.records: Dict[str, Deque[CommandRecord]] = collections.defaultdict(collections.deque)
+        with open(trace_path) as f:
+            for line in f:
+                if line.strip():
+                    record = CommandRecord(**json.loads(line))
+                    self.records[get_command_key(record.command)].append(record)
+        self.__lock = threading.Lock()
+
+    def __replay(self, command: Command, output: Output) -> subprocess.CompletedProcess:
+        with self.__lock:
+            recorded = self.records.get(get_command_key(command))
+            if not recorded:
+                raise Exception(f"{command} is not in the trace {self.trace_path}")
+            record = recorded.popleft()
+        if output == Output.TERMINAL:
+            return subprocess.CompletedProcess(command, record.returncode)
+        stdout, stderr = _encode(record.stdout) or b'', _encode(record.stderr) or b''
+        if output == Output.STREAM:
+            sys.stdout.write(stdout.decode("utf-8", errors="replace"))
+            sys.stderr.write(stderr.decode("utf-8", errors="replace"))
+        return subprocess.CompletedProcess(command, record.returncode, stdout, stderr)
+
+    def run(self, command: Command, shell: bool = False, output: Output = Output.CAPTURE,
+            input_data: Optional[bytes] = None) -> subprocess.CompletedProcess:
+        return self.__replay(command, output)
+
+    def run_concurrently(self, commands: List[List[str]],
+                         on_result: Optional[Callable[[int, subprocess.CompletedProcess], Any]] = None,
+                         env: Optional[Mapping[str, str]] = None) -> List[subprocess.CompletedProcess]:
+        results = []
+        for index, command in enumerate(commands):
+            results.append(self.__replay(command, Output.CAPTURE))
+            if on_result is not None:
+                on_result(index, results[-1])
+        return results
+
+
+class DryRunExecutor(Executor):
+    """
+    Prints the commands which would change something instead of running them, as if they succeeded without output.
+    The commands which only read still run with another executor.
+    """
+
+    dry_run = True
+
+    def __init__(self, executor: Executor):
+        self.executor = executor
+
+    @staticmethod
+    def __skip(command: Command, output: Output, input_data: Optional[bytes] = None) -> subprocess.CompletedProcess:
+        shown = format_command(command)
+        if input_data:
+            shown += f" < stdin ({len(input_data)} B)"
+        print(f"Would run: {shown}")
+        if output == Output.TERMINAL:
+            return subprocess.CompletedProcess(command, 0)
+        return subprocess.CompletedProcess(command, 0, b'', b'')
+
+    def run(self, command: Command, shell: bool = False, output: Output = Output.CAPTURE,
+            input_data: Optional[bytes] = None) -> subprocess.CompletedProcess:
+        if is_read_only(command):
+            return self.executor.run(command, shell=shell, output=output, input_data=input_data)
+        return self.__skip(command, output, input_data)
+
+    def run_concurrently(self, commands: List[List[str]],
+                         on_result: Optional[Callable[[int, subprocess.CompletedProcess], Any]] = None,
+                         env: Optional[Mapping[str, str]] = None) -> List[subprocess.CompletedProcess]:
+        read_only = [command for command in commands if is_read_only(command)]
+        results = iter(self.executor.run_concurrently(read_only, env=env) if read_only else [])
+        completed = []
+        for index, command in enumerate(commands):
+            completed.append(next(results) if is_read_only(command) else self.__skip(command, Output.CAPTURE))
+            if on_result is not None:
+                on_result(index, completed[-1])
+        return completed
+
+
+def get_executor(dry_run: bool = False, trace_path: Optional[str] = None,
+                 replay_path: Optional[str] = None) -> Executor:
+    """
+    :param dry_run: Only print the commands which would change something
+    :param trace_path: Record the commands to this file, FDS_TRACE if not given
+    :param replay_path: Answer the commands from this trace instead of running them, FDS_REPLAY if not given
+    :return: the executor
+    """
+    trace_path = trace_path or TRACE_FILE
+    replay_path = replay_path or REPLAY_FILE
+    executor = ReplayExecutor(replay_path) if replay_path else SubprocessExecutor()
+    if trace_path:
+        executor = RecordingExecutor(executor, trace_path)
+    if dry_run:
+        executor = DryRunExecutor(executor)
+    return executor
@@ -0,0 +1,17 @@
+import os
+
+# Local state of fds in a repository
+FDS_DIR = ".fds"
+
+
+def get_fds_dir(repo_path: str) -> str:
+    """
+    Get the .fds directory of a repository, creating it if needed.
+    The directory only holds local state, so it is ignored by git.
+    """
+    fds_dir = os.path.join(repo_path, FDS_DIR)
+    if not os.path.isdir(fds_dir):
+        os.makedirs(fds_dir, exist_ok=True)
+        with open(os.path.join(fds_dir, ".gitignore"), "w") as f:
+            f.write("*\n")
+    return fds_dir
@@ -1,11 +1,24 @@
+import json
 import os
+import sys
+from subprocess import CompletedProcess
 from typing import Optional, List
 
 from fds.services.dvc_service import DVCService
 from fds.services.git_service import GitService
 from fds.services.pretty_print import PrettyPrint
+from fds.services.add_plan import AddPlan
+from fds.services.executor import Executor
+from fds.services.ignore_writer import IGNORE_FILES, Compaction, compact_ignore_file
+from fds.services.status import RepoStatus, add_sizes, get_dvc_targets, parse_dvc_status, parse_git_status, \
+    render_status
+from fds.services.toolchain import Toolchain
+from fds.services.types import AddOptions
+from fds.utils import convert_bytes_to_readable, convert_bytes_to_string, execute_commands, get_confirm_from_user
 from fds.version import __version__
 
+PLAN_SUMMARY_SIZE = 20
+
 
 class FdsService(object):
     """
@@ -38,35 +51,109 @@ class FdsService(object):
             self.printer.error(str(e))
             raise Exception("DVC repo failed to initialize")
 
-    def status(self):
+    def __print_output(self, output: CompletedProcess) -> None:
+        stdout = convert_bytes_to_string(output.stdout)
+        if stdout:
+            print(stdout, end="" if stdout.endswith("\n") else "\n")
+        stderr = convert_bytes_to_string(output.stderr)
+        if stderr:
+            print(stderr, end="" if stderr.endswith("\n") else "\n", file=sys.stderr)
+
+    def get_status(self, targets: Optional[List[str]] = None) -> RepoStatus:
         """
-        fds status
+        Status of git and dvc together, both are run at the same time
+        :param targets: Only check these paths
+        :return: RepoStatus
         """
-        # Git status
-        try:
-            self.printer.success("========== Git repo status ==========")
-            self.git_service.status()
-        except Exception as e:
-            self.printer.error(str(e))
+        if not Toolchain.get().supports("git", "porcelain_v2"):
+            raise Exception("fds status --json needs git 2.11 or later")
+        targets = targets or []
+        commands = [self.git_service.get_status_command(targets)]
+        dvc_targets = get_dvc_targets(targets)
+        # Targets dvc doesn't know about can't have dvc changes
+        check_dvc = not targets or len(dvc_targets) > 0
+        in_process = check_dvc and self.dvc_service.backend.in_process
+        if check_dvc and not in_process:
+            commands.append(self.dvc_service.get_status_command(dvc_targets))
+        outputs = execute_commands(commands)
+        git_output = outputs[0]
+        if git_output.returncode != 0:
+            self.printer.error(convert_bytes_to_string(git_output.stderr))
             raise Exception("Git status failed to execute")
-        # Dvc status
-        try:
-            self.printer.warn("========== DVC repo status ==========")
-            self.dvc_service.status()
-        except Exception as e:
-            self.printer.error(str(e))
-            raise Exception("DVC status failed to execute")
+        status = parse_git_status(git_output.stdout)
+        base = os.path.abspath(self.git_service.repo_path)
+        if check_dvc:
+            dvc_output = self.dvc_service.backend.status(dvc_targets) if in_process else outputs[1]
+            try:
+                if dvc_output.returncode != 0:
+                    raise Exception(convert_bytes_to_string(dvc_output.stderr))
+                status.dvc_changed = parse_dvc_status(dvc_output.stdout, base)
+            except Exception as e:
+                self.printer.error(str(e))
+                raise Exception("DVC status failed to execute")
+        add_sizes(status, base)
+        return status
 
-    def add(self, add_command: List[str]):
+    def status(self, targets: Optional[List[str]] = None, as_json: bool = False):
+        """
+        fds status
+        """
+        if not as_json and not Toolchain.get().supports("git", "porcelain_v2"):
+            self.__show_plain_status(targets or [])
+            return
+        status = self.get_status(targets)
+        if as_json:
+            print(json.dumps(status.to_dict(), indent=2))
+        else:
+            render_status(status, self.printer)
+
+    def __show_plain_status(self, targets: List[str]) -> None:
+        """
+        Show git status and dvc status as they print them, for the versions of git fds can't parse the status of
+        """
+        # Both run at the same time, but each one is shown in its own section
+        sections = [
+            ("========== Git repo status ==========", self.printer.success, "Git status failed to execute"),
+            ("========== DVC repo status ==========", self.printer.warn, "DVC status failed to execute"),
+        ]
+        failures = []
+
+        def show(index: int, output: CompletedProcess) -> None:
+            title, print_title, failure = sections[index]
+            print_title(title)
+            self.__print_output(output)
+            if output.returncode != 0:
+                self.printer.error(f"Command returned error code {output.returncode}: {output.args}")
+                failures.append(failure)
+
+        commands = [self.git_service.get_plain_status_command(targets, color=sys.stdout.isatty())]
+        dvc_targets = get_dvc_targets(targets)
+        # Targets dvc doesn't know about can't have dvc changes
+        if not targets or len(dvc_targets) > 0:
+            commands.append(self.dvc_service.get_plain_status_command(dvc_targets))
+        execute_commands(commands, show)
+        if failures:
+            raise Exception(failures[0])
+
+    def add(self, add_command: List[str], options: Optional[AddOptions] = None):
         """
         fds add
         """
+        options = options or AddOptions()
+        if options.plan is not None:
+            self.__plan(add_command, options)
+            return
         # First let the user add files into dvc
         # Then remaining goes to git by default
         # Dvc add
         self.printer.warn("Adding...")
         try:
-            dvc_add = self.dvc_service.add(add_command)
+            if options.apply is not None:
+                plan = AddPlan.load(options.apply)
+                add_command = plan.get_paths(self.dvc_service.repo_path)
+                dvc_add = self.dvc_service.apply(plan)
+            else:
+                dvc_add = self.dvc_service.add(add_command, options)
             add_msg = "DVC add successfully executed"
             if len(dvc_add.files_added_to_dvc) == 0:
                 add_msg = "Nothing to add in DVC"
@@ -82,6 +169,62 @@ class FdsService(object):
             self.printer.error(str(e))
             raise Exception("Git add failed to execute")
 
+    def forget(self, paths: List[str]):
+        """
+        fds add --forget
+        """
+        forgotten = self.dvc_service.forget(paths)
+        if Executor.get().dry_run:
+            self.printer.log(f"Would forget {forgotten} decisions")
+            return
+        self.printer.success(f"Forgot {forgotten} decisions, fds add will ask about them again")
+
+    def compact_ignores(self, auto_confirm: bool):
+        """
+        fds ignore --compact
+        """
+        def confirm(compaction: Compaction) -> bool:
+            message = f"Replace {len(compaction.lines)} paths of {compaction.ignore_file} with {compaction.pattern}?"
+            if auto_confirm:
+                self.printer.log(message[:-1])
+                return True
+            return get_confirm_from_user(message, False)
+
+        dry_run = Executor.get().dry_run
+        removed = sum(compact_ignore_file(ignore_file, confirm, dry_run) for ignore_file in IGNORE_FILES)
+        if dry_run:
+            return
+        self.printer.success(f"Removed {removed} lines from {' and '.join(IGNORE_FILES)}")
+
+    def daemon(self, action: str):
+        """
+        fds daemon start|stop|status
+        """
+        from fds.services.daemon import get_daemon_status, start_daemon, stop_daemon
+        root = os.path.abspath(self.git_service.repo_path)
+        if action == "start":
+            self.printer.success(start_daemon(root))
+        elif action == "stop":
+            self.printer.log(stop_daemon(root))
+        else:
+            self.printer.log(get_daemon_status(root))
+
+    def __plan(self, add_command: List[str], options: AddOptions):
+        self.printer.warn("Scanning...")
+        try:
+            plan = self.dvc_service.plan(add_command, options)
+            plan.save(options.plan)
+        except Exception as e:
+            self.printer.error(str(e))
+            raise Exception("DVC add plan failed")
+        # Only show the largest ones, the plan itself has all of them
+        for candidate in plan.candidates[:PLAN_SUMMARY_SIZE]:
+            self.printer.log(f"{candidate.action:<10} {convert_bytes_to_readable(candidate.size):>10}  {candidate.path}")
+        if len(plan.candidates) > PLAN_SUMMARY_SIZE:
+            self.printer.log(f"... and {len(plan.candidates) - PLAN_SUMMARY_SIZE} more")
+        self.printer.success(f"Plan of {len(plan.candidates)} paths written to {options.plan}, "
+                             f"edit the actions and run fds add --apply {options.plan}")
+
     def clone(self, url: str, folder_name: Optional[str], dvc_remote: Optional[str]):
         """
         fds clone
@@ -123,10 +266,13 @@ class FdsService(object):
             self.printer.error(str(e))
             raise Exception("Git commit failed to execute")
 
-    def push(self, git_remote: str, dvc_remote: str, ref: str = None):
+    def push(self, git_remote: str, dvc_remote: str, ref: str = None, parallel: bool = False):
         """
         fds push
         """
+        if parallel:
+            self.__push_parallel(git_remote, dvc_remote, ref)
+            return
         try:
             self.git_service.push(remote=git_remote, ref=ref)
             self.printer.success("Successfully pushed to Git remote")
@@ -140,8 +286,39 @@ class FdsService(object):
             self.printer.error(str(e))
             raise Exception("DVC push failed to execute")
 
-    def save(self, message: str, git_remote: str, dvc_remote: str):
-        self.add(".")
+    def __push_parallel(self, git_remote: str, dvc_remote: str, ref: str = None):
+        try:
+            git_push_command = self.git_service.get_push_command(git_remote, ref)
+        except Exception as e:
+            self.printer.error(str(e))
+            raise Exception("Git push failed to execute")
+        # Nothing can prompt for credentials while the other push runs, those are asked for after, one at a time
+        git_pushed, dvc_pushed = execute_commands([git_push_command, self.dvc_service.get_push_command(dvc_remote)],
+                                                  env={"GIT_TERMINAL_PROMPT": "0"})
+        failure = None
+        self.__print_output(git_pushed)
+        if git_pushed.returncode != 0 and "terminal prompts disabled" in convert_bytes_to_string(git_pushed.stderr):
+            try:
+                self.git_service.push(remote=git_remote, ref=ref)
+            except Exception as e:
+                self.printer.error(str(e))
+                failure = "Git push failed to execute"
+        elif git_pushed.returncode != 0:
+            failure = "Git push failed to execute"
+        if failure is None:
+            self.printer.success("Successfully pushed to Git remote")
+        self.__print_output(dvc_pushed)
+        try:
+            self.dvc_service.push(remote=dvc_remote, pushed=dvc_pushed)
+            self.printer.warn("Successfully pushed to DVC remote")
+        except Exception as e:
+            self.printer.error(str(e))
+            failure = failure or "DVC push failed to execute"
+        if failure is not None:
+            raise Exception(failure)
+
+    def save(self, message: str, git_remote: str, dvc_remote: str, options: Optional[AddOptions] = None):
+        self.add(".", options)
         self.commit(message)
         # TODO: add autodetect of remotes, ask users if they want to set a remote,
         #  and then push to default remotes, instead of manually entering remote names. Use the method in dvc_service
@@ -152,9 +329,9 @@ class FdsService(object):
     def version(self):
         # Print fds version
         self.printer.log(f"fds version: {__version__}")
+        # Cached until git or dvc is replaced, the ones not cached are probed at the same time
+        git_version, dvc_version = Toolchain.get().get_versions(["git", "dvc"])
         # Print git version
-        git_version = self.git_service.version()
-        self.printer.success(git_version.strip())
+        self.printer.success(git_version)
         # Print dvc version
-        dvc_version = self.dvc_service.version().strip()
         self.printer.warn(f"dvc version: {dvc_version}")
@@ -0,0 +1,167 @@
+import atexit
+import os
+import subprocess
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from fds.logger import Logger
+
+# Writes up to this size can't fill the pipe, bigger batches are written from a thread so reading can't deadlock
+PIPE_WRITE_LIMIT = 4096
+
+
+class GitCoprocess(object):
+    """
+    A long running git command answering NUL separated queries from its stdin,
+    e.g. `git check-ignore --stdin -z` or `git check-attr --stdin -z`
+    """
+
+    def __init__(self, args: List[str], cwd: str):
+        self.args = args
+        self.cwd = cwd
+        self.process: Optional[subprocess.Popen] = None
+        self._stderr = None
+        self._buffer = b''
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        # stderr goes to a file, so warnings of a long running process can never block it
+        self._stderr = tempfile.TemporaryFile()
+        env = dict(os.environ, GIT_FLUSH="1")
+        self.process = subprocess.Popen(["git"] + self.args, cwd=self.cwd, env=env,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._stderr)
+        self._buffer = b''
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def _read_error(self) -> str:
+        self._stderr.seek(0)
+        return self._stderr.read().decode("utf-8", errors="replace").strip()
+
+    def _write(self, payload: bytes) -> Optional[threading.Thread]:
+        def write():
+            try:
+                self.process.stdin.write(payload)
+                self.process.stdin.flush()
+            except (BrokenPipeError, ValueError):
+                # The process died, the reader reports the error
+                pass
+
+        if len(payload) <= PIPE_WRITE_LIMIT:
+            write()
+            return None
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+        return writer
+
+    def _read_fields(self, count: int) -> List[bytes]:
+        fd = self.process.stdout.fileno()
+        while self._buffer.count(b'\0') < count:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return_code = self.process.wait()
+                message = self._read_error()
+                self.close()
+                raise Exception(message or f"git {self.args[0]} exited with code {return_code}")
+            self._buffer += chunk
+        fields = self._buffer.split(b'\0', count)
+        self._buffer = fields.pop()
+        return fields
+
+    def query(self, paths: List[str], fields_per_path: int) -> List[List[str]]:
+        """
+        Send paths to the process and read the answer of each of them
+        :param paths: The paths to query
+        :param fields_per_path: Number of NUL terminated fields the command answers per path
+        :return: List of fields per path, in the order of the paths
+        """
+        if not paths:
+            return []
+        with self._lock:
+            if not self.is_running():
+                self.start()
+            payload = b''.join(os.fsencode(path) + b'\0' for path in paths)
+            writer = self._write(payload)
+            fields = self._read_fields(len(paths) * fields_per_path)
+            if writer is not None:
+                writer.join()
+        decoded = [os.fsdecode(field) for field in fields]
+        return [decoded[i:i + fields_per_path] for i in range(0, len(decoded), fields_per_path)]
+
+    def close(self) -> None:
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+        self._stderr.close()
+        self.process = None
+
+
+class GitCoprocessManager(object):
+    """
+    Keeps one lazily started git coprocess per command and working directory,
+    so we don't fork a git process for every path we need to check
+    """
+
+    # check-ignore answers <source> <linenum> <pattern> <pathname> for every path
+    CHECK_IGNORE_ARGS = ["check-ignore", "--stdin", "-z", "--non-matching", "--verbose"]
+    CHECK_IGNORE_FIELDS = 4
+
+    _instance: Optional['GitCoprocessManager'] = None
+
+    def __init__(self):
+        self.logger = Logger.get_logger("fds.GitCoprocessManager")
+        self._coprocesses: Dict[Tuple[str, Tuple[str, ...]], GitCoprocess] = {}
+
+    @classmethod
+    def get(cls) -> 'GitCoprocessManager':
+        if cls._instance is None:
+            cls._instance = cls()
+            atexit.register(cls._instance.close)
+        return cls._instance
+
+    def _get_coprocess(self, args: List[str]) -> GitCoprocess:
+        # Paths are relative to the cwd, which changes e.g. after cloning
+        key = (os.getcwd(), tuple(args))
+        coprocess = self._coprocesses.get(key)
+        if coprocess is None:
+            self.logger.debug(f"Starting git coprocess {args} in {key[0]}")
+            coprocess = GitCoprocess(args, key[0])
+            self._coprocesses[key] = coprocess
+        return coprocess
+
+    def check_ignore(self, paths: List[str]) -> Dict[str, bool]:
+        """
+        Check which paths are ignored by git
+        :param paths: Paths relative to the current directory
+        :return: dict of path to whether the path is ignored
+        """
+        records = self._get_coprocess(self.CHECK_IGNORE_ARGS).query(paths, self.CHECK_IGNORE_FIELDS)
+        result = {}
+        for path, (source, line_number, pattern, _) in zip(paths, records):
+            # A matching negated pattern (!pattern) means the path is explicitly not ignored
+            result[path] = pattern != '' and not pattern.startswith('!')
+        return result
+
+    def close(self) -> None:
+        for coprocess in self._coprocesses.values():
+            coprocess.close()
+        self._coprocesses = {}
+
+    def invalidate(self) -> None:
+        """
+        Git caches the ignore files it already read, so after they change the coprocesses are restarted lazily
+        """
+        if self._coprocesses:
+            self.logger.debug("Ignore rules might have changed, restarting git coprocesses")
+            self.close()
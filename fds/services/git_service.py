@@ -1,9 +1,12 @@
 import os
 from typing import Any, Optional, List
 
+from fds.services.bulk_command import execute_in_chunks
 from fds.services.pretty_print import PrettyPrint
+from fds.services.repo_root import ExoticLayout, find_git_root, invalidate_repo_roots
+from fds.services.toolchain import Toolchain
 from fds.services.types import InnerService
-from fds.utils import execute_command, convert_bytes_to_string, does_file_exist, check_git_ignore, \
+from fds.utils import execute_command, convert_bytes_to_string, does_file_exist, check_git_ignore_paths, \
     get_git_repo_name_from_url
 
 
@@ -11,21 +14,25 @@ class GitService(InnerService):
     """
     Git Service responsible for all the git commands of fds
     """
+
     def __init__(self):
         self.repo_path = self.get_repo_path()
         self.printer = PrettyPrint()
 
     @staticmethod
     def get_repo_path():
-        path_cmd = execute_command(["git", "rev-parse", "--show-toplevel"],
-                                   capture_output=True, ignorable_return_codes=[0, 128])
-        stderr = convert_bytes_to_string(path_cmd.stderr).strip()
+        try:
+            repo_path = find_git_root()
+        except ExoticLayout:
+            # Only git knows, e.g. with GIT_DIR set
+            path_cmd = execute_command(["git", "rev-parse", "--show-toplevel"],
+                                       capture_output=True, ignorable_return_codes=[0, 128])
+            stderr = convert_bytes_to_string(path_cmd.stderr).strip()
+            if "not a git repository" in stderr:
+                return os.path.curdir
+            return convert_bytes_to_string(path_cmd.stdout).strip()
         # If its not git directory, then it means git is not initalized yet
-        if "not a git repository" in stderr:
-            repo_path = os.path.curdir
-        else:
-            repo_path = convert_bytes_to_string(path_cmd.stdout).strip()
-        return repo_path
+        return os.path.curdir if repo_path is None else repo_path
 
     def is_initialized(self):
         return does_file_exist(f"{self.repo_path}/.git")
@@ -35,44 +42,81 @@ class GitService(InnerService):
         if self.is_initialized():
             return "git already initialized"
         execute_command(['git', 'init', self.repo_path])
+        invalidate_repo_roots()
         return "git initialized successfully"
 
+    @staticmethod
+    def get_status_command(targets: Optional[List[str]] = None) -> List[str]:
+        """
+        Machine readable status, parsed by fds status
+        :param targets: Only check these paths
+        :return: the git status command
+        """
+        return ["git", "status", "--porcelain=v2", "-z", "--branch", "--"] + (targets or [])
+
+    @staticmethod
+    def get_plain_status_command(targets: Optional[List[str]] = None, color: bool = False) -> List[str]:
+        """
+        Status as git shows it, for the versions of git without the porcelain v2 format
+        :param targets: Only check these paths
+        :param color: Keep the colors, even though the output is captured
+        :return: the git status command
+        """
+        command = ["git", "-c", "color.status=always", "status"] if color else ["git", "status"]
+        return command + ["--"] + (targets or [])
+
     def status(self) -> Any:
         return execute_command(["git", "status"], capture_output=False)
 
+    @staticmethod
+    def supports_pathspec_from_file() -> bool:
+        """
+        Check if git add can read the paths from stdin (git 2.25 and later)
+        :return: True if `git add --pathspec-from-file` is supported
+        """
+        return Toolchain.get().supports("git", "pathspec_from_file")
+
     def add(self, paths_to_add: List[str], skipped: List[str]) -> Any:
         # This will take care of adding everything in the argument to add including the .dvc files inside it
-        git_add_command = ["git", "add"]
+        pathspecs = []
 
+        # Check all the paths against git ignore in one go
+        git_ignored = check_git_ignore_paths(list(paths_to_add))
         # Handle multiple paths
         for path_to_add in paths_to_add:
             # Explicitly adding the .dvc file in the root because that wont be added by git
             dvc_file = f"{path_to_add}.dvc"
             if does_file_exist(dvc_file):
-                git_add_command.append(dvc_file)
+                pathspecs.append(dvc_file)
 
             # Then check for git ignore, note that git ignore check should happen after the dvc check
             # Check if there file is git_ignored, then skip that file
-            git_output = check_git_ignore(path_to_add)
-            if convert_bytes_to_string(git_output.stdout) != '':
+            if git_ignored[path_to_add]:
                 continue
             # Add the file into git
-            git_add_command.append(path_to_add)
+            pathspecs.append(path_to_add)
 
         ignore_file = ".gitignore"
         if does_file_exist(ignore_file):
-            git_add_command.append(ignore_file)
+            pathspecs.append(ignore_file)
         # Ignore the skipped files if any
-        for skipped_file in skipped:
-            # git add . :!path/to/file1 :!path/to/file2 :!path/to/folder1/* Will ignore the files to be added
-            git_add_command.append(f':!{os.path.relpath(skipped_file)}')
-        execute_command(git_add_command)
+        # git add . :!path/to/file1 :!path/to/file2 :!path/to/folder1/* Will ignore the files to be added
+        excludes = [f':!{os.path.relpath(skipped_file)}' for skipped_file in skipped]
+        if self.supports_pathspec_from_file():
+            # Through stdin, so neither the number of paths nor their length hits the argument size limit
+            execute_command(["git", "add", "--pathspec-from-file=-", "--pathspec-file-nul"],
+                            input_data=b"\0".join(os.fsencode(pathspec) for pathspec in pathspecs + excludes))
+        elif len(pathspecs) == 0:
+            execute_command(["git", "add"] + excludes)
+        else:
+            # The excludes have to be part of every invocation
+            execute_in_chunks(["git", "add"], pathspecs, excludes, self.printer.log)
 
     def commit(self, message: str) -> Any:
         execute_command(["git", "commit", "-am", message], capture_output=False)
 
     @staticmethod
-    def push(remote: str, ref: str) -> Any:
+    def get_push_command(remote: str, ref: str) -> List[str]:
         push_cmd = ["git", "push"]
         if remote:
             push_cmd.append(remote)
@@ -84,7 +128,11 @@ class GitService(InnerService):
                 if curr_branch == '':
                     raise Exception("No git branch found to push to")
                 push_cmd.append(curr_branch)
-        execute_command(push_cmd, capture_output=False)
+        return push_cmd
+
+    @staticmethod
+    def push(remote: str, ref: str) -> Any:
+        execute_command(GitService.get_push_command(remote, ref), capture_output=False)
 
     def clone(self, url: str, folder_name: Optional[str]) -> Any:
         if folder_name is None or folder_name == "":
@@ -98,4 +146,4 @@ class GitService(InnerService):
         Return current version of git
         :return:
         """
-        return convert_bytes_to_string(execute_command(["git", "--version"], capture_output=True).stdout)
+        return Toolchain.get().get_version("git")
@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+
+from fds.logger import Logger
+
+
+@dataclass
+class Hook:
+    name: str
+    # Or-ed into the return code when the hook fails
+    exit_code: int
+    # Whether everything is fine already, without prompting, so that it can run along with the other checks
+    check: Callable[[], bool]
+    # Makes it fine when the check failed, may prompt the user, returns non zero on failure
+    ensure: Callable[[], int]
+    # Hooks which have to succeed before this one is ensured, it is skipped if one of them fails
+    after: Tuple[str, ...] = ()
+
+
+class HookScheduler(object):
+    """
+    Runs hooks: all the checks at the same time, then what the failed checks have to ensure,
+    one hook at a time in their order, since ensuring may prompt the user.
+
+    The check of a hook can run before the hooks it comes after are ensured, so ensuring checks again.
+    """
+
+    def __init__(self, logger: Logger):
+        self.logger = logger
+
+    def __timed(self, hook: Hook, step: str, function: Callable):
+        start = time.perf_counter()
+        try:
+            return function()
+        finally:
+            self.logger.debug(f"Hook {hook.name} {step} took {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def run(self, hooks: List[Hook]) -> int:
+        """
+        :param hooks: The hooks, in the order they are ensured
+        :return: the exit codes of the failed hooks, or-ed together, 0 if none failed
+        """
+        if not hooks:
+            return 0
+        ret_code = 0
+        failed = set()
+        with ThreadPoolExecutor(max_workers=len(hooks), thread_name_prefix="fds-hook") as executor:
+            checks = [executor.submit(self.__timed, hook, "check", hook.check) for hook in hooks]
+            for hook, check in zip(hooks, checks):
+                skipped_by = [name for name in hook.after if name in failed]
+                if skipped_by:
+                    self.logger.debug(f"Skipping hook {hook.name}, {', '.join(skipped_by)} failed")
+                    failed.add(hook.name)
+                    continue
+                if check.result():
+                    continue
+                if self.__timed(hook, "ensure", hook.ensure):
+                    ret_code |= hook.exit_code
+                    failed.add(hook.name)
+        return ret_code
@@ -0,0 +1,453 @@
+import os
+import re
+import subprocess
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, List, Optional, Pattern, Set, Tuple
+
+from fds.logger import Logger
+from fds.services.repo_root import ExoticLayout, find_dvc_root, find_git_root
+
+
+class IgnoreCheckMode(Enum):
+    # Evaluate the ignore files ourselves
+    IN_PROCESS = "inprocess"
+    # Ask `git check-ignore` and `dvc check-ignore`
+    SUBPROCESS = "subprocess"
+    # Do both, log the differences and trust the subprocess
+    VERIFY = "verify"
+
+
+# POSIX character classes supported by git's wildmatch
+_CHARACTER_CLASSES = {
+    "alnum": "a-zA-Z0-9",
+    "alpha": "a-zA-Z",
+    "blank": " \\t",
+    "digit": "0-9",
+    "lower": "a-z",
+    "punct": re.escape("!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~"),
+    "space": "\\s",
+    "upper": "A-Z",
+    "xdigit": "0-9a-fA-F",
+}
+
+
+def _translate_class(pattern: str, i: int) -> Tuple[Optional[str], int]:
+    """
+    Translate a bracket expression starting at pattern[i] == '['
+    :return: (regex, index after the expression), regex is None if the bracket is not closed
+    """
+    j = i + 1
+    negate = j < len(pattern) and pattern[j] in "!^"
+    if negate:
+        j += 1
+    members = []
+    first = True
+    while j < len(pattern):
+        c = pattern[j]
+        if c == ']' and not first:
+            break
+        first = False
+        if c == '[' and pattern.startswith('[:', j):
+            end = pattern.find(':]', j + 2)
+            if end != -1 and pattern[j + 2:end] in _CHARACTER_CLASSES:
+                members.append(_CHARACTER_CLASSES[pattern[j + 2:end]])
+                j = end + 2
+                continue
+        if c == '\\' and j + 1 < len(pattern):
+            j += 1
+            c = pattern[j]
+        if c == '-' and members and j + 1 < len(pattern) and pattern[j + 1] != ']':
+            members.append('-')
+        else:
+            members.append(re.escape(c))
+        j += 1
+    if j >= len(pattern):
+        return None, i + 1
+    body = "".join(members)
+    if negate:
+        return f"[^/{body}]", j + 1
+    return f"(?!/)[{body}]", j + 1
+
+
+def translate_pattern(pattern: str) -> str:
+    """
+    Translate a gitignore glob into a regex matching a whole `/` separated path
+    :param pattern: The glob, without negation, anchoring or trailing slash
+    :return: regex string
+    """
+    result = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i):
+                starts_component = i == 0 or pattern[i - 1] == '/'
+                end = i + 2
+                ends_component = end == n or pattern[end] == '/'
+                if starts_component and ends_component:
+                    if end == n:
+                        # Trailing `**` matches everything inside
+                        result.append('.*')
+                        i = end
+                    else:
+                        # `**/` matches zero or more directories
+                        result.append('(?:.*/)?')
+                        i = end + 1
+                    continue
+                # Any other `**` is a regular `*`
+                while i < n and pattern[i] == '*':
+                    i += 1
+                result.append('[^/]*')
+                continue
+            result.append('[^/]*')
+        elif c == '?':
+            result.append('[^/]')
+        elif c == '[':
+            translated, i = _translate_class(pattern, i)
+            result.append(translated if translated is not None else re.escape('['))
+            continue
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            result.append(re.escape(pattern[i]))
+        else:
+            result.append(re.escape(c))
+        i += 1
+    return "".join(result)
+
+
+@dataclass
+class IgnorePattern:
+    regex: Pattern
+    negate: bool
+    dir_only: bool
+    # Anchored patterns match the path relative to the ignore file, others just the basename
+    anchored: bool
+    # Directory of the ignore file, relative to the root, '' for the root
+    base: str
+    source: str
+    line_number: int
+    text: str
+
+    def matches(self, path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not path.startswith(self.base + '/'):
+                return False
+            path = path[len(self.base) + 1:]
+        if not self.anchored:
+            path = path.rsplit('/', 1)[-1]
+        return self.regex.match(path) is not None
+
+
+def parse_ignore_line(line: str, base: str, source: str, line_number: int,
+                      ignore_case: bool = False) -> Optional[IgnorePattern]:
+    """
+    Parse a single line of an ignore file
+    :param line: The line without the line ending
+    :param base: Directory of the ignore file relative to the root
+    :param source: The ignore file, for reporting
+    :param line_number: Line number in the ignore file, for reporting
+    :param ignore_case: Match case insensitively, like git with core.ignoreCase
+    :return: IgnorePattern or None for blank lines and comments
+    """
+    text = line
+    if not line or line.startswith('#'):
+        return None
+    # Trailing spaces are ignored unless escaped with a backslash
+    stripped = line.rstrip(' ')
+    if stripped != line and stripped.endswith('\\'):
+        stripped += ' '
+    line = stripped
+    if not line:
+        return None
+    negate = line.startswith('!')
+    if negate:
+        line = line[1:]
+    dir_only = line.endswith('/') and not line.endswith('\\/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    anchored = '/' in line
+    line = line.lstrip('/')
+    flags = re.IGNORECASE if ignore_case else 0
+    regex = re.compile(translate_pattern(line) + r'\Z', flags)
+    return IgnorePattern(regex, negate, dir_only, anchored, base, source, line_number, text)
+
+
+def parse_ignore_file(path: str, base: str, ignore_case: bool = False) -> List[IgnorePattern]:
+    patterns = []
+    try:
+        with open(path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return patterns
+    for line_number, line in enumerate(lines, start=1):
+        pattern = parse_ignore_line(line, base, path, line_number, ignore_case)
+        if pattern is not None:
+            patterns.append(pattern)
+    return patterns
+
+
+class IgnoreMatcher(object):
+    """
+    Evaluates gitignore style rules in process.
+
+    Ignore files are compiled once per directory and cached with their mtime, the cache is only
+    re-validated against the filesystem after `invalidate`, i.e. after fds changed something on disk.
+    """
+
+    def __init__(self, root: str, ignore_file_name: str, global_sources: Optional[List[str]] = None,
+                 ignore_case: bool = False):
+        self.root = os.path.realpath(root)
+        self.ignore_file_name = ignore_file_name
+        # Files with patterns relative to the root, lower precedence than any ignore file in the tree
+        self.global_sources = global_sources or []
+        self.ignore_case = ignore_case
+        self._patterns: Dict[str, Tuple[Optional[Tuple[int, int]], List[IgnorePattern]]] = {}
+        self._validated: Set[str] = set()
+        self._excluded_dirs: Dict[str, bool] = {}
+
+    def invalidate(self) -> None:
+        self._validated = set()
+        self._excluded_dirs = {}
+
+    def _load(self, path: str, base: str) -> List[IgnorePattern]:
+        if path in self._validated:
+            return self._patterns[path][1]
+        try:
+            st = os.stat(path)
+            fingerprint = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            fingerprint = None
+        cached = self._patterns.get(path)
+        if cached is None or cached[0] != fingerprint:
+            patterns = parse_ignore_file(path, base, self.ignore_case) if fingerprint is not None else []
+            cached = (fingerprint, patterns)
+            self._patterns[path] = cached
+        self._validated.add(path)
+        return cached[1]
+
+    def _pattern_lists(self, path: str) -> List[List[IgnorePattern]]:
+        """
+        All the patterns that apply to a path, from the lowest to the highest precedence
+        """
+        lists = [self._load(source, '') for source in self.global_sources]
+        parts = path.split('/')
+        base = ''
+        lists.append(self._load(os.path.join(self.root, self.ignore_file_name), base))
+        for part in parts[:-1]:
+            base = f"{base}/{part}" if base else part
+            lists.append(self._load(os.path.join(self.root, base, self.ignore_file_name), base))
+        return lists
+
+    def last_matching_pattern(self, path: str, is_dir: bool) -> Optional[IgnorePattern]:
+        """
+        The pattern deciding whether the path itself is ignored, ignoring its parent directories
+        :param path: `/` separated path relative to the root
+        :param is_dir: Whether the path is a directory
+        :return: IgnorePattern or None if no pattern matches
+        """
+        for patterns in reversed(self._pattern_lists(path)):
+            for pattern in reversed(patterns):
+                if pattern.matches(path, is_dir):
+                    return pattern
+        return None
+
+    def _is_excluded(self, path: str, is_dir: bool) -> bool:
+        pattern = self.last_matching_pattern(path, is_dir)
+        return pattern is not None and not pattern.negate
+
+    def _is_dir_excluded(self, directory: str) -> bool:
+        excluded = self._excluded_dirs.get(directory)
+        if excluded is None:
+            parent = directory.rsplit('/', 1)[0] if '/' in directory else ''
+            # A file can't be re-included if its parent directory is excluded
+            excluded = (parent != '' and self._is_dir_excluded(parent)) or self._is_excluded(directory, True)
+            self._excluded_dirs[directory] = excluded
+        return excluded
+
+    def relative_path(self, path: str) -> str:
+        """
+        Convert a path relative to cwd into a `/` separated path relative to the root
+        """
+        absolute = os.path.abspath(path)
+        # Resolve symlinks of the parents only, the path itself is what is being matched
+        directory, name = os.path.split(absolute)
+        relative = os.path.relpath(os.path.join(os.path.realpath(directory), name), self.root)
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            raise Exception(f"fatal: {path}: '{path}' is outside repository at '{self.root}'")
+        return '' if relative == os.curdir else relative.replace(os.sep, '/')
+
+    def is_ignored(self, path: str, is_dir: Optional[bool] = None) -> bool:
+        """
+        Check if a path is ignored
+        :param path: Path relative to cwd
+        :param is_dir: Whether the path is a directory, checked on disk if not given
+        :return: True if the path is ignored
+        """
+        if is_dir is None:
+            is_dir = path.endswith('/') or os.path.isdir(path)
+        relative = self.relative_path(path)
+        if relative == '':
+            return False
+        parent = relative.rsplit('/', 1)[0] if '/' in relative else ''
+        if parent and self._is_dir_excluded(parent):
+            return True
+        if is_dir:
+            return self._is_dir_excluded(relative)
+        return self._is_excluded(relative, False)
+
+    def check(self, paths: List[str]) -> Dict[str, bool]:
+        return {path: self.is_ignored(path) for path in paths}
+
+
+def _run_git(args: List[str], cwd: str) -> Optional[str]:
+    output = subprocess.run(["git"] + args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if output.returncode != 0:
+        return None
+    return os.fsdecode(output.stdout)
+
+
+def _find_git_dir(root: str) -> str:
+    git_dir = os.path.join(root, ".git")
+    if os.path.isfile(git_dir):
+        # Worktrees and submodules have a gitfile pointing to the real git dir
+        with open(git_dir, 'r') as f:
+            content = f.read().strip()
+        if content.startswith("gitdir:"):
+            git_dir = os.path.join(root, content[len("gitdir:"):].strip())
+            common_dir_file = os.path.join(git_dir, "commondir")
+            if os.path.isfile(common_dir_file):
+                with open(common_dir_file, 'r') as f:
+                    git_dir = os.path.join(git_dir, f.read().strip())
+    return os.path.normpath(git_dir)
+
+
+class GitIgnoreMatcher(IgnoreMatcher):
+    """
+    Matches like `git check-ignore`: core.excludesFile, .git/info/exclude and the .gitignore files of the tree,
+    files which are tracked are never reported as ignored
+    """
+
+    def __init__(self, root: str):
+        config = self._read_config(root)
+        excludes_file = config.get("core.excludesfile")
+        if excludes_file:
+            excludes_file = os.path.expanduser(excludes_file)
+        else:
+            xdg_config_home = os.getenv("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+            excludes_file = os.path.join(xdg_config_home, "git", "ignore")
+        global_sources = [excludes_file, os.path.join(_find_git_dir(root), "info", "exclude")]
+        ignore_case = config.get("core.ignorecase", "false").lower() in ("true", "yes", "on", "1")
+        super().__init__(root, ".gitignore", global_sources, ignore_case)
+        self._index_fingerprint: Optional[Tuple[int, int]] = None
+        self._tracked_ignored: Set[str] = set()
+
+    @staticmethod
+    def _read_config(root: str) -> Dict[str, str]:
+        output = _run_git(["config", "-z", "--get-regexp", r"^core\.(excludesfile|ignorecase)$"], root) or ''
+        config = {}
+        for entry in output.split('\0'):
+            if entry:
+                key, _, value = entry.partition('\n')
+                config[key.lower()] = value
+        return config
+
+    def _get_tracked_ignored(self) -> Set[str]:
+        # Tracked files matching ignore rules are rare, list them once per version of the index
+        index = os.path.join(_find_git_dir(self.root), "index")
+        try:
+            st = os.stat(index)
+            fingerprint = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return set()
+        if fingerprint != self._index_fingerprint:
+            output = _run_git(["ls-files", "-z", "--cached", "--ignored", "--exclude-standard"], self.root) or ''
+            self._tracked_ignored = {path for path in output.split('\0') if path}
+            self._index_fingerprint = fingerprint
+        return self._tracked_ignored
+
+    def is_ignored(self, path: str, is_dir: Optional[bool] = None) -> bool:
+        ignored = super().is_ignored(path, is_dir)
+        if ignored and self.relative_path(path) in self._get_tracked_ignored():
+            return False
+        return ignored
+
+
+class DvcIgnoreMatcher(IgnoreMatcher):
+    """
+    Matches like `dvc check-ignore`, using the .dvcignore files of the dvc repository
+    """
+
+    def __init__(self, root: str):
+        super().__init__(root, ".dvcignore")
+
+
+class IgnoreMatchers(object):
+    """
+    Keeps the compiled matchers of the repositories we work in, and the differences found in verify mode
+    """
+
+    _instance: Optional['IgnoreMatchers'] = None
+
+    def __init__(self):
+        self.logger = Logger.get_logger("fds.IgnoreMatchers")
+        # Roots only git could find, by working directory
+        self._git_roots: Dict[str, str] = {}
+        self._git: Dict[str, GitIgnoreMatcher] = {}
+        self._dvc: Dict[str, DvcIgnoreMatcher] = {}
+        self.mismatches: List[Tuple[str, str, bool, bool]] = []
+
+    @classmethod
+    def get(cls) -> 'IgnoreMatchers':
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def git(self) -> GitIgnoreMatcher:
+        cwd = os.getcwd()
+        try:
+            root = find_git_root(cwd)
+        except ExoticLayout:
+            # Only git knows, e.g. with GIT_DIR set
+            root = self._git_roots.get(cwd)
+            if root is None:
+                root = (_run_git(["rev-parse", "--show-toplevel"], cwd) or '').strip() or None
+                if root is not None:
+                    self._git_roots[cwd] = root
+        if root is None:
+            raise Exception("fatal: not a git repository (or any of the parent directories): .git")
+        root = os.path.realpath(root)
+        if root not in self._git:
+            self._git[root] = GitIgnoreMatcher(root)
+        return self._git[root]
+
+    def dvc(self) -> DvcIgnoreMatcher:
+        root = find_dvc_root()
+        if root is None:
+            raise Exception("ERROR: you are not inside of a DVC repository")
+        root = os.path.realpath(root)
+        if root not in self._dvc:
+            self._dvc[root] = DvcIgnoreMatcher(root)
+        return self._dvc[root]
+
+    def invalidate(self) -> None:
+        for matcher in list(self._git.values()) + list(self._dvc.values()):
+            matcher.invalidate()
+
+    def verify(self, kind: str, in_process: Dict[str, bool], expected: Dict[str, bool]) -> Dict[str, bool]:
+        """
+        Compare the in process results with the ones of the subprocess
+        :param kind: git or dvc
+        :param in_process: Results of the in process matcher
+        :param expected: Results of the subprocess
+        :return: The results of the subprocess
+        """
+        for path, ignored in expected.items():
+            if in_process.get(path) != ignored:
+                self.logger.warning(f"{kind} ignore mismatch for {path}: in process {in_process.get(path)}, "
+                                    f"check-ignore {ignored}")
+                self.mismatches.append((kind, path, in_process.get(path), ignored))
+        return expected
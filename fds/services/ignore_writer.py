@@ -0,0 +1,211 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from fds.utils import invalidate_ignore_checks, write_file_atomically
+
+IGNORE_FILES = (".gitignore", ".dvcignore")
+
+# Number of ignored siblings from which they are offered to be collapsed into one pattern
+COMPACT_MIN_SIBLINGS = 10
+
+_GLOB_SPECIAL = re.compile(r'[*?\[\\]')
+
+
+@dataclass
+class Compaction:
+    """
+    Ignored siblings which can be replaced by a single pattern
+    """
+    ignore_file: str
+    pattern: str
+    lines: List[str]
+
+    def apply(self, lines: List[str]) -> List[str]:
+        """
+        Replace the siblings by the pattern, where the first of them was
+        :param lines: Lines of the ignore file
+        :return: the compacted lines
+        """
+        replaced = set(self.lines)
+        compacted = []
+        added = False
+        for line in lines:
+            if line.strip() not in replaced:
+                compacted.append(line)
+            elif not added:
+                compacted.append(self.pattern)
+                added = True
+        return compacted
+
+
+def _get_literal_path(line: str) -> Optional[str]:
+    """
+    The path a line of an ignore file stands for, None if it is not a plain path (a glob, a negation or a comment)
+    """
+    line = line.strip()
+    if not line or line.startswith(('#', '!')) or _GLOB_SPECIAL.search(line):
+        return None
+    path = line.strip('/')
+    return path or None
+
+
+def _get_extension(name: str) -> str:
+    dot = name.rfind('.')
+    return name[dot:] if dot > 0 else ''
+
+
+def _group_siblings(lines: List[str]) -> Dict[str, Dict[str, str]]:
+    """
+    The plain paths of an ignore file by their parent directory
+    :return: dict of parent directory to the dict of name to line
+    """
+    siblings: Dict[str, Dict[str, str]] = {}
+    for line in lines:
+        path = _get_literal_path(line)
+        if path is None:
+            continue
+        parent, _, name = path.rpartition('/')
+        if not parent and not line.strip().startswith('/'):
+            # Without a slash the line matches at any depth, an anchored pattern would stop ignoring the nested ones
+            continue
+        siblings.setdefault(parent, {})[name] = line.strip()
+    return siblings
+
+
+def find_compactions(ignore_file: str, lines: List[str], min_siblings: int = COMPACT_MIN_SIBLINGS) -> List[Compaction]:
+    """
+    Find the groups of ignored siblings of an ignore file which a single pattern can stand for, without ignoring
+    anything else which exists now:
+    the directory itself if all of it is ignored, otherwise a glob of the extension all of them share
+    :param ignore_file: Path of the ignore file, the lines are relative to its directory
+    :param lines: Lines of the ignore file
+    :param min_siblings: Number of ignored siblings from which they are compacted
+    :return: list of Compaction, one per group of siblings
+    """
+    # Negations could depend on what is ignored, leave those files as they are
+    if any(line.strip().startswith('!') for line in lines):
+        return []
+    base = os.path.dirname(ignore_file)
+    compactions = []
+    for parent, names in _group_siblings(lines).items():
+        if len(names) < min_siblings:
+            continue
+        try:
+            others = [name for name in os.listdir(os.path.join(base, parent) if parent else base or os.curdir)
+                      if name not in names]
+        except OSError:
+            continue
+        prefix = f"/{parent}/" if parent else "/"
+        if parent and not others:
+            pattern = prefix
+        else:
+            extensions = {_get_extension(name) for name in names}
+            extension = extensions.pop() if len(extensions) == 1 else ''
+            if not extension or any(name.endswith(extension) for name in others):
+                continue
+            pattern = f"{prefix}*{extension}"
+        compactions.append(Compaction(ignore_file, pattern, sorted(names.values())))
+    return compactions
+
+
+def dedupe_lines(lines: List[str]) -> List[str]:
+    """
+    Drop the lines which are already further up, keeping the blank lines and comments
+    """
+    seen = set()
+    deduped = []
+    for line in lines:
+        key = line.strip()
+        if key and not key.startswith('#'):
+            if key in seen:
+                continue
+            seen.add(key)
+        deduped.append(line)
+    return deduped
+
+
+def read_lines(filename: str) -> List[str]:
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as f:
+        return f.read().splitlines()
+
+
+def write_lines(filename: str, lines: List[str]) -> None:
+    """
+    Replace the lines of a file atomically, so git and dvc never see half of it
+    """
+    write_file_atomically(filename, "".join(f"{line}\n" for line in lines))
+    invalidate_ignore_checks()
+
+
+def compact_ignore_file(filename: str, confirm: Callable[[Compaction], bool], dry_run: bool = False) -> int:
+    """
+    Collapse the ignored siblings of an ignore file, after confirmation
+    :param filename: The ignore file
+    :param confirm: Asked for every compaction, returns whether to apply it
+    :param dry_run: Only print what would be removed, without writing the file
+    :return: number of lines removed
+    """
+    lines = read_lines(filename)
+    compacted = dedupe_lines(lines)
+    for compaction in find_compactions(filename, compacted):
+        if confirm(compaction):
+            compacted = compaction.apply(compacted)
+    if len(compacted) != len(lines):
+        if dry_run:
+            print(f"Would remove {len(lines) - len(compacted)} lines from {filename}")
+        else:
+            write_lines(filename, compacted)
+    return len(lines) - len(compacted)
+
+
+class IgnoreWriter(object):
+    """
+    Paths ignored during a session of fds add, written to .gitignore and .dvcignore all at once at the end.
+
+    Every ignore file is read and rewritten once, instead of being appended to for every path,
+    and paths which are already in it are not added again.
+    """
+
+    def __init__(self, directory: str = os.curdir, dry_run: bool = False):
+        """
+        :param directory: Where the ignore files are
+        :param dry_run: Only print the paths which would be added, without writing the ignore files
+        """
+        self.directory = directory
+        self.dry_run = dry_run
+        # Ordered set of the lines to add
+        self.pending: Dict[str, None] = {}
+
+    def add(self, file_or_dir: str) -> None:
+        # We should ignore the ./ in beginning when adding to gitignore
+        self.pending[file_or_dir[file_or_dir.startswith('./') and 2:]] = None
+
+    def flush(self, confirm: Optional[Callable[[Compaction], bool]] = None) -> None:
+        """
+        Write the pending paths to the ignore files
+        :param confirm: If given, the siblings the new paths are part of are offered to be compacted
+        """
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        for name in IGNORE_FILES:
+            filename = os.path.join(self.directory, name)
+            lines = read_lines(filename)
+            existing = {line.strip() for line in lines}
+            new_lines = [line for line in pending if line not in existing]
+            if not new_lines:
+                continue
+            if self.dry_run:
+                for line in new_lines:
+                    print(f"Would append {line} to {os.path.normpath(filename)}")
+                continue
+            lines += new_lines
+            if confirm is not None:
+                for compaction in find_compactions(filename, lines):
+                    if set(compaction.lines) & set(new_lines) and confirm(compaction):
+                        lines = compaction.apply(lines)
+            write_lines(filename, lines)
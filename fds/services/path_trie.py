@@ -0,0 +1,45 @@
+import os
+from typing import Dict, List
+
+# Marks a node which is a path of the trie itself, no path component can be empty
+_END = ""
+
+
+class PathTrie(object):
+    """
+    Set of paths, answering whether a path or one of its ancestors is in the set with one lookup
+    per path component, however many paths there are.
+    """
+
+    def __init__(self):
+        self._root: Dict[str, dict] = {}
+
+    @staticmethod
+    def _split(path: str) -> List[str]:
+        return [part for part in os.path.normpath(path).split(os.sep) if part and part != os.curdir]
+
+    def add(self, path: str) -> None:
+        node = self._root
+        for part in self._split(path):
+            node = node.setdefault(part, {})
+            if _END in node:
+                # An ancestor is already in, it covers the path
+                return
+        # Everything below is covered by the path now
+        node.clear()
+        node[_END] = {}
+
+    def contains_ancestor(self, path: str) -> bool:
+        """
+        Check if the path or one of its ancestors is in the trie
+        """
+        node = self._root
+        if _END in node:
+            return True
+        for part in self._split(path):
+            node = node.get(part)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
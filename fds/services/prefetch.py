@@ -0,0 +1,72 @@
+import queue
+import threading
+from typing import Generic, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+_DONE = object()
+
+
+class Prefetcher(Generic[T]):
+    """
+    Runs an iterator ahead in a worker thread, into a bounded queue.
+
+    While the consumer is busy (e.g. waiting for the user to answer a prompt), the next items are
+    prepared in the background, but never more than `size` of them. Closing the prefetcher, also when
+    the consumer is interrupted with Ctrl-C, cancels the worker.
+    """
+
+    def __init__(self, iterable: Iterable[T], size: int):
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, size))
+        self._cancelled = threading.Event()
+        self._done = False
+        self._thread = threading.Thread(target=self._run, args=(iter(iterable),), name="fds-prefetch", daemon=True)
+        self._thread.start()
+
+    def _run(self, iterator: Iterator[T]) -> None:
+        try:
+            for item in iterator:
+                if not self._put((item, None)):
+                    return
+            self._put((_DONE, None))
+        except BaseException as e:
+            self._put((None, e))
+        finally:
+            # Let a generator clean up in the thread it runs in
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def _put(self, entry) -> bool:
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self) -> 'Prefetcher[T]':
+        return self
+
+    def __next__(self) -> T:
+        if self._done:
+            raise StopIteration
+        item, error = self._queue.get()
+        if error is not None:
+            self._done = True
+            raise error
+        if item is _DONE:
+            self._done = True
+            raise StopIteration
+        return item
+
+    def __enter__(self) -> 'Prefetcher[T]':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._cancelled.set()
+        self._thread.join()
@@ -0,0 +1,176 @@
+import hashlib
+import mmap
+import os
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from fds.domain.constants import PREHASH_CHUNK_SIZE, PREHASH_JOBS, PREHASH_MIN_SIZE
+from fds.utils import convert_bytes_to_readable
+
+# Never descended into, dvc doesn't track what is inside them
+SKIPPED_DIRS = {".git", ".dvc", ".fds"}
+
+
+class HashedFile(NamedTuple):
+    md5: str
+    size: int
+    inode: int
+    # Float seconds, like the mtime of the dvc state
+    mtime: float
+
+
+def get_prehash_jobs(jobs: Optional[int] = None) -> int:
+    """
+    Number of files hashed at the same time, FDS_PREHASH_JOBS or one per core
+    """
+    if jobs is None:
+        jobs = PREHASH_JOBS if PREHASH_JOBS is not None else (os.cpu_count() or 1)
+    return max(0, jobs)
+
+
+def _walk_files(directory: str) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    The files below a directory with their lstat, without the directories dvc doesn't track
+    """
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = [name for name in dirs if name not in SKIPPED_DIRS]
+        for name in names:
+            file_path = os.path.join(root, name)
+            try:
+                yield file_path, os.lstat(file_path)
+            except OSError:
+                continue
+
+
+def collect_files(paths: Iterable[str], min_size: int) -> List[Tuple[str, int]]:
+    """
+    The regular files worth hashing ahead of dvc, the paths themselves or the files below them
+    :param paths: Files and directories about to be added
+    :param min_size: Smaller files are left to dvc
+    :return: list of (absolute path, size)
+    """
+    files = []
+    for path in paths:
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        found = _walk_files(path) if stat.S_ISDIR(st.st_mode) else [(path, st)]
+        files.extend((file_path, file_st.st_size) for file_path, file_st in found
+                     if stat.S_ISREG(file_st.st_mode) and file_st.st_size >= min_size)
+    return files
+
+
+def _md5_mapped(md5: Any, mapped: mmap.mmap, chunk_size: int) -> None:
+    """
+    Hash a mapped file, the chunks are views of the page cache
+    """
+    with mapped:
+        if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        with memoryview(mapped) as view:
+            for offset in range(0, len(view), chunk_size):
+                md5.update(view[offset:offset + chunk_size])
+
+
+def _md5_buffered(md5: Any, f: BinaryIO, chunk_size: int) -> None:
+    """
+    Hash a file read into a single reused buffer, for the files which can't be mapped
+    """
+    buffer = bytearray(chunk_size)
+    with memoryview(buffer) as view:
+        read = f.readinto(buffer)
+        while read:
+            md5.update(view[:read])
+            read = f.readinto(buffer)
+
+
+def _md5_open_file(md5: Any, f: BinaryIO, size: int, chunk_size: int) -> None:
+    if size == 0:
+        return
+    try:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Some filesystems can't be mapped
+        _md5_buffered(md5, f, chunk_size)
+        return
+    _md5_mapped(md5, mapped, chunk_size)
+
+
+def md5_file(path: str, chunk_size: int = PREHASH_CHUNK_SIZE) -> Optional[HashedFile]:
+    """
+    MD5 of a file, read through mmap so the chunks are hashed straight from the page cache without copying them.
+    hashlib releases the GIL while it hashes a chunk, so several files are hashed in parallel on threads.
+    :param path: The file to hash
+    :param chunk_size: Bytes hashed at once
+    :return: the MD5 with the stat it is valid for, None if the file changed while being hashed or can't be read
+    """
+    md5 = hashlib.md5()
+    try:
+        with open(path, "rb") as f:
+            before = os.fstat(f.fileno())
+            _md5_open_file(md5, f, before.st_size, chunk_size)
+        after = os.stat(path)
+    except OSError:
+        return None
+    if (before.st_ino, before.st_size, before.st_mtime_ns) != (after.st_ino, after.st_size, after.st_mtime_ns):
+        return None
+    return HashedFile(md5.hexdigest(), after.st_size, after.st_ino, after.st_mtime)
+
+
+class PreHasher(object):
+    """
+    Hashes the large files about to be added with dvc in parallel, dvc hashes the files of a command one at a time.
+
+    Threads rather than processes: hashlib releases the GIL while hashing, so the threads hash on every core,
+    without starting processes that would import fds again.
+    """
+
+    def __init__(self, jobs: Optional[int] = None, min_size: int = PREHASH_MIN_SIZE,
+                 chunk_size: int = PREHASH_CHUNK_SIZE, report: Optional[Callable[[str], Any]] = None):
+        """
+        :param jobs: Number of files hashed at the same time, 0 hashes nothing
+        :param min_size: Smaller files are left to dvc, hashing them is quicker than reporting it
+        :param chunk_size: Bytes hashed at once
+        :param report: Called with the progress
+        """
+        self.jobs = get_prehash_jobs(jobs)
+        self.min_size = min_size
+        self.chunk_size = chunk_size
+        self.report = report
+
+    def hash_files(self, paths: Iterable[str]) -> Dict[str, HashedFile]:
+        """
+        :param paths: Files and directories about to be added
+        :return: dict of absolute path to the hash of the file, without the files that changed or couldn't be read
+        """
+        if self.jobs == 0:
+            return {}
+        # Largest first, so that one large file doesn't start last and keep a single core busy at the end
+        files = sorted(collect_files(paths, self.min_size), key=lambda file: file[1], reverse=True)
+        if not files:
+            return {}
+        total = sum(size for _, size in files)
+        hashed: Dict[str, HashedFile] = {}
+        done = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(files)), thread_name_prefix="fds-hash") as executor:
+            futures = {executor.submit(md5_file, path, self.chunk_size): (path, size) for path, size in files}
+            for i, future in enumerate(as_completed(futures), 1):
+                path, size = futures[future]
+                done += size
+                result = future.result()
+                if result is not None:
+                    hashed[path] = result
+                self.__report(i, len(files), done, total, time.perf_counter() - start)
+        return hashed
+
+    def __report(self, count: int, files: int, done: int, total: int, elapsed: float) -> None:
+        if self.report is None:
+            return
+        speed = f", {convert_bytes_to_readable(int(done / elapsed))}/s" if elapsed > 0 else ""
+        self.report(f"Hashed {count}/{files} files, {convert_bytes_to_readable(done)} of "
+                    f"{convert_bytes_to_readable(total)}{speed}")
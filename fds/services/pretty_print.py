@@ -1,11 +1,17 @@
 from colorama import init
 from colorama import Fore
 
+_initialized = False
+
 
 class PrettyPrint(object):
 
     def __init__(self):
-        init(autoreset=True)
+        global _initialized
+        # Initializing again would wrap stdout again, e.g. replacing the one the fds daemon captures
+        if not _initialized:
+            init(autoreset=True)
+            _initialized = True
 
     def warn(self, text: str):
         print(Fore.YELLOW + text)
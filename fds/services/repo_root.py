@@ -0,0 +1,139 @@
+import os
+import threading
+from typing import Dict, Optional
+
+# Environment variables changing how git finds the repository, git itself is asked when they are set
+GIT_DISCOVERY_VARIABLES = ("GIT_DIR", "GIT_WORK_TREE", "GIT_CEILING_DIRECTORIES", "GIT_DISCOVERY_ACROSS_FILESYSTEM")
+
+# Roots found so far, by directory they were looked up from.
+# Only found roots are kept, a directory without a repository can be initialized at any time
+_roots: Dict[str, str] = {}
+_roots_lock = threading.Lock()
+
+
+def invalidate_repo_roots() -> None:
+    """
+    Forget the roots found so far, e.g. after git init or dvc init
+    """
+    with _roots_lock:
+        _roots.clear()
+
+
+def _memoize(kind: str, start: str, root: Optional[str]) -> Optional[str]:
+    if root is not None:
+        with _roots_lock:
+            _roots[f"{kind}:{start}"] = root
+    return root
+
+
+def _get_memoized(kind: str, start: str) -> Optional[str]:
+    with _roots_lock:
+        return _roots.get(f"{kind}:{start}")
+
+
+class ExoticLayout(Exception):
+    """
+    The repository can't be found by walking up the directories, only git itself can tell
+    """
+
+
+def _is_git_dir(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, "HEAD")) and os.path.isdir(os.path.join(path, "objects")) \
+        or os.path.isfile(os.path.join(path, "commondir"))
+
+
+def _get_core_worktree(git_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(git_dir, "config")) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    section = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith("["):
+            section = line.strip("[]").strip().lower()
+            continue
+        key, _, value = line.partition("=")
+        if section == "core" and key.strip().lower() == "worktree":
+            return value.strip().strip('"')
+    return None
+
+
+def _check_gitfile(path: str) -> bool:
+    """
+    Check a .git file, as used by worktrees and submodules
+    """
+    try:
+        with open(path) as f:
+            content = f.read(4096).strip()
+    except OSError:
+        return False
+    if not content.startswith("gitdir:"):
+        raise ExoticLayout(f"{path} is not a gitfile")
+    git_dir = os.path.join(os.path.dirname(path), content[len("gitdir:"):].strip())
+    if not os.path.isdir(git_dir):
+        return False
+    # Submodules set their work tree in their config, usually to the directory the .git file is in
+    worktree = _get_core_worktree(git_dir)
+    if worktree is not None and \
+            os.path.realpath(os.path.join(git_dir, worktree)) != os.path.realpath(os.path.dirname(path)):
+        raise ExoticLayout(f"{git_dir} has its work tree elsewhere")
+    return True
+
+
+def find_git_root(start: Optional[str] = None) -> Optional[str]:
+    """
+    Find the top level directory of the git work tree, the way git does, by walking up the directories
+    :param start: Directory to start from, defaults to the current directory
+    :return: the absolute path of the root, None if not inside a work tree
+    :raises ExoticLayout: if only git itself can tell
+    """
+    start = os.path.abspath(start or os.getcwd())
+    root = _get_memoized("git", start)
+    if root is not None:
+        return root
+    if any(os.environ.get(variable) for variable in GIT_DISCOVERY_VARIABLES):
+        raise ExoticLayout("git discovery is configured through the environment")
+    device = os.stat(start).st_dev
+    directory = start
+    while True:
+        if os.path.basename(directory) == ".git" or (
+                _is_git_dir(directory) and not os.path.exists(os.path.join(directory, ".git"))):
+            # Inside a git directory or a bare repository, there is no work tree
+            raise ExoticLayout(f"{directory} is a git directory")
+        dot_git = os.path.join(directory, ".git")
+        if os.path.isdir(dot_git):
+            if _is_git_dir(dot_git):
+                return _memoize("git", start, directory)
+        elif os.path.isfile(dot_git) and _check_gitfile(dot_git):
+            return _memoize("git", start, directory)
+        parent = os.path.dirname(directory)
+        # Like git, don't cross file systems
+        if parent == directory or os.stat(parent).st_dev != device:
+            return None
+        directory = parent
+
+
+def find_dvc_root(start: Optional[str] = None) -> Optional[str]:
+    """
+    Find the root of the dvc repository, the way dvc does: the closest directory with a .dvc directory,
+    which can be a sub directory of the git repository (dvc init --subdir)
+    :param start: Directory to start from, defaults to the current directory
+    :return: the absolute path of the root, None if not inside a dvc repository
+    """
+    start = os.path.abspath(start or os.getcwd())
+    root = _get_memoized("dvc", start)
+    if root is not None:
+        return root
+    directory = start
+    while True:
+        if os.path.isdir(os.path.join(directory, ".dvc")):
+            return _memoize("dvc", start, directory)
+        # Like dvc, don't cross mount points
+        if os.path.ismount(directory):
+            return None
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
@@ -0,0 +1,294 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+
+from fds.services.ignore_matcher import IgnorePattern, parse_ignore_line
+from fds.utils import parse_size
+
+RULES_FILE_NAME = ".fds.yaml"
+
+# Actions of the rules, named after the choices of the prompt
+ACTIONS = {
+    "dvc": "Add to DVC",
+    "git": "Add to Git",
+    "ignore": "Ignore",
+    "skip": "Skip",
+    "step_into": "Step Into",
+}
+# And back from the choices of the prompt to the actions
+CHOICE_ACTIONS = {choice: action for action, choice in ACTIONS.items()}
+
+RULE_KEYS = {"glob", "extension", "min_size", "max_size", "min_files", "max_files", "type", "action"}
+
+_GLOB_SPECIAL = re.compile(r'[*?\[\\]')
+
+
+@dataclass
+class RuleCandidate:
+    """
+    A path about to be prompted for
+    """
+    # Path relative to the repository root, `/` separated
+    path: str
+    is_dir: bool
+    # The size is only computed if a rule with a size condition is evaluated
+    get_size: Callable[[], int]
+    # Number of files inside a directory (1 for a file), None if unknown
+    file_count: Optional[int]
+
+
+@dataclass
+class Rule:
+    action: str
+    pattern: Optional[IgnorePattern] = None
+    extensions: Optional[List[str]] = None
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    min_files: Optional[int] = None
+    max_files: Optional[int] = None
+    type: Optional[str] = None
+    # Position in the rules file, the first matching rule wins
+    order: int = 0
+
+    def matches(self, candidate: RuleCandidate) -> bool:
+        if self.type is not None and (self.type == "dir") != candidate.is_dir:
+            return False
+        if self.extensions is not None and not any(
+                ext in self.extensions for ext in get_extensions(candidate.path)):
+            return False
+        if self.pattern is not None and not self.pattern.matches(candidate.path, candidate.is_dir):
+            return False
+        if self.min_files is not None or self.max_files is not None:
+            if not _in_range(candidate.file_count, self.min_files, self.max_files):
+                return False
+        if self.min_size is not None or self.max_size is not None:
+            return _in_range(candidate.get_size(), self.min_size, self.max_size)
+        return True
+
+
+def _in_range(value: Optional[int], minimum: Optional[int], maximum: Optional[int]) -> bool:
+    """
+    Whether a value is within bounds, an unknown value never is
+    """
+    if value is None:
+        return False
+    return (minimum is None or value >= minimum) and (maximum is None or value <= maximum)
+
+
+def get_extensions(path: str) -> List[str]:
+    """
+    All the extensions of a path, e.g. `.tar.gz` and `.gz` for `a/b.tar.gz`
+    """
+    name = path.rsplit('/', 1)[-1].lower()
+    extensions = []
+    dot = name.find('.', 1)
+    while dot > 0:
+        extensions.append(name[dot:])
+        dot = name.find('.', dot + 1)
+    return extensions
+
+
+def _normalize_extension(extension: str) -> str:
+    extension = extension.lower()
+    return extension if extension.startswith('.') else '.' + extension
+
+
+def _where(source: str, order: int) -> str:
+    return f"{source}: rule {order + 1}"
+
+
+def _parse_glob(rule: Rule, value: Any, source: str) -> None:
+    glob = str(value)
+    if glob.startswith('!'):
+        raise Exception(f"{_where(source, rule.order)} glob can't be negated")
+    rule.pattern = parse_ignore_line(glob, '', source, rule.order + 1)
+
+
+def _parse_extension(rule: Rule, value: Any, source: str) -> None:
+    extensions = value if isinstance(value, list) else [value]
+    rule.extensions = [_normalize_extension(str(extension)) for extension in extensions]
+
+
+def _size_parser(key: str) -> Callable[[Rule, Any, str], None]:
+    def parse(rule: Rule, value: Any, source: str) -> None:
+        try:
+            setattr(rule, key, parse_size(value))
+        except ValueError as e:
+            raise Exception(f"{_where(source, rule.order)} {key}: {e}")
+    return parse
+
+
+def _count_parser(key: str) -> Callable[[Rule, Any, str], None]:
+    def parse(rule: Rule, value: Any, source: str) -> None:
+        if not isinstance(value, int):
+            raise Exception(f"{_where(source, rule.order)} {key} should be a number")
+        setattr(rule, key, value)
+    return parse
+
+
+def _parse_type(rule: Rule, value: Any, source: str) -> None:
+    if value not in ("file", "dir"):
+        raise Exception(f"{_where(source, rule.order)} type should be file or dir")
+    rule.type = value
+
+
+# How every condition of a rule is parsed into the Rule, the action is parsed first
+_CONDITION_PARSERS: Dict[str, Callable[[Rule, Any, str], None]] = {
+    "glob": _parse_glob,
+    "extension": _parse_extension,
+    "min_size": _size_parser("min_size"),
+    "max_size": _size_parser("max_size"),
+    "min_files": _count_parser("min_files"),
+    "max_files": _count_parser("max_files"),
+    "type": _parse_type,
+}
+
+
+def parse_rule(raw: Any, order: int, source: str) -> Rule:
+    """
+    Parse a single rule of the rules file
+    :param raw: The rule as loaded from yaml
+    :param order: Position of the rule
+    :param source: The rules file, for reporting
+    :return: Rule
+    """
+    where = _where(source, order)
+    if not isinstance(raw, dict):
+        raise Exception(f"{where} should be a mapping")
+    unknown = set(raw) - RULE_KEYS
+    if unknown:
+        raise Exception(f"{where} has unknown keys {sorted(unknown)}")
+    action = str(raw.get("action", "")).lower()
+    if action not in ACTIONS:
+        raise Exception(f"{where} action should be one of {list(ACTIONS)}")
+    rule = Rule(action=action, order=order)
+    for key, parse in _CONDITION_PARSERS.items():
+        if key in raw:
+            parse(rule, raw[key], source)
+    return rule
+
+
+class RuleSet(object):
+    """
+    Routing rules of fds add, loaded from .fds.yaml at the root of the repository:
+
+        default: skip            # action of --auto for paths no rule matches, defaults to dvc
+        rules:
+          - glob: "data/**/*.parquet"
+            action: dvc
+          - extension: [log, tmp]
+            action: ignore
+          - type: dir
+            min_files: 10000
+            action: dvc
+          - min_size: 2GB
+            action: skip
+
+    Rules are tried in order and the first matching one wins. To stay fast on millions of paths they are
+    indexed by extension, basename and literal directory prefix, so only the rules which can possibly
+    match a path are evaluated.
+    """
+
+    def __init__(self, rules: List[Rule], default: str = "dvc"):
+        self.rules = rules
+        self.default = default
+        self._by_extension: Dict[str, List[Rule]] = {}
+        self._by_name: Dict[str, List[Rule]] = {}
+        self._by_prefix: Dict[str, List[Rule]] = {}
+        self._generic: List[Rule] = []
+        for rule in rules:
+            self.__index(rule)
+
+    def __index(self, rule: Rule) -> None:
+        if rule.extensions is not None:
+            for extension in rule.extensions:
+                self._by_extension.setdefault(extension, []).append(rule)
+            return
+        pattern = rule.pattern
+        if pattern is not None:
+            glob = pattern.text.lstrip('/').rstrip('/')
+            if not pattern.anchored:
+                if not _GLOB_SPECIAL.search(glob):
+                    self._by_name.setdefault(glob, []).append(rule)
+                    return
+                if glob.startswith('*.') and not _GLOB_SPECIAL.search(glob[2:]):
+                    self._by_extension.setdefault(_normalize_extension(glob[1:]), []).append(rule)
+                    return
+            else:
+                prefix = []
+                for part in glob.split('/')[:-1]:
+                    if _GLOB_SPECIAL.search(part):
+                        break
+                    prefix.append(part)
+                if prefix:
+                    self._by_prefix.setdefault('/'.join(prefix), []).append(rule)
+                    return
+        self._generic.append(rule)
+
+    @classmethod
+    def load(cls, repo_path: str) -> 'RuleSet':
+        """
+        Load the rules of a repository
+        :param repo_path: Root of the repository
+        :return: RuleSet, without rules if there is no rules file
+        """
+        path = os.path.join(repo_path, RULES_FILE_NAME)
+        if not os.path.isfile(path):
+            return cls([])
+        import yaml
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config = yaml.safe_load(f) or {}
+        except yaml.YAMLError as e:
+            raise Exception(f"{RULES_FILE_NAME} is not valid yaml: {e}")
+        if not isinstance(config, dict):
+            raise Exception(f"{RULES_FILE_NAME} should be a mapping with `rules` and `default`")
+        default = str(config.get("default", "dvc")).lower()
+        if default not in ACTIONS or default == "step_into":
+            raise Exception(f"{RULES_FILE_NAME}: default should be one of dvc, git, ignore or skip")
+        raw_rules = config.get("rules") or []
+        if not isinstance(raw_rules, list):
+            raise Exception(f"{RULES_FILE_NAME}: rules should be a list")
+        return cls([parse_rule(raw, order, RULES_FILE_NAME) for order, raw in enumerate(raw_rules)], default)
+
+    def __candidates(self, path: str) -> List[Rule]:
+        candidates = list(self._generic)
+        for extension in get_extensions(path):
+            candidates.extend(self._by_extension.get(extension, ()))
+        candidates.extend(self._by_name.get(path.rsplit('/', 1)[-1], ()))
+        if self._by_prefix:
+            slash = path.find('/')
+            while slash > 0:
+                candidates.extend(self._by_prefix.get(path[:slash], ()))
+                slash = path.find('/', slash + 1)
+        # A rule indexed by several extensions can come up more than once
+        return sorted({rule.order: rule for rule in candidates}.values(), key=lambda rule: rule.order)
+
+    def match(self, candidate: RuleCandidate) -> Optional[Rule]:
+        """
+        Find the first rule matching a path
+        :param candidate: The path to route
+        :return: the matching Rule, None if no rule matches
+        """
+        if not self.rules:
+            return None
+        for rule in self.__candidates(candidate.path):
+            if rule.matches(candidate):
+                return rule
+        return None
+
+    def get_choice(self, candidate: RuleCandidate, auto: bool = False) -> Optional[str]:
+        """
+        Choice for a path, as if it was answered in the prompt
+        :param candidate: The path to route
+        :param auto: Use the default action when no rule matches, instead of prompting
+        :return: one of the DvcChoices values, None if the user has to be asked
+        """
+        rule = self.match(candidate)
+        if rule is not None:
+            return ACTIONS[rule.action]
+        if auto:
+            return ACTIONS[self.default]
+        return None
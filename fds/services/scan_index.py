@@ -0,0 +1,187 @@
+import functools
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from fds.logger import Logger
+from fds.services.fds_dir import get_fds_dir
+from fds.services.scanner import EntryKind, ScanEntry
+
+# Paths which can't be encoded end up as ValueError
+INDEX_ERRORS = (sqlite3.Error, ValueError)
+
+INDEX_FILE_NAME = "index.sqlite"
+
+
+def _synchronized(method):
+    # The scanner lists directories from several threads, they share one connection
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class ScanIndex(object):
+    """
+    Persistent index of the workspace scan, stored in .fds/index.sqlite
+
+    For every directory it records the (inode, mtime) it had when it was listed, its listing with the
+    stat metadata of the entries and its aggregated size. Directories whose inode and mtime didn't change
+    are not listed again. A file changed in place doesn't change the mtime of its directory, so the files
+    of an unchanged directory are still lstat-ed, unless trust_mtime is set (useful on network filesystems).
+
+    The index is a cache: when it can't be read it is deleted and the scan falls back to a full scan.
+    """
+
+    # 2: the sizes are the apparent sizes, no longer the allocated ones
+    SCHEMA_VERSION = "2"
+
+    def __init__(self, repo_path: str, rebuild: bool = False, trust_mtime: bool = False, in_memory: bool = False):
+        """
+        :param repo_path: The repository root
+        :param rebuild: Start from an empty index
+        :param trust_mtime: Don't lstat the files of the directories whose mtime didn't change
+        :param in_memory: Start from an empty index only kept in memory, nothing is written, e.g. in a dry run
+        """
+        self.logger = Logger.get_logger("fds.ScanIndex")
+        self.repo_path = os.path.abspath(repo_path)
+        self.in_memory = in_memory
+        self.path = ":memory:" if in_memory else os.path.join(get_fds_dir(self.repo_path), INDEX_FILE_NAME)
+        self.trust_mtime = trust_mtime
+        self.connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        if rebuild:
+            self._delete()
+        try:
+            self._open()
+        except sqlite3.DatabaseError as e:
+            self.logger.warning(f"Scan index is corrupt ({e}), rebuilding it")
+            self._delete()
+            self._open()
+
+    def _open(self) -> None:
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        cursor = self.connection.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = cursor.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is not None and row[0] != self.SCHEMA_VERSION:
+            cursor.execute("DROP TABLE IF EXISTS dirs")
+            cursor.execute("DROP TABLE IF EXISTS entries")
+        cursor.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self.SCHEMA_VERSION,))
+        cursor.execute("CREATE TABLE IF NOT EXISTS dirs "
+                       "(path TEXT PRIMARY KEY, inode INTEGER, mtime_ns INTEGER, size INTEGER)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS entries "
+                       "(dir TEXT, name TEXT, kind INTEGER, size INTEGER, inode INTEGER, mtime_ns INTEGER, "
+                       "PRIMARY KEY (dir, name)) WITHOUT ROWID")
+        self.connection.commit()
+
+    def _delete(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        if self.in_memory:
+            return
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def _disable(self, error: Exception) -> None:
+        # Never fail a scan because of the index, just stop using it and start from scratch next time
+        self.logger.warning(f"Scan index failed ({error}), falling back to a full scan")
+        self._delete()
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.repo_path)
+
+    @_synchronized
+    def get_listing(self, path: str, dir_stat: os.stat_result) -> Optional[List[ScanEntry]]:
+        """
+        Get the recorded listing of a directory, if the directory didn't change since
+        :param path: The directory
+        :param dir_stat: lstat of the directory
+        :return: list of entries, None if the directory needs to be listed again
+        """
+        if self.connection is None:
+            return None
+        key = self._key(path)
+        try:
+            row = self.connection.execute("SELECT inode, mtime_ns FROM dirs WHERE path = ?", (key,)).fetchone()
+            if row is None or row[0] != dir_stat.st_ino or row[1] != dir_stat.st_mtime_ns:
+                return None
+            return self.connection.execute(
+                "SELECT name, kind, size, inode, mtime_ns FROM entries WHERE dir = ? ORDER BY name", (key,)
+            ).fetchall()
+        except INDEX_ERRORS as e:
+            self._disable(e)
+            return None
+
+    @_synchronized
+    def put_listing(self, path: str, dir_stat: os.stat_result, entries: List[ScanEntry]) -> None:
+        """
+        Record the listing of a directory, dropping the records of sub directories that don't exist anymore
+        :param path: The directory
+        :param dir_stat: lstat of the directory when it was listed
+        :param entries: The entries of the directory
+        """
+        if self.connection is None:
+            return
+        key = self._key(path)
+        try:
+            previous_dirs = {row[0] for row in self.connection.execute(
+                "SELECT name FROM entries WHERE dir = ? AND kind = ?", (key, EntryKind.DIR))}
+            removed_dirs = previous_dirs - {entry[0] for entry in entries if entry[1] == EntryKind.DIR}
+            self.connection.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, COALESCE("
+                                    "(SELECT size FROM dirs WHERE path = ?), 0))",
+                                    (key, dir_stat.st_ino, dir_stat.st_mtime_ns, key))
+            self.connection.execute("DELETE FROM entries WHERE dir = ?", (key,))
+            self.connection.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                                        ((key,) + tuple(entry) for entry in entries))
+            for name in removed_dirs:
+                removed = os.path.join(key, name) if key != os.curdir else name
+                # Everything below `removed/` sorts between `removed/` and `removed0`
+                subtree = (removed, removed + "/", removed + "0")
+                self.connection.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", subtree)
+                self.connection.execute("DELETE FROM entries WHERE dir = ? OR (dir >= ? AND dir < ?)", subtree)
+        except INDEX_ERRORS as e:
+            self._disable(e)
+
+    @_synchronized
+    def put_sizes(self, sizes: Dict[str, int]) -> None:
+        """
+        Record the aggregated size of directories
+        :param sizes: dict of directory path to aggregated size
+        """
+        if self.connection is None:
+            return
+        try:
+            self.connection.executemany("UPDATE dirs SET size = ? WHERE path = ?",
+                                        ((size, self._key(path)) for path, size in sizes.items()))
+        except INDEX_ERRORS as e:
+            self._disable(e)
+
+    @_synchronized
+    def get_size(self, path: str) -> Optional[int]:
+        """
+        Get the aggregated size of a directory recorded by the last scan
+        """
+        if self.connection is None:
+            return None
+        try:
+            row = self.connection.execute("SELECT size FROM dirs WHERE path = ?", (self._key(path),)).fetchone()
+        except INDEX_ERRORS as e:
+            self._disable(e)
+            return None
+        return None if row is None else row[0]
+
+    @_synchronized
+    def close(self) -> None:
+        if self.connection is None:
+            return
+        try:
+            self.connection.commit()
+            self.connection.close()
+        except INDEX_ERRORS as e:
+            self._disable(e)
+        self.connection = None
@@ -0,0 +1,169 @@
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fds.domain.constants import SCAN_JOBS
+
+
+class EntryKind(object):
+    FILE = 0
+    DIR = 1
+    OTHER = 2
+
+
+# (name, kind, size, inode, mtime_ns), size is 0 for directories
+ScanEntry = Tuple[str, int, int, int, int]
+ListDir = Callable[[str], List[ScanEntry]]
+
+
+def get_file_size(st: os.stat_result) -> int:
+    """
+    Size of a file from its stat. The apparent size, which is what git and dvc store,
+    even for sparse or compressed files which take less on disk.
+    """
+    return st.st_size
+
+
+def scan_dir(path: str) -> List[ScanEntry]:
+    """
+    List a directory, stat-ing every entry once (the DirEntry caches the stat)
+    :param path: The directory to list
+    :return: list of entries sorted by name
+    """
+    entries = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    entries.append((entry.name, EntryKind.DIR, 0, st.st_ino, st.st_mtime_ns))
+                    continue
+                kind = EntryKind.FILE if stat.S_ISREG(st.st_mode) else EntryKind.OTHER
+                entries.append((entry.name, kind, get_file_size(st), st.st_ino, st.st_mtime_ns))
+    except OSError:
+        # Unreadable directories count as empty, same as a failing walk
+        pass
+    entries.sort()
+    return entries
+
+
+def get_scan_jobs(jobs: Optional[int] = None) -> int:
+    """
+    Number of threads to scan with, --jobs wins over FDS_JOBS
+    """
+    return max(1, jobs if jobs is not None else SCAN_JOBS)
+
+
+class ParallelScanner(object):
+    """
+    Lists directories on a bounded thread pool.
+
+    On network filesystems every stat is a round trip, listing many directories at once hides that latency.
+    With a single job everything runs in the calling thread.
+    """
+
+    def __init__(self, jobs: Optional[int] = None):
+        self.jobs = get_scan_jobs(jobs)
+        self.executor: Optional[ThreadPoolExecutor] = None
+        if self.jobs > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="fds-scan")
+        # How many of the next directories of a walk are listed ahead of time
+        self.lookahead = self.jobs * 2
+
+    def __enter__(self) -> 'ParallelScanner':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    @staticmethod
+    def _children(entries: List[ScanEntry], exclude: Iterable[str]) -> List[ScanEntry]:
+        return [entry for entry in entries if not (entry[1] == EntryKind.DIR and entry[0] in exclude)]
+
+    def list_tree(self, root: str, exclude: Iterable[str] = (),
+                  list_dir: ListDir = scan_dir) -> Iterator[Tuple[str, List[ScanEntry]]]:
+        """
+        List every directory below root. A directory is always yielded before its sub directories,
+        but apart from that in the order the listings complete
+        :param root: The directory to start from
+        :param exclude: Names of directories not to descend into, they are left out of the listings
+        :param list_dir: Function listing a single directory
+        :return: iterator of (directory path, entries)
+        """
+        exclude = set(exclude)
+        if self.executor is None:
+            stack = [root]
+            while stack:
+                path = stack.pop()
+                entries = self._children(list_dir(path), exclude)
+                yield path, entries
+                stack.extend(os.path.join(path, entry[0]) for entry in entries if entry[1] == EntryKind.DIR)
+            return
+
+        pending: Dict[Future, str] = {self.executor.submit(list_dir, root): root}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    entries = self._children(future.result(), exclude)
+                    for entry in entries:
+                        if entry[1] == EntryKind.DIR:
+                            child = os.path.join(path, entry[0])
+                            pending[self.executor.submit(list_dir, child)] = child
+                    yield path, entries
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def walk(self, top: str, exclude: Iterable[str] = (),
+             list_dir: ListDir = scan_dir) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """
+        Same as os.walk(top, topdown=True) but in a deterministic order (sorted, depth first),
+        while the next directories of the walk are listed in the background.
+        Like os.walk, removing names from the yielded dirs prunes them from the walk.
+        :param top: The directory to walk
+        :param exclude: Names of directories to always skip
+        :param list_dir: Function listing a single directory
+        :return: iterator of (root, dirs, files)
+        """
+        for root, dirs, files in self.walk_entries(top, exclude, list_dir):
+            yield root, dirs, [entry[0] for entry in files]
+
+    def walk_entries(self, top: str, exclude: Iterable[str] = (),
+                     list_dir: ListDir = scan_dir) -> Iterator[Tuple[str, List[str], List[ScanEntry]]]:
+        """
+        Same as walk, but with the entries of the files instead of their names
+        :return: iterator of (root, dirs, file entries)
+        """
+        if not os.path.isdir(top):
+            return
+        exclude = set(exclude)
+        futures: Dict[str, Future] = {}
+        stack = [top]
+        try:
+            while stack:
+                if self.executor is not None:
+                    # The end of the stack is what comes next in the walk
+                    for ahead in stack[-self.lookahead:]:
+                        if ahead not in futures:
+                            futures[ahead] = self.executor.submit(list_dir, ahead)
+                path = stack.pop()
+                future = futures.pop(path, None)
+                entries = future.result() if future is not None else list_dir(path)
+                dirs = [entry[0] for entry in entries if entry[1] == EntryKind.DIR and entry[0] not in exclude]
+                files = [entry for entry in entries if entry[1] != EntryKind.DIR]
+                yield path, dirs, files
+                stack.extend(os.path.join(path, d) for d in reversed(dirs))
+        finally:
+            for future in futures.values():
+                future.cancel()
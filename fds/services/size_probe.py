@@ -0,0 +1,120 @@
+import os
+import stat
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Set, Tuple
+
+from fds.services.scanner import get_file_size
+from fds.utils import convert_bytes_to_readable
+
+
+@dataclass(frozen=True)
+class SizeProbe:
+    """
+    Result of a bounded size probe, when it is not exact the real size is at least `size`
+    """
+    size: int
+    exact: bool
+
+    def __str__(self) -> str:
+        readable = convert_bytes_to_readable(self.size)
+        return readable if self.exact else f"at least {readable}"
+
+
+def _list_sizes(directory: str, subdirectories: List[str], seen: Set[Tuple[int, int]]) -> List[int]:
+    """
+    Sizes of the files directly in a directory, biggest first
+    :param directory: The directory to list
+    :param subdirectories: Its subdirectories are appended to it
+    :param seen: (device, inode) of the hardlinked files already counted, updated
+    :return: list of sizes, empty if the directory can't be listed
+    """
+    sizes = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    subdirectories.append(entry.path)
+                    continue
+                if st.st_nlink > 1:
+                    if (st.st_dev, st.st_ino) in seen:
+                        continue
+                    seen.add((st.st_dev, st.st_ino))
+                sizes.append(get_file_size(st))
+    except OSError:
+        return []
+    # The listing already paid for the stats, so count the biggest first to cross the limit as early as possible
+    sizes.sort(reverse=True)
+    return sizes
+
+
+def probe_size(path: str, limit: int) -> SizeProbe:
+    """
+    Size a path, but stop as soon as it is known to be at least `limit`.
+    The biggest files of a directory are counted first and hardlinked files are only counted once.
+    :param path: The file or directory to size
+    :param limit: Size at which the probe stops
+    :return: SizeProbe, exact if the whole path was sized
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return SizeProbe(0, True)
+    if not stat.S_ISDIR(st.st_mode):
+        return SizeProbe(get_file_size(st), True)
+    total = 0
+    seen: Set[Tuple[int, int]] = set()
+    stack = [path]
+    while stack:
+        for size in _list_sizes(stack.pop(), stack, seen):
+            total += size
+            if total >= limit:
+                return SizeProbe(total, False)
+    return SizeProbe(total, True)
+
+
+class LazySize(object):
+    """
+    Exact size of a path, computed in the background until it is needed.
+    """
+
+    _executor: Optional[ThreadPoolExecutor] = None
+
+    def __init__(self, path: str, size: Optional[int] = None):
+        self.path = path
+        if size is not None:
+            self._future: Future = Future()
+            self._future.set_result(size)
+        else:
+            # Same as the probe without a limit, so both agree on hardlinks
+            self._future = LazySize.__get_executor().submit(lambda: probe_size(path, sys.maxsize).size)
+
+    @staticmethod
+    def __get_executor() -> ThreadPoolExecutor:
+        if LazySize._executor is None:
+            LazySize._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="fds-size")
+        return LazySize._executor
+
+    @staticmethod
+    def shutdown() -> None:
+        """
+        Stop the background sizing, the sizes which weren't needed are not waited for
+        """
+        if LazySize._executor is not None:
+            LazySize._executor.shutdown(wait=False)
+            LazySize._executor = None
+
+    def get(self) -> int:
+        """
+        Wait for the exact size
+        :return: size in bytes
+        """
+        return self._future.result()
+
+    def __str__(self) -> str:
+        return convert_bytes_to_readable(self.get())
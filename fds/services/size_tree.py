@@ -0,0 +1,217 @@
+import os
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+from fds.services.scan_index import ScanIndex
+from fds.services.scanner import EntryKind, ParallelScanner, ScanEntry, get_file_size, scan_dir
+
+
+class SizeTree(object):
+    """
+    In memory tree of a directory with the aggregated size of every subtree.
+
+    The tree is built with a single traversal, every entry is stat-ed exactly once.
+    To keep millions of entries in memory, the nodes are not python objects but indexes
+    into parallel arrays, and path components are interned so that repeated names
+    (e.g. `images`, `labels`, `train`) are stored only once.
+
+    Children of a directory are stored next to each other and sorted by name,
+    so looking up a path is a binary search per path component.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.normpath(root)
+        # Interned path components
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        # Parallel arrays, indexed by node
+        self._name: array = array('l')
+        self._parent: array = array('l')
+        self._size: array = array('q')
+        # Number of files in the subtree, 1 for a file
+        self._files: array = array('q')
+        self._kind: bytearray = bytearray()
+        self._first_child: array = array('l')
+        self._child_count: array = array('l')
+
+    def __len__(self) -> int:
+        return len(self._kind)
+
+    def _intern(self, name: str) -> int:
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = len(self._names)
+            self._names.append(name)
+            self._name_ids[name] = name_id
+        return name_id
+
+    def _append(self, name: str, parent: int, size: int, kind: int) -> int:
+        self._name.append(self._intern(name))
+        self._parent.append(parent)
+        self._size.append(size)
+        self._files.append(0 if kind == EntryKind.DIR else 1)
+        self._kind.append(kind)
+        self._first_child.append(-1)
+        self._child_count.append(0)
+        return len(self._kind) - 1
+
+    @staticmethod
+    def _is_unchanged(path: str, entries: List[ScanEntry]) -> bool:
+        for name, kind, size, inode, mtime_ns in entries:
+            if kind == EntryKind.DIR:
+                continue
+            try:
+                st = os.lstat(os.path.join(path, name))
+            except OSError:
+                return False
+            if (get_file_size(st), st.st_ino, st.st_mtime_ns) != (size, inode, mtime_ns):
+                return False
+        return True
+
+    @classmethod
+    def _list_dir(cls, path: str, index: Optional[ScanIndex]) -> List[ScanEntry]:
+        """
+        List a directory, using the listing recorded in the index if the directory didn't change
+        """
+        if index is None:
+            return scan_dir(path)
+        try:
+            dir_stat = os.lstat(path)
+        except OSError:
+            return []
+        entries = index.get_listing(path, dir_stat)
+        if entries is not None and (index.trust_mtime or cls._is_unchanged(path, entries)):
+            return entries
+        entries = scan_dir(path)
+        index.put_listing(path, dir_stat, entries)
+        return entries
+
+    @classmethod
+    def build(cls, root: str, exclude: Iterable[str] = (), index: Optional[ScanIndex] = None,
+              scanner: Optional[ParallelScanner] = None, keep_files: bool = True) -> 'SizeTree':
+        """
+        Build the size tree of a path in a single traversal
+        :param root: The file or directory to scan
+        :param exclude: Names of directories not to scan, e.g. .git
+        :param index: Optional scan index to reuse the listings of unchanged directories from, and update
+        :param scanner: Optional scanner to list the directories in parallel
+        :param keep_files: Keep the files in the tree. Without them the memory only grows with the number of
+                           directories, the sizes of the files are still part of the sizes of their directories
+        :return: SizeTree with aggregated sizes
+        """
+        tree = cls(root)
+        if not os.path.isdir(tree.root):
+            size = get_file_size(os.lstat(tree.root)) if os.path.lexists(tree.root) else 0
+            tree._append(tree.root, -1, size, EntryKind.FILE)
+            return tree
+
+        tree._append(tree.root, -1, 0, EntryKind.DIR)
+        directories = []
+        # Directories which are being listed, a directory is always listed after its parent
+        pending = {tree.root: 0}
+        scanner = scanner or ParallelScanner(jobs=1)
+        for path, entries in scanner.list_tree(tree.root, exclude, lambda p: cls._list_dir(p, index)):
+            node = pending.pop(path)
+            directories.append((node, path))
+            first_child = len(tree)
+            for name, kind, size, _, _ in entries:
+                if kind == EntryKind.DIR:
+                    pending[os.path.join(path, name)] = tree._append(name, node, size, kind)
+                elif keep_files:
+                    tree._append(name, node, size, kind)
+                else:
+                    tree._size[node] += size
+                    tree._files[node] += 1
+            tree._first_child[node] = first_child
+            tree._child_count[node] = len(tree) - first_child
+
+        # Children always come after their parent, so one reverse pass aggregates the sizes bottom-up
+        sizes, files, parents = tree._size, tree._files, tree._parent
+        for node in range(len(tree) - 1, 0, -1):
+            sizes[parents[node]] += sizes[node]
+            files[parents[node]] += files[node]
+        if index is not None:
+            index.put_sizes({path: sizes[node] for node, path in directories})
+        return tree
+
+    def _find_child(self, node: int, name: str) -> int:
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            return -1
+        start = self._first_child[node]
+        if start < 0:
+            return -1
+        end = start + self._child_count[node]
+        index = self._bisect(start, end, name)
+        if index < end and self._name[index] == name_id:
+            return index
+        return -1
+
+    def _bisect(self, start: int, end: int, name: str) -> int:
+        # Children are sorted by name, so binary search through them
+        names, name_of = self._names, self._name
+        while start < end:
+            middle = (start + end) // 2
+            if names[name_of[middle]] < name:
+                start = middle + 1
+            else:
+                end = middle
+        return start
+
+    def _find(self, path: str) -> int:
+        relative = os.path.relpath(os.path.normpath(path), self.root)
+        if relative == os.curdir:
+            return 0 if len(self) else -1
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            return -1
+        node = 0
+        for part in relative.split(os.sep):
+            node = self._find_child(node, part)
+            if node < 0:
+                return -1
+        return node
+
+    def __contains__(self, path: str) -> bool:
+        return self._find(path) >= 0
+
+    def get_size(self, path: str) -> Optional[int]:
+        """
+        Get the aggregated size of a path inside the tree
+        :param path: Path to lookup, either relative to cwd or absolute like the root
+        :return: size in bytes, None if the path is not part of the tree
+        """
+        node = self._find(path)
+        if node < 0:
+            return None
+        return self._size[node]
+
+    def get_file_count(self, path: str) -> Optional[int]:
+        """
+        Get the number of files inside a path of the tree
+        :param path: Path to lookup
+        :return: number of files, 1 for a file, None if the path is not part of the tree
+        """
+        node = self._find(path)
+        if node < 0:
+            return None
+        return self._files[node]
+
+    def get_entries(self, path: str) -> Optional[List[ScanEntry]]:
+        """
+        Get the listing of a directory from the tree, without touching the filesystem.
+        Only the sub directories are listed when the tree was built without the files.
+        :param path: The directory
+        :return: entries sorted by name with their aggregated sizes, None if the path is not a directory of the tree
+        """
+        node = self._find(path)
+        if node < 0 or self._kind[node] != EntryKind.DIR:
+            return None
+        start = self._first_child[node]
+        if start < 0:
+            return []
+        return [(self._names[self._name[child]], self._kind[child], self._size[child], 0, 0)
+                for child in range(start, start + self._child_count[node])]
+
+    def is_dir(self, path: str) -> bool:
+        node = self._find(path)
+        return node >= 0 and self._kind[node] == EntryKind.DIR
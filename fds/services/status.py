@@ -0,0 +1,197 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from fds.domain.constants import MAX_THRESHOLD_SIZE
+from fds.services.pretty_print import PrettyPrint
+from fds.services.scanner import get_scan_jobs
+from fds.services.size_probe import SizeProbe, probe_size
+from fds.utils import convert_bytes_to_string
+
+# States of the XY field of `git status --porcelain=v2`
+GIT_STATES = {
+    "M": "modified",
+    "T": "type changed",
+    "A": "added",
+    "D": "deleted",
+    "R": "renamed",
+    "C": "copied",
+    "U": "unmerged",
+}
+
+
+@dataclass
+class StatusEntry:
+    # Relative to the root of the git repository, `/` separated
+    path: str
+    # e.g. modified, added, deleted, or the state dvc reports
+    state: str
+    # Untracked paths are only sized up to the threshold, size_exact tells if the size is at least `size`
+    size: Optional[int] = None
+    size_exact: bool = True
+    # Path before a rename or copy
+    original_path: Optional[str] = None
+    # The .dvc file or stage reporting a dvc change
+    stage: Optional[str] = None
+
+    def get_readable_size(self) -> str:
+        return "" if self.size is None else str(SizeProbe(self.size, self.size_exact))
+
+
+@dataclass
+class RepoStatus:
+    """
+    Status of the git and the dvc repository together
+    """
+    branch: Optional[str] = None
+    # Changes to be committed
+    tracked: List[StatusEntry] = field(default_factory=list)
+    # Changes not staged for commit
+    modified: List[StatusEntry] = field(default_factory=list)
+    # Untracked paths below the threshold size, which fds add adds to git
+    untracked: List[StatusEntry] = field(default_factory=list)
+    # Untracked paths of at least the threshold size, which fds add asks about
+    untracked_large: List[StatusEntry] = field(default_factory=list)
+    # Outputs and stages dvc reports as changed
+    dvc_changed: List[StatusEntry] = field(default_factory=list)
+
+    def is_clean(self) -> bool:
+        return not (self.tracked or self.modified or self.untracked or self.untracked_large or self.dvc_changed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"threshold": MAX_THRESHOLD_SIZE, **asdict(self)}
+
+
+def _get_git_state(state: str) -> str:
+    return GIT_STATES.get(state, state)
+
+
+def parse_git_status(output: bytes) -> RepoStatus:
+    """
+    Parse `git status --porcelain=v2 -z --branch`
+    :param output: stdout of git status
+    :return: RepoStatus, without sizes and without the dvc changes
+    """
+    status = RepoStatus()
+    records = convert_bytes_to_string(output).split("\0")
+    i = 0
+    while i < len(records):
+        record = records[i]
+        i += 1
+        if record.startswith("# branch.head "):
+            head = record[len("# branch.head "):]
+            status.branch = None if head == "(detached)" else head
+        elif record.startswith(("1 ", "2 ", "u ")):
+            kind = record[0]
+            # Fields before the path: 8 of them for changed entries, 9 for renames and 10 for unmerged ones
+            fields = record.split(" ", {"1": 8, "2": 9, "u": 10}[kind])
+            xy, path = fields[1], fields[-1]
+            original_path = None
+            if kind == "2":
+                # The original path is the next record
+                original_path = records[i]
+                i += 1
+            if kind == "u":
+                status.modified.append(StatusEntry(path, _get_git_state("U")))
+                continue
+            if xy[0] != ".":
+                status.tracked.append(StatusEntry(path, _get_git_state(xy[0]), original_path=original_path))
+            if xy[1] != ".":
+                status.modified.append(StatusEntry(path, _get_git_state(xy[1])))
+        elif record.startswith("? "):
+            status.untracked.append(StatusEntry(record[2:], "untracked"))
+    return status
+
+
+def parse_dvc_status(output: bytes, base: str) -> List[StatusEntry]:
+    """
+    Parse `dvc status --json`
+    :param output: stdout of dvc status
+    :param base: Directory the paths are made relative to
+    :return: list of StatusEntry, one per changed output or dependency, or per changed stage
+    """
+    text = convert_bytes_to_string(output).strip()
+    data = json.loads(text) if text else {}
+    entries = []
+    for stage, changes in data.items():
+        stage_path = _relative_to(stage, base)
+        for change in changes:
+            if isinstance(change, str):
+                # e.g. always changed, changed checksum
+                entries.append(StatusEntry(stage_path, change, stage=stage_path))
+                continue
+            for paths in change.values():
+                if not isinstance(paths, dict):
+                    continue
+                for path, state in paths.items():
+                    entries.append(StatusEntry(_relative_to(path, base), state, stage=stage_path))
+    return entries
+
+
+def _relative_to(path: str, base: str) -> str:
+    return os.path.relpath(os.path.abspath(path), base).replace(os.sep, "/")
+
+
+def get_dvc_targets(targets: List[str]) -> List[str]:
+    """
+    The targets dvc status can check: directories (searched for .dvc files and stages), .dvc files and dvc outputs.
+    Files dvc doesn't know about can't have dvc changes, so they are left out
+    :param targets: The paths to check
+    :return: list of targets for `dvc status -R`
+    """
+    return [target for target in targets
+            if os.path.isdir(target) or target.endswith(".dvc") or os.path.exists(f"{target}.dvc")]
+
+
+def add_sizes(status: RepoStatus, base: str, jobs: Optional[int] = None) -> None:
+    """
+    Size the paths of a status, in parallel. Untracked paths are only sized up to the threshold size,
+    and split into untracked and untracked_large accordingly
+    :param status: The status to size
+    :param base: Directory the paths of the status are relative to
+    :param jobs: Number of threads sizing the paths
+    """
+    def size(entry: StatusEntry) -> None:
+        if entry.state == "deleted":
+            return
+        probe = probe_size(os.path.join(base, entry.path.rstrip("/")), MAX_THRESHOLD_SIZE)
+        entry.size, entry.size_exact = probe.size, probe.exact
+
+    entries = status.tracked + status.modified + status.untracked + status.dvc_changed
+    with ThreadPoolExecutor(max_workers=get_scan_jobs(jobs)) as executor:
+        list(executor.map(size, entries))
+    untracked = status.untracked
+    status.untracked = [entry for entry in untracked if entry.size < MAX_THRESHOLD_SIZE]
+    status.untracked_large = [entry for entry in untracked if entry.size >= MAX_THRESHOLD_SIZE]
+
+
+def render_status(status: RepoStatus, printer: PrettyPrint) -> None:
+    """
+    Show a status as text
+    """
+    if status.branch is not None:
+        printer.log(f"On branch {status.branch}")
+    sections = [
+        ("Changes to be committed:", status.tracked, printer.success),
+        ("Changes not staged for commit:", status.modified, printer.error),
+        ("Large untracked files, use fds add to add them to DVC or Git:", status.untracked_large, printer.warn),
+        ("Untracked files:", status.untracked, printer.error),
+        ("DVC changes:", status.dvc_changed, printer.warn),
+    ]
+    for title, entries, show in sections:
+        if not entries:
+            continue
+        printer.log(title)
+        for entry in entries:
+            line = f"\t{entry.state}: {entry.path}" if entry.state != "untracked" else f"\t{entry.path}"
+            if entry.original_path is not None:
+                line += f" (from {entry.original_path})"
+            if entry.stage is not None and entry.stage != entry.path:
+                line += f" ({entry.stage})"
+            if entry.size is not None:
+                line += f"  {entry.get_readable_size()}"
+            show(line)
+    if status.is_clean():
+        printer.success("Nothing to commit, working tree clean")
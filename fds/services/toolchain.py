@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass, field
+from shutil import which
+from typing import Dict, List, Optional, Tuple
+
+from fds.logger import Logger
+from fds.utils import convert_bytes_to_string, execute_commands, get_user_cache_dir, write_file_atomically
+
+TOOLCHAIN_FILE_NAME = "toolchain.json"
+
+# First version of every tool with a capability fds can use
+TOOL_CAPABILITIES: Dict[str, Dict[str, Tuple[int, int]]] = {
+    "git": {
+        # git add --pathspec-from-file
+        "pathspec_from_file": (2, 25),
+        # git status --porcelain=v2
+        "porcelain_v2": (2, 11),
+    },
+}
+
+
+def get_fingerprint(path: str) -> Optional[str]:
+    """
+    Changes whenever the executable is replaced or rewritten, e.g. by an upgrade
+    :return: the fingerprint, None if the executable is gone
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_dev}:{st.st_ino}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def parse_version(version: str) -> Tuple[int, int]:
+    """
+    :param version: e.g. the output of `git --version`
+    :return: the major and minor version, (0, 0) if there is none
+    """
+    match = re.search(r"(\d+)\.(\d+)", version)
+    return (int(match.group(1)), int(match.group(2))) if match is not None else (0, 0)
+
+
+def get_capabilities(name: str, version: str) -> Dict[str, bool]:
+    parsed = parse_version(version)
+    return {capability: parsed >= first_version
+            for capability, first_version in TOOL_CAPABILITIES.get(name, {}).items()}
+
+
+@dataclass
+class ToolInfo:
+    # As found in the PATH
+    path: str
+    fingerprint: str
+    # Output of `<tool> --version`, None until asked for
+    version: Optional[str] = None
+    capabilities: Dict[str, bool] = field(default_factory=dict)
+
+
+class Toolchain(object):
+    """
+    What is known about git and dvc: where they are, their versions and what they support,
+    cached in ~/.cache/fds/toolchain.json.
+
+    An executable is only looked up in the PATH and asked for its version again when the one cached was replaced
+    (its inode, mtime or size changed) or the PATH changed. A new executable earlier in the same PATH than the cached
+    one is not noticed until then.
+
+    The hooks look tools up on several threads, so the tools and their cache are only used under a lock.
+    """
+
+    _instance: Optional['Toolchain'] = None
+
+    def __init__(self, cache_path: Optional[str] = None):
+        self.logger = Logger.get_logger("fds.Toolchain")
+        self.cache_path = cache_path or os.path.join(get_user_cache_dir(), TOOLCHAIN_FILE_NAME)
+        self._lock = threading.RLock()
+        self.tools: Dict[str, ToolInfo] = self.__load()
+
+    @classmethod
+    def get(cls) -> 'Toolchain':
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __load(self) -> Dict[str, ToolInfo]:
+        try:
+            with open(self.cache_path) as f:
+                return {key: ToolInfo(**info) for key, info in json.load(f).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            return {}
+
+    def __save(self) -> None:
+        # Called under the lock, so the tools don't change while they are written
+        try:
+            write_file_atomically(self.cache_path,
+                                  json.dumps({key: asdict(info) for key, info in self.tools.items()}, indent=2))
+        except OSError as e:
+            # Only costs probing again next time
+            self.logger.debug(f"Couldn't cache the toolchain: {e}")
+
+    @staticmethod
+    def __get_key(name: str) -> str:
+        # The same executable can be found in another PATH, e.g. in a virtualenv
+        path_hash = hashlib.sha1(os.environ.get('PATH', '').encode(errors='surrogateescape')).hexdigest()[:16]
+        return f"{name}:{path_hash}"
+
+    def find(self, name: str) -> Optional[ToolInfo]:
+        """
+        Find an executable, without running it
+        :param name: e.g. git or dvc
+        :return: ToolInfo, None if it is not installed
+        """
+        with self._lock:
+            key = self.__get_key(name)
+            info = self.tools.get(key)
+            if info is not None and get_fingerprint(info.path) == info.fingerprint:
+                return info
+            path = which(name)
+            fingerprint = get_fingerprint(path) if path is not None else None
+            if fingerprint is None:
+                if self.tools.pop(key, None) is not None:
+                    self.__save()
+                return None
+            info = ToolInfo(path, fingerprint)
+            self.tools[key] = info
+            self.__save()
+            return info
+
+    def get_versions(self, names: List[str]) -> List[str]:
+        """
+        Versions of executables, the ones not cached are asked for at the same time
+        :param names: e.g. git and dvc
+        :return: list of the outputs of `<tool> --version`, in the order of the names
+        """
+        with self._lock:
+            infos = []
+            for name in names:
+                info = self.find(name)
+                if info is None:
+                    raise Exception(f"{name} executable is not found")
+                infos.append(info)
+            unknown = [(name, info) for name, info in zip(names, infos) if info.version is None]
+            if unknown:
+                self.logger.debug(f"Probing {', '.join(name for name, _ in unknown)}")
+                results = execute_commands([[info.path, "--version"] for _, info in unknown])
+                for (name, info), result in zip(unknown, results):
+                    if result.returncode != 0:
+                        raise Exception(convert_bytes_to_string(result.stderr))
+                    info.version = convert_bytes_to_string(result.stdout).strip()
+                    info.capabilities = get_capabilities(name, info.version)
+                self.__save()
+            return [info.version for info in infos]
+
+    def get_version(self, name: str) -> str:
+        return self.get_versions([name])[0]
+
+    def supports(self, name: str, capability: str) -> bool:
+        """
+        Check if an executable supports a capability of TOOL_CAPABILITIES, e.g. if git supports pathspec_from_file
+        """
+        self.get_version(name)
+        return self.find(name).capabilities.get(capability, False)
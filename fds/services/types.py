@@ -1,6 +1,6 @@
 import abc
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 
 @dataclass
@@ -9,6 +9,23 @@ class DvcAdd:
     files_skipped: List[str]
 
 
+@dataclass
+class AddOptions:
+    """
+    Options of fds add (and save), which tune how the workspace is scanned
+    """
+    # Throw away the scan index and scan everything from scratch
+    rebuild_index: bool = False
+    # Number of threads listing directories, None means FDS_JOBS
+    jobs: Optional[int] = None
+    # Don't prompt, paths without a matching rule in .fds.yaml get its default action
+    auto: bool = False
+    # Only write the decisions to this file (fds add --plan)
+    plan: Optional[str] = None
+    # Execute the decisions of this file, written by --plan, without scanning (fds add --apply)
+    apply: Optional[str] = None
+
+
 class InnerService(abc.ABC):
     repo_path: str
 
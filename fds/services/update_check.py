@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from fds.domain.constants import NO_UPDATE_CHECK, UPDATE_CHECK_TTL
+from fds.logger import Logger
+from fds.utils import get_user_cache_dir, write_file_atomically
+
+PYPI_URL = "https://pypi.python.org/pypi/fastds/json"
+CACHE_FILE_NAME = "update_check.json"
+# Seconds PyPI gets to answer, the check runs in the background but shouldn't outlive a short command by much
+UPDATE_CHECK_TIMEOUT = 3
+
+
+def get_cache_path() -> str:
+    return os.path.join(get_user_cache_dir(), CACHE_FILE_NAME)
+
+
+class UpdateCheck(object):
+    """
+    Look up the latest version of fds on PyPI, in a background thread, at most once per TTL.
+
+    The result is cached on disk, failures to reach PyPI included, so machines without network only
+    wait for PyPI once per TTL. The latest version is only known once the lookup is done, it is never waited for.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None, ttl: int = UPDATE_CHECK_TTL, enabled: bool = not NO_UPDATE_CHECK):
+        self.logger = Logger.get_logger("fds.UpdateCheck")
+        self.cache_path = cache_path or get_cache_path()
+        self.ttl = ttl
+        self.enabled = enabled
+        self.latest_version: Optional[str] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def read_cache(self) -> Optional[Dict[str, Any]]:
+        """
+        :return: the cached lookup, None if there is none or it expired
+        """
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+            checked_at = float(cache["checked_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if not 0 <= time.time() - checked_at < self.ttl:
+            return None
+        return cache
+
+    def write_cache(self, latest_version: Optional[str]) -> None:
+        try:
+            write_file_atomically(self.cache_path, json.dumps({"checked_at": time.time(), "version": latest_version}))
+        except OSError as e:
+            # Only costs a lookup next time
+            self.logger.debug(f"Couldn't cache the latest version of fds: {e}")
+
+    def start(self) -> None:
+        """
+        Start looking up the latest version, unless it is cached or the check is disabled
+        """
+        if not self.enabled:
+            return
+        cache = self.read_cache()
+        if cache is not None:
+            self.latest_version = cache.get("version")
+            return
+        self.thread = threading.Thread(target=self.__lookup, name="fds-update-check", daemon=True)
+        self.thread.start()
+
+    def __lookup(self) -> None:
+        # Imported here, most commands find the latest version in the cache and never need it
+        import requests
+        try:
+            r = requests.get(PYPI_URL, timeout=UPDATE_CHECK_TIMEOUT)
+            r.raise_for_status()
+            latest_version = r.json()["info"]["version"]
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            self.logger.debug(f"Couldn't look up the latest version of fds: {e}")
+            latest_version = None
+        self.write_cache(latest_version)
+        self.latest_version = latest_version
+
+    def get_newer_version(self, current_version: str) -> Optional[str]:
+        """
+        :param current_version: The version running
+        :return: the latest version if it is already known and differs from the one running, None otherwise
+        """
+        latest_version = self.latest_version
+        if latest_version is None or latest_version == current_version:
+            return None
+        return latest_version
@@ -1,13 +1,17 @@
 import getpass
+import re
 import subprocess
 from pathlib import Path
 import os
-from typing import List, Union, Any, Optional, Dict
+from typing import List, Union, Any, Optional, Dict, Callable, Mapping
 
-import humanize
-import select
-import sys
+import tempfile
+import threading
+from fds.domain.constants import IGNORE_CHECK_MODE
 from fds.logger import Logger
+from fds.services.executor import Executor, Output, is_read_only
+from fds.services.git_coprocess import GitCoprocessManager
+from fds.services.ignore_matcher import IgnoreCheckMode, IgnoreMatchers
 
 
 def get_size_of_path(path: str) -> int:
@@ -17,7 +21,31 @@ def get_size_of_path(path: str) -> int:
         return os.stat(path).st_size
 
 
+SIZE_UNITS = {
+    "": 1, "b": 1,
+    "kb": 1000, "mb": 1000 ** 2, "gb": 1000 ** 3, "tb": 1000 ** 4,
+    "kib": 1024, "mib": 1024 ** 2, "gib": 1024 ** 3, "tib": 1024 ** 4,
+    "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4,
+}
+
+
+def parse_size(size: Union[str, int]) -> int:
+    """
+    Parse a human readable size, e.g. 10MB, 1.5 GiB or 2048
+    :param size: The size, a plain number is in bytes
+    :return: size in bytes
+    """
+    if isinstance(size, int):
+        return size
+    match = re.fullmatch(r"\s*([0-9]*\.?[0-9]+)\s*([a-zA-Z]*)\s*", str(size))
+    if match is None or match.group(2).lower() not in SIZE_UNITS:
+        raise ValueError(f"invalid size {size!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
 def convert_bytes_to_readable(bytes: int) -> str:
+    # Imported here, so that commands which don't show sizes don't pay for it
+    import humanize
     return humanize.naturalsize(bytes)
 
 
@@ -26,35 +54,22 @@ def convert_bytes_to_string(bytes_data: bytes) -> str:
 
 
 def execute_command(command: Union[str, List[str]], shell: bool = False, capture_output: bool = True,
-                    ignorable_return_codes: List[int] = [0], capture_output_and_write_to_stdout: bool = False) -> Any:
+                    ignorable_return_codes: List[int] = [0], capture_output_and_write_to_stdout: bool = False,
+                    input_data: Optional[bytes] = None) -> Any:
+    # Commands like `dvc add` change the ignore files, so the cached ignore checks can't be trusted anymore
+    if not is_read_only(command):
+        invalidate_ignore_checks()
     if capture_output:
-        # capture_output is not available in python 3.6, so using PIPE manually
-        output = subprocess.run(command, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output_mode = Output.CAPTURE
     elif capture_output_and_write_to_stdout:
-        output = subprocess.Popen(command, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout = []
-        stderr = []
-        while True:
-            reads = [output.stdout.fileno(), output.stderr.fileno()]
-            ret = select.select(reads, [], [])
-
-            for fd in ret[0]:
-                if fd == output.stdout.fileno():
-                    read = output.stdout.readline()
-                    sys.stdout.write(convert_bytes_to_string(read))
-                    stdout.append(read)
-                if fd == output.stderr.fileno():
-                    read = output.stderr.readline()
-                    sys.stderr.write(convert_bytes_to_string(read))
-                    stderr.append(read)
-            if output.poll() is not None:
-                break
-        # create a completed process to have same convention
-        return subprocess.CompletedProcess(command, output.returncode, b''.join(stdout), b''.join(stderr))
+        output_mode = Output.STREAM
     else:
-        output = subprocess.run(command, shell=shell)
-        if output.returncode not in ignorable_return_codes:
-            raise Exception(f"Command returned error code {output.returncode}: {command}")
+        output_mode = Output.TERMINAL
+    output = Executor.get().run(command, shell=shell, output=output_mode, input_data=input_data)
+    if output_mode == Output.STREAM:
+        return output
+    if output_mode == Output.TERMINAL and output.returncode not in ignorable_return_codes:
+        raise Exception(f"Command returned error code {output.returncode}: {command}")
     if output.stderr is None or output.stdout is None:
         return
     logger = Logger.get_logger("fds")
@@ -66,20 +81,26 @@ def execute_command(command: Union[str, List[str]], shell: bool = False, capture
     return output
 
 
-def rerun_in_new_shell_and_exit(
-    cmd: Optional[List[str]] = None
-):
-    cmd = cmd or ["fds"] + sys.argv
-
-    output = execute_command(
-        cmd,
-        shell=True,
-        capture_output=False,
-    )
-    sys.exit(output.returncode)
+def execute_commands(commands: List[List[str]], on_result: Optional[Callable[[int, subprocess.CompletedProcess], Any]] = None,
+                     env: Optional[Mapping[str, str]] = None) -> List[subprocess.CompletedProcess]:
+    """
+    Run independent commands concurrently, e.g. a git and a dvc command, each paying its own startup time at the same
+    time. Their output is captured separately, so it can be shown one command after the other
+    :param commands: The commands to run
+    :param on_result: Called with the index and the result of every command, in the order of the commands,
+                      as soon as the command and all the ones before it are done
+    :param env: Variables to add to the environment of the commands
+    :return: list of CompletedProcess, in the order of the commands, whatever their return code
+    """
+    # Commands like `dvc add` change the ignore files, so the cached ignore checks can't be trusted anymore
+    if not all(is_read_only(command) for command in commands):
+        invalidate_ignore_checks()
+    return Executor.get().run_concurrently(commands, on_result, env)
 
 
 def append_line_to_file(filename: str, data: str) -> None:
+    if os.path.basename(filename) in (".gitignore", ".dvcignore"):
+        invalidate_ignore_checks()
     with open(filename, "a") as f:
         f.write(data)
         if not data.endswith('\n'):
@@ -94,18 +115,111 @@ def does_file_exist(filename: str) -> bool:
         return False
 
 
+def get_user_cache_dir() -> str:
+    """
+    Directory of the caches of fds shared by all the repositories of the user, $XDG_CACHE_HOME/fds or ~/.cache/fds
+    """
+    cache_dir = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_dir, "fds")
+
+
+def write_file_atomically(filename: str, data: str) -> None:
+    """
+    Replace a file at once, so that concurrent fds commands, git and dvc never read half of it
+    and a failed write never leaves half a file behind. The permissions of the file are kept.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=f"{os.path.basename(filename)}.", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        if os.path.exists(filename):
+            os.chmod(temp_path, os.stat(filename).st_mode & 0o777)
+        else:
+            os.chmod(temp_path, 0o644)
+        os.replace(temp_path, filename)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+# The ignore checks are cached and the coprocesses are shared, so they are done one at a time,
+# e.g. by fds add deciding in the main thread while the walk ahead runs in the background
+_ignore_check_lock = threading.RLock()
+
+
+def invalidate_ignore_checks() -> None:
+    with _ignore_check_lock:
+        GitCoprocessManager.get().invalidate()
+        IgnoreMatchers.get().invalidate()
+
+
+def check_git_ignore_paths(filenames: List[str]) -> Dict[str, bool]:
+    """
+    Check a batch of paths against the git ignore rules, either in process
+    or using a long running `git check-ignore --stdin`, based on FDS_IGNORE_CHECK
+    :param filenames: The paths to check
+    :return: dict of path to whether the path is git ignored
+    """
+    mode = IgnoreCheckMode(IGNORE_CHECK_MODE)
+    with _ignore_check_lock:
+        if mode == IgnoreCheckMode.SUBPROCESS:
+            return GitCoprocessManager.get().check_ignore(filenames)
+        in_process = IgnoreMatchers.get().git().check(filenames)
+        if mode == IgnoreCheckMode.VERIFY:
+            return IgnoreMatchers.get().verify("git", in_process, GitCoprocessManager.get().check_ignore(filenames))
+        return in_process
+
+
+def is_git_ignored(filename: str) -> bool:
+    return check_git_ignore_paths([filename])[filename]
+
+
 def check_git_ignore(filename: str) -> Any:
-    # You can ignore return code 1 too here, because it shows that the file is not ignored
-    # return code 0 is when file is ignored
-    git_output = execute_command(["git", "check-ignore", filename], capture_output=True, ignorable_return_codes=[0, 1])
-    return git_output
+    # Same convention as `git check-ignore <filename>`:
+    # return code 0 and the file in stdout when its ignored, return code 1 when its not ignored
+    if is_git_ignored(filename):
+        return subprocess.CompletedProcess(["git", "check-ignore", filename], 0, f"{filename}\n".encode("utf-8"), b'')
+    return subprocess.CompletedProcess(["git", "check-ignore", filename], 1, b'', b'')
+
+
+def _run_dvc_check_ignore(filenames: List[str]) -> Dict[str, bool]:
+    # You can ignore return code 1 too here, because it shows that none of the files are ignored
+    # return code 0 is when some file is ignored, and the ignored files are printed
+    dvc_output = execute_command(["dvc", "check-ignore"] + filenames, capture_output=True,
+                                 ignorable_return_codes=[0, 1])
+    ignored = set(convert_bytes_to_string(dvc_output.stdout).splitlines())
+    return {filename: filename in ignored for filename in filenames}
+
+
+def check_dvc_ignore_paths(filenames: List[str]) -> Dict[str, bool]:
+    """
+    Check a batch of paths against the .dvcignore rules, either in process
+    or using `dvc check-ignore`, based on FDS_IGNORE_CHECK
+    :param filenames: The paths to check
+    :return: dict of path to whether the path is dvc ignored
+    """
+    mode = IgnoreCheckMode(IGNORE_CHECK_MODE)
+    with _ignore_check_lock:
+        if mode == IgnoreCheckMode.SUBPROCESS:
+            return _run_dvc_check_ignore(filenames)
+        in_process = IgnoreMatchers.get().dvc().check(filenames)
+        if mode == IgnoreCheckMode.VERIFY:
+            return IgnoreMatchers.get().verify("dvc", in_process, _run_dvc_check_ignore(filenames))
+        return in_process
+
+
+def is_dvc_ignored(filename: str) -> bool:
+    return check_dvc_ignore_paths([filename])[filename]
 
 
 def check_dvc_ignore(filename: str) -> Any:
-    # You can ignore return code 1 too here, because it shows that the file is not ignored
-    # return code 0 is when file is ignored
-    git_output = execute_command(["dvc", "check-ignore", filename], capture_output=True, ignorable_return_codes=[0, 1])
-    return git_output
+    # Same convention as `dvc check-ignore <filename>`:
+    # return code 0 and the file in stdout when its ignored, return code 1 when its not ignored
+    if is_dvc_ignored(filename):
+        return subprocess.CompletedProcess(["dvc", "check-ignore", filename], 0, f"{filename}\n".encode("utf-8"), b'')
+    return subprocess.CompletedProcess(["dvc", "check-ignore", filename], 1, b'', b'')
 
 
 def get_git_repo_name_from_url(url: str) -> str:
@@ -3,6 +3,8 @@ import shutil
 import unittest
 import tempfile
 from pathlib import Path
+from typing import Optional
+from unittest.mock import patch
 
 from fds.run import Run
 from fds.services.dvc_service import DVCService
@@ -11,21 +13,29 @@ from fds.services.git_service import GitService
 
 
 class IntegrationTestCase(unittest.TestCase):
+    # FDS_DVC_BACKEND of the tests, subclasses run the same tests with dvc in process
+    dvc_backend: Optional[str] = "subprocess"
 
     def setUp(self):
         super().setUp()
+        backend = patch("fds.services.dvc_backend.DVC_BACKEND", self.dvc_backend)
+        backend.start()
+        self.addCleanup(backend.stop)
         self.repo_path = tempfile.mkdtemp()
         os.chdir(self.repo_path)
         self.re_init_services()
         self.run = Run
 
     def re_init_services(self):
+        if hasattr(self, "dvc_service"):
+            self.dvc_service.close()
         self.git_service = GitService()
         self.dvc_service = DVCService()
         self.fds_service = FdsService(self.git_service, self.dvc_service)
 
     def tearDown(self):
         super().tearDown()
+        self.dvc_service.close()
         shutil.rmtree(self.repo_path)
 
     def create_fake_git_data(self):
@@ -2,6 +2,7 @@ import os
 from unittest.mock import patch
 
 from fds.services.dvc_service import DvcChoices
+from fds.services.types import AddOptions
 from fds.utils import does_file_exist, execute_command, convert_bytes_to_string
 from tests.it.helpers import IntegrationTestCase
 
@@ -113,6 +114,50 @@ class TestDvc(IntegrationTestCase):
         assert len(dvc_add.files_added_to_dvc) == 0
         assert dvc_add.files_skipped[0] == "./large_file"
 
+    @patch("fds.services.dvc_service.DVCService._get_choice", return_value=DvcChoices.ADD_TO_DVC.value)
+    def test_add_dir_prunes_walk(self, get_choice):
+        self.fds_service.init()
+        self.re_init_services()
+        os.makedirs("big_dir/nested")
+        super().create_dummy_file("big_dir/nested/large_file", 11 * 1024)
+        super().create_dummy_file("big_dir/large_file", 11 * 1024)
+        dvc_add = self.dvc_service.add(["."])
+        # Nothing inside the directory is asked about, although the walk ran ahead into it
+        assert dvc_add.files_added_to_dvc == ["./big_dir"]
+        assert [call.kwargs["file_or_dir_to_check"] for call in get_choice.call_args_list] == ["./big_dir"]
+
+    @patch("fds.services.dvc_service.DVCService._get_choice", return_value=DvcChoices.SKIP.value)
+    def test_skip_is_remembered(self, get_choice):
+        self.fds_service.init()
+        self.re_init_services()
+        super().create_fake_dvc_data()
+        self.dvc_service.add(["."])
+        assert get_choice.call_count == 1
+        # Not asked again, but still skipped
+        dvc_add = self.dvc_service.add(["."])
+        assert get_choice.call_count == 1
+        assert dvc_add.files_skipped == ["./large_file"]
+        # Asked again once it changed
+        super().create_dummy_file("large_file", 12 * 1024)
+        self.dvc_service.add(["."])
+        assert get_choice.call_count == 2
+        assert self.dvc_service.forget(["large_file"]) == 1
+        self.dvc_service.add(["."])
+        assert get_choice.call_count == 3
+
+    @patch("fds.services.dvc_service.DVCService._get_choice")
+    def test_add_with_rules(self, get_choice):
+        self.fds_service.init()
+        self.re_init_services()
+        super().create_fake_dvc_data()
+        super().create_dummy_file("large_file.skip", 11 * 1024)
+        with open(".fds.yaml", "w") as f:
+            f.write("rules:\n  - glob: large_file\n    action: dvc\n  - extension: skip\n    action: skip\n")
+        dvc_add = self.dvc_service.add(["."], AddOptions(auto=True))
+        assert dvc_add.files_added_to_dvc == ["./large_file"]
+        assert dvc_add.files_skipped == ["./large_file.skip"]
+        assert not get_choice.called
+
     @patch("fds.services.dvc_service.DVCService._get_choice", return_value=DvcChoices.ADD_TO_DVC.value)
     def test_commit_auto_confirm(self, get_choice):
         self.fds_service.init()
@@ -180,3 +225,7 @@ class TestDvc(IntegrationTestCase):
         self.create_dummy_folder("test_dvc")
         path = self.dvc_service.get_repo_path()
         assert path == self.repo_path
+
+
+class TestDvcInProcess(TestDvc):
+    dvc_backend = "inprocess"
@@ -1,6 +1,8 @@
 from unittest.mock import patch
 
+from fds.services.add_plan import AddPlan
 from fds.services.dvc_service import DvcChoices
+from fds.services.types import AddOptions
 from fds.utils import does_file_exist, execute_command, convert_bytes_to_string
 from tests.it.helpers import IntegrationTestCase
 
@@ -35,6 +37,31 @@ class TestFds(IntegrationTestCase):
         assert "new file:   git_data/file-3" in convert_bytes_to_string(output.stdout)
         assert "new file:   git_data/file-4" in convert_bytes_to_string(output.stdout)
 
+    @patch("fds.services.dvc_service.DVCService._get_choice")
+    def test_add_plan_and_apply(self, get_choice):
+        self.fds_service.init()
+        self.re_init_services()
+        super().create_fake_git_data()
+        super().create_fake_dvc_data()
+        super().create_dummy_file("larger_file", 20 * 1024)
+        self.fds_service.add(["."], AddOptions(plan="plan.json"))
+        assert not get_choice.called
+        # Planning doesn't change anything
+        assert not does_file_exist("large_file.dvc")
+        plan = AddPlan.load("plan.json")
+        assert [(c.path, c.action) for c in plan.candidates] == [("larger_file", "dvc"), ("large_file", "dvc")]
+        plan.candidates[0].action = "ignore"
+        plan.save("plan.json")
+        for _ in range(2):
+            # Applying again is a no-op
+            self.fds_service.add([], AddOptions(apply="plan.json"))
+        output = convert_bytes_to_string(execute_command(["git", "status"], capture_output=True).stdout)
+        assert "new file:   large_file.dvc" in output
+        assert "new file:   git_data/file-0" in output
+        assert "larger_file" not in output
+        with open(".gitignore") as f:
+            assert f.read().splitlines().count("larger_file") == 1
+
     @patch("fds.services.dvc_service.DVCService._get_choice", return_value=DvcChoices.ADD_TO_DVC.value)
     def test_add_multiple_paths(self, get_choice):
         self.fds_service.init()
@@ -143,3 +170,7 @@ class TestFds(IntegrationTestCase):
         assert does_file_exist(f"{self.repo_path}/start")
         # Checking dvc pull of storage remote
         assert does_file_exist(f"{self.repo_path}/start/data/data.xml")
+
+
+class TestFdsInProcess(TestFds):
+    dvc_backend = "inprocess"
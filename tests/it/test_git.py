@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from fds.utils import does_file_exist, execute_command, convert_bytes_to_string
 from tests.it.helpers import IntegrationTestCase
 
@@ -41,6 +43,18 @@ class TestGit(IntegrationTestCase):
         assert "\n\tgit_data/\n\n" in convert_bytes_to_string(output.stdout)
         assert "new file:" not in convert_bytes_to_string(output.stdout)
 
+    @patch("fds.services.bulk_command.ARG_MAX", 120)
+    @patch("fds.services.git_service.GitService.supports_pathspec_from_file", return_value=False)
+    def test_add_in_chunks(self, _):
+        self.git_service.init()
+        super().create_fake_git_data()
+        paths = [f"git_data/file-{i}" for i in range(5)]
+        self.git_service.add(paths, ["git_data/file-4"])
+        output = convert_bytes_to_string(execute_command(["git", "status"], capture_output=True).stdout)
+        for path in paths[:4]:
+            assert f"new file:   {path}" in output
+        assert "new file:   git_data/file-4" not in output
+
     def test_add_one(self):
         self.git_service.init()
         super().create_fake_git_data()
@@ -161,3 +161,7 @@ class TestRun(IntegrationTestCase):
         assert does_file_exist(f"{self.repo_path}/start")
         # Checking dvc pull of storage remote
         assert does_file_exist(f"{self.repo_path}/start/data/data.xml")
+
+
+class TestRunInProcess(TestRun):
+    dvc_backend = "inprocess"
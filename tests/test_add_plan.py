@@ -0,0 +1,37 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fds.services.add_plan import AddPlan, PlanCandidate
+
+
+class TestAddPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "plan.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save_and_load(self):
+        plan = AddPlan(["."], 100, [PlanCandidate("a", "file", 200, 1, "dvc"),
+                                    PlanCandidate("b", "dir", 300, 4, "skip")])
+        plan.rank()
+        plan.save(self.filename)
+        loaded = AddPlan.load(self.filename)
+        assert loaded == plan
+        assert [candidate.path for candidate in loaded.candidates] == ["b", "a"]
+        assert os.listdir(self.directory) == ["plan.json"]
+
+    def test_invalid_plans(self):
+        for content in ["not json", "{}", '{"version": 1, "paths": ["."], "threshold": 1, "candidates": [{}]}',
+                        '{"version": 1, "paths": ["."], "threshold": 1, "candidates": '
+                        '[{"path": "a", "type": "file", "size": 1, "file_count": 1, "action": "nope"}]}',
+                        '{"version": 1, "paths": ["."], "threshold": 1, "candidates": '
+                        '[{"path": "a", "type": "dir", "size": 1, "file_count": 1, "action": "step_into"}]}']:
+            with open(self.filename, "w") as f:
+                f.write(content)
+            with self.assertRaises(Exception):
+                AddPlan.load(self.filename)
@@ -0,0 +1,41 @@
+import unittest
+from unittest.mock import patch
+
+from fds.services.bulk_command import chunk_arguments, execute_in_chunks, get_arg_max
+
+
+class TestBulkCommand(unittest.TestCase):
+
+    def test_arg_max(self):
+        assert get_arg_max() >= 1024
+
+    def test_single_chunk(self):
+        assert list(chunk_arguments(["dvc", "add"], ["a", "b"], limit=1000)) == [["a", "b"]]
+        assert list(chunk_arguments(["dvc", "add"], [], limit=1000)) == []
+
+    def test_chunks_stay_under_limit(self):
+        paths = [f"data/file-{i:04}" for i in range(1000)]
+        limit = 2000
+        chunks = list(chunk_arguments(["dvc", "add"], paths, [":!skipped"], limit=limit))
+        assert len(chunks) > 1
+        assert [path for chunk in chunks for path in chunk] == paths
+        for chunk in chunks:
+            size = sum(len(arg) + 1 + 8 for arg in ["dvc", "add"] + chunk + [":!skipped"])
+            assert size <= limit
+
+    def test_path_too_long(self):
+        with self.assertRaises(Exception):
+            list(chunk_arguments(["dvc", "add"], ["a" * 2000], limit=1000))
+
+    @patch("fds.services.bulk_command.chunk_arguments", return_value=iter([["a"], ["b"], ["c"]]))
+    @patch("fds.services.bulk_command.execute_command")
+    def test_failures_are_reported_together(self, execute_command, _):
+        execute_command.side_effect = [None, Exception("boom"), None]
+        progress = []
+        with self.assertRaises(Exception) as e:
+            execute_in_chunks(["dvc", "add"], ["a", "b", "c"], [":!s"], progress.append)
+        # The chunk after the failing one still ran
+        assert [call[0][0] for call in execute_command.call_args_list] == [
+            ["dvc", "add", "a", ":!s"], ["dvc", "add", "b", ":!s"], ["dvc", "add", "c", ":!s"]]
+        assert "1 of 3 paths" in str(e.exception)
+        assert progress == ["dvc add: 1/3 (1/3 paths)", "dvc add: 2/3 (2/3 paths)", "dvc add: 3/3 (3/3 paths)"]
@@ -0,0 +1,19 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestCli(unittest.TestCase):
+
+    def test_help_imports_lazily(self):
+        # A new interpreter, this one already imported everything
+        code = "import fds.cli, json, sys; print(json.dumps(sorted(sys.modules)))"
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, check=True)
+        modules = set(json.loads(result.stdout))
+        for module in ("fds.run", "fds.services.dvc_service", "requests", "humanize", "yaml", "colorama", "asyncio"):
+            assert module not in modules, f"import fds.cli imports {module}"
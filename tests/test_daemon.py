@@ -0,0 +1,110 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fds.services.daemon import FdsDaemon, forward, get_settings_env, get_socket_path, ping, send_request
+from fds.services.dvc_backend import SubprocessDvcBackend
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        subprocess.run(["git", "init", "-q"], cwd=self.root, check=True)
+        subprocess.run(["dvc", "init", "-q", "--subdir"], cwd=self.root, check=True)
+        with open(os.path.join(self.root, "small.txt"), "w") as f:
+            f.write("hello")
+        os.makedirs(os.path.join(self.root, ".fds"))
+        self.daemon = None
+
+    def tearDown(self):
+        if self.daemon is not None and self.daemon.running:
+            send_request(self.daemon.socket_path, {"command": "stop"})
+            self.thread.join(10)
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.root)
+
+    def _start(self, idle_timeout=30):
+        self.daemon = FdsDaemon(self.root, idle_timeout=idle_timeout)
+        self.thread = threading.Thread(target=self.daemon.serve, daemon=True)
+        self.thread.start()
+        for _ in range(200):
+            if ping(self.daemon.socket_path) is not None:
+                return
+            self.thread.join(0.05)
+        self.fail("The daemon didn't start")
+
+    def _run(self, args, cwd=None, env=None):
+        return send_request(self.daemon.socket_path, {"command": "run", "args": args, "cwd": cwd or self.root,
+                                                      "env": get_settings_env() if env is None else env})
+
+    def test_status(self):
+        self._start()
+        response = self._run(["status", "--json"])
+        assert response["exit"] == 0
+        assert '"path": "small.txt"' in response["output"]
+        os.remove(os.path.join(self.root, "small.txt"))
+        # The next command sees the change
+        assert '"path": "small.txt"' not in self._run(["status", "--json"])["output"]
+        assert ping(self.daemon.socket_path)["requests"] == 2
+
+    def test_status_from_sub_directory(self):
+        os.makedirs(os.path.join(self.root, "sub"))
+        self._start()
+        response = self._run(["status"], cwd=os.path.join(self.root, "sub"))
+        assert response["exit"] == 0
+        assert "small.txt" in response["output"]
+
+    def test_subprocess_backend(self):
+        # E.g. FDS_DVC_BACKEND=subprocess, or the dvc executable and the importable dvc differ
+        with patch("fds.services.dvc_backend.get_dvc_backend", return_value=SubprocessDvcBackend()):
+            self._start()
+            response = self._run(["status", "--json"])
+        assert response["exit"] == 0
+        assert '"path": "small.txt"' in response["output"]
+        # The warm Repo wasn't opened
+        assert self.daemon.dvc_repos == {}
+
+    def test_dvc_repo_without_reset(self):
+        daemon = FdsDaemon(self.root)
+        repo = daemon.get_dvc_repo(self.root)
+        assert daemon.get_dvc_repo(self.root) is repo
+        # A dvc version without the private Repo._reset
+        old_repo = MagicMock(spec=["close"])
+        daemon.dvc_repos[self.root] = (old_repo, daemon.dvc_repos[self.root][1])
+        repo = daemon.get_dvc_repo(self.root)
+        assert repo is not old_repo
+        old_repo.close.assert_called_once_with()
+        repo.close()
+
+    def test_fallback(self):
+        self._start()
+        # Commands which may prompt
+        assert "fallback" in self._run(["add", "."])
+        # Settings read when fds starts
+        assert "fallback" in self._run(["status"], env={**get_settings_env(), "MAX_THRESHOLD_SIZE": "1"})
+        assert "fallback" in self._run(["status"], cwd=os.path.join(self.root, "missing"))
+
+    def test_idle_timeout(self):
+        self._start(idle_timeout=0.5)
+        self.thread.join(10)
+        assert not self.thread.is_alive()
+        assert not os.path.exists(self.daemon.socket_path)
+
+    def test_forward_without_daemon(self):
+        os.chdir(self.root)
+        assert forward(["status"]) is None
+        # Left behind by a daemon which was killed
+        with open(get_socket_path(self.root), "w"):
+            pass
+        assert forward(["status"]) is None
+
+    def test_long_socket_path(self):
+        root = os.path.join(self.root, "a" * 120)
+        path = get_socket_path(root)
+        assert len(path) < 100
+        assert path != get_socket_path(self.root + "b" * 120)
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fds.services.decision_store import DecisionStore
+
+
+class TestDecisionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.repo_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_path)
+
+    def test_persisted(self):
+        store = DecisionStore(self.repo_path)
+        store.put("data/big", "skip", 100, 5)
+        store.close()
+        store = DecisionStore(self.repo_path)
+        assert store.get("data/big", 100, 5) == "skip"
+        store.close()
+
+    def test_changed_paths_are_asked_again(self):
+        store = DecisionStore(self.repo_path)
+        store.put("big", "git", 100, 5)
+        assert store.get("big", 101, 5) is None
+        assert store.get("big", 100, 6) is None
+        assert store.get("other", 100, 5) is None
+        store.close()
+
+    def test_forget(self):
+        store = DecisionStore(self.repo_path)
+        for path in ["data", "data/a", "data/b/c", "database", "other"]:
+            store.put(path, "skip", 1, 1)
+        assert store.forget("data") == 3
+        assert sorted(store.decisions) == ["database", "other"]
+        assert store.forget(".") == 2
+        store.close()
+        assert DecisionStore(self.repo_path).decisions == {}
+
+    def test_dry_run(self):
+        store = DecisionStore(self.repo_path, dry_run=True)
+        store.put("big", "git", 100, 5)
+        assert store.get("big", 100, 5) == "git"
+        store.close()
+        # Not even the .fds directory
+        assert os.listdir(self.repo_path) == []
+        store = DecisionStore(self.repo_path)
+        store.put("data", "skip", 1, 1)
+        store.close()
+        store = DecisionStore(self.repo_path, dry_run=True)
+        # The decisions of previous runs are still used
+        assert store.get("data", 1, 1) == "skip"
+        store.put("other", "ignore", 1, 1)
+        assert store.forget("data") == 1
+        store.close()
+        assert DecisionStore(self.repo_path).decisions == {"data": ("skip", 1, 1)}
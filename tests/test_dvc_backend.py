@@ -0,0 +1,138 @@
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fds.services.dvc_backend import InProcessDvcBackend, SubprocessDvcBackend, get_dvc_backend, \
+    get_importable_dvc_version, get_in_process_incompatibility
+from fds.services.repo_root import invalidate_repo_roots
+
+
+class TestDvcBackendSelection(unittest.TestCase):
+
+    def setUp(self):
+        self.toolchain = MagicMock()
+        self.toolchain.get_version.return_value = "3.1.0"
+        patches = [
+            patch("fds.services.dvc_backend.importlib.util.find_spec", return_value=object()),
+            patch("fds.services.dvc_backend.get_importable_dvc_version", return_value="3.1.0"),
+            patch("fds.services.dvc_backend.Toolchain.get", return_value=self.toolchain),
+        ]
+        self.find_spec, self.version, _ = [p.start() for p in patches]
+        for p in patches:
+            self.addCleanup(p.stop)
+
+    def test_same_version(self):
+        assert get_in_process_incompatibility() is None
+        assert isinstance(get_dvc_backend("auto"), InProcessDvcBackend)
+        assert isinstance(get_dvc_backend("inprocess"), InProcessDvcBackend)
+
+    def test_subprocess(self):
+        backend = get_dvc_backend("subprocess")
+        assert isinstance(backend, SubprocessDvcBackend) and not backend.in_process
+        # Not even checked
+        self.find_spec.assert_not_called()
+
+    def test_not_importable(self):
+        self.find_spec.return_value = None
+        assert get_in_process_incompatibility() == "dvc can't be imported"
+        assert not get_dvc_backend("auto").in_process
+        with self.assertRaises(Exception):
+            get_dvc_backend("inprocess")
+
+    def test_too_old(self):
+        self.version.return_value = "2.58.2"
+        self.toolchain.get_version.return_value = "2.58.2"
+        assert "older" in get_in_process_incompatibility()
+        assert not get_dvc_backend("auto").in_process
+
+    def test_unknown_version(self):
+        self.version.return_value = None
+        assert "unknown" in get_in_process_incompatibility()
+        assert not get_dvc_backend("auto").in_process
+
+    def test_other_executable(self):
+        # e.g. dvc installed with pipx, and another one in the environment of fds
+        self.toolchain.get_version.return_value = "3.2.0"
+        assert "executable" in get_in_process_incompatibility()
+        assert not get_dvc_backend("auto").in_process
+
+    def test_no_executable(self):
+        self.toolchain.find.return_value = None
+        assert get_in_process_incompatibility() is None
+        self.toolchain.get_version.assert_not_called()
+
+    def test_unknown(self):
+        with self.assertRaises(Exception):
+            get_dvc_backend("docker")
+
+
+@unittest.skipIf(importlib.util.find_spec("dvc") is None, "dvc can't be imported")
+class TestImportableDvcVersion(unittest.TestCase):
+
+    def test_version(self):
+        import dvc
+        version = get_importable_dvc_version()
+        if sys.version_info >= (3, 8):
+            assert version == dvc.__version__
+        else:
+            # Only known with the importlib_metadata backport
+            assert version in (dvc.__version__, None)
+
+
+@unittest.skipIf(shutil.which("dvc") is None or get_in_process_incompatibility() is not None,
+                 "dvc can't run in process")
+class TestDvcBackends(unittest.TestCase):
+    """
+    Both backends give the same answers
+    """
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.repo_path = tempfile.mkdtemp()
+        os.chdir(self.repo_path)
+        subprocess.run(["dvc", "init", "--no-scm", "-q"], check=True)
+        invalidate_repo_roots()
+        self.in_process = InProcessDvcBackend()
+        self.subprocess = SubprocessDvcBackend()
+
+    def tearDown(self):
+        self.in_process.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.repo_path)
+
+    def test_remotes(self):
+        self.in_process.add_remote("storage", "/tmp/storage")
+        self.subprocess.add_remote("other", "https://example.com/other")
+        assert self.in_process.get_remotes() == self.subprocess.get_remotes() == {
+            "storage": "/tmp/storage", "other": "https://example.com/other"}
+        with self.assertRaises(Exception):
+            self.in_process.add_remote("other", "/tmp/again")
+        self.in_process.modify_remote("other", "auth", "basic")
+        with open(os.path.join(self.repo_path, ".dvc", "config.local")) as f:
+            assert "auth = basic" in f.read()
+        with self.assertRaises(Exception):
+            self.in_process.modify_remote("missing", "auth", "basic")
+        # Neither has a default remote
+        with self.assertRaises(Exception):
+            self.in_process.get_default_remote()
+
+    def test_add_and_status(self):
+        with open("data.bin", "wb") as f:
+            f.write(os.urandom(1024))
+        self.in_process.add(["data.bin"])
+        assert os.path.exists("data.bin.dvc")
+        assert self.in_process.status().stdout == b"{}"
+        with open("data.bin", "ab") as f:
+            f.write(b"changed")
+        in_process = self.in_process.status()
+        subprocess_status = self.subprocess.status()
+        assert in_process.returncode == subprocess_status.returncode == 0
+        assert in_process.stdout.strip() != b"{}"
+        assert b"data.bin.dvc" in subprocess_status.stdout and b"data.bin.dvc" in in_process.stdout
+        self.in_process.commit(force=True)
+        assert self.subprocess.status().stdout.strip() == b"{}"
@@ -0,0 +1,189 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from subprocess import CompletedProcess
+from unittest.mock import MagicMock, patch
+
+from fds.services.dvc_backend import get_dvc_backend
+from fds.services.executor import STREAM_TAIL_SIZE, DryRunExecutor, Executor, Output, RecordingExecutor, \
+    ReplayExecutor, SubprocessExecutor, TailBuffer, format_command, get_executor, is_read_only
+from fds.utils import execute_command, execute_commands
+
+
+class TestExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.trace = os.path.join(self.directory, "trace.jsonl")
+
+    def tearDown(self):
+        Executor.set(None)
+        shutil.rmtree(self.directory)
+
+    def _read_trace(self):
+        with open(self.trace) as f:
+            return [json.loads(line) for line in f]
+
+    def test_is_read_only(self):
+        assert is_read_only(["git", "status", "--porcelain=v2"])
+        assert is_read_only(["/usr/bin/dvc", "--version"])
+        assert is_read_only(["dvc", "remote", "list"])
+        assert is_read_only(["dvc", "remote", "default"])
+        assert not is_read_only(["dvc", "remote", "default", "storage"])
+        assert not is_read_only(["git", "add", "."])
+        assert not is_read_only(["dvc", "push"])
+        assert not is_read_only("pip3 install fastds --upgrade")
+
+    def test_format_command(self):
+        assert format_command(["git", "commit", "-m", "a message"]) == "git commit -m 'a message'"
+        assert format_command("pip3 install fastds") == "pip3 install fastds"
+
+    def test_record_and_replay(self):
+        # Not even utf-8
+        binary = [sys.executable, "-c", "import sys; sys.stdout.buffer.write(bytes([0, 255, 10])); sys.exit(2)"]
+        hello = [sys.executable, "-c", "print('hello')"]
+        Executor.set(RecordingExecutor(SubprocessExecutor(), self.trace))
+        assert execute_command(binary, ignorable_return_codes=[2]).stdout == bytes([0, 255, 10])
+        results = execute_commands([hello, hello])
+        assert [result.stdout for result in results] == [b"hello\n", b"hello\n"]
+        records = self._read_trace()
+        assert [(record["returncode"], record["stdout_size"], record["batch"]) for record in records] == [
+            (2, 3, None), (0, 6, 1), (0, 6, 1)]
+        assert all(record["cwd"] == os.getcwd() and record["duration"] > 0 for record in records)
+
+        Executor.set(ReplayExecutor(self.trace))
+        assert execute_command(binary, ignorable_return_codes=[2]).stdout == bytes([0, 255, 10])
+        assert [result.stdout for result in execute_commands([hello, hello])] == [b"hello\n", b"hello\n"]
+        # Every recorded result is replayed once
+        with self.assertRaises(Exception):
+            execute_command(hello)
+
+    def test_run_concurrently(self):
+        commands = [[sys.executable, "-c", "print('first')"], [sys.executable, "-c", "print('second')"],
+                    [os.path.join(self.directory, "missing")]]
+        expected = [(0, b"first\n"), (0, b"second\n"), (127, b"")]
+        seen = []
+
+        def run():
+            results = SubprocessExecutor().run_concurrently(commands, lambda index, _: seen.append(index))
+            return [(result.returncode, result.stdout) for result in results]
+
+        assert run() == expected
+        # From a hook thread, where python 3.6 and 3.7 can't wait for processes with asyncio
+        with patch.object(sys, "version_info", (3, 7)), ThreadPoolExecutor(1) as executor:
+            assert executor.submit(run).result() == expected
+        assert seen == [0, 1, 2, 0, 1, 2]
+
+    def test_record_terminal(self):
+        executor = RecordingExecutor(SubprocessExecutor(), self.trace)
+        executor.run([sys.executable, "-c", "pass"], output=Output.TERMINAL)
+        record = self._read_trace()[0]
+        assert record["output"] == "terminal" and record["stdout_size"] is None and record["stdout"] is None
+
+    def test_dry_run(self):
+        executor = MagicMock()
+        executor.run.return_value = CompletedProcess(["git", "status"], 0, b"clean", b"")
+        executor.run_concurrently.return_value = [CompletedProcess(["dvc", "status"], 0, b"{}", b"")]
+        dry_run = DryRunExecutor(executor)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            assert dry_run.run(["git", "status"]).stdout == b"clean"
+            assert dry_run.run(["git", "commit", "-am", "message"], output=Output.TERMINAL).returncode == 0
+            results = dry_run.run_concurrently([["git", "push", "origin"], ["dvc", "status"]])
+        assert [result.stdout for result in results] == [b"", b"{}"]
+        executor.run_concurrently.assert_called_once_with([["dvc", "status"]], env=None)
+        assert output.getvalue().splitlines() == ["Would run: git commit -am message", "Would run: git push origin"]
+
+    def test_dvc_runs_through_the_executor(self):
+        Executor.set(get_executor(dry_run=True))
+        assert not get_dvc_backend("auto").in_process
+
+
+class CountingOutput(object):
+    """
+    Stands for stdout or stderr, only keeping how much was written and its end
+    """
+
+    def __init__(self, on_write=None):
+        self.size = 0
+        self.end = ""
+        self.on_write = on_write
+
+    def write(self, text):
+        self.size += len(text)
+        self.end = (self.end + text)[-100:]
+        if self.on_write is not None:
+            self.on_write(text)
+
+    def flush(self):
+        pass
+
+
+class TestStreamOutput(unittest.TestCase):
+
+    def stream(self, code, stdout=None, stderr=None):
+        with redirect_stdout(stdout or CountingOutput()), redirect_stderr(stderr or CountingOutput()):
+            return SubprocessExecutor().run([sys.executable, "-c", code], output=Output.STREAM)
+
+    def test_tail_buffer(self):
+        tail = TailBuffer(5)
+        assert tail.getvalue() == b""
+        for chunk in (b"ab", b"cdef", b"", b"g"):
+            tail.write(chunk)
+        assert tail.getvalue() == b"cdefg"
+        tail.write(b"0123456789")
+        assert tail.getvalue() == b"56789"
+        empty = TailBuffer(0)
+        empty.write(b"abc")
+        assert empty.getvalue() == b""
+
+    def test_output_until_exit(self):
+        # Written right before exiting, without a newline
+        result = self.stream("import sys; print('last', end=''); sys.stderr.write('é' * 3); sys.exit(3)")
+        assert (result.returncode, result.stdout, result.stderr) == (3, b"last", "ééé".encode())
+
+    def test_partial_line_doesnt_stall(self):
+        sentinel = os.path.join(tempfile.mkdtemp(), "seen")
+        self.addCleanup(shutil.rmtree, os.path.dirname(sentinel))
+        # The progress has no newline, the process only goes on once fds has shown it
+        code = (f"import os, sys, time\nsys.stderr.write('\\r50%'); sys.stderr.flush()\n"
+                f"deadline = time.time() + 10\n"
+                f"while not os.path.exists({sentinel!r}) and time.time() < deadline: time.sleep(0.01)\n"
+                f"print('done'); sys.exit(0 if os.path.exists({sentinel!r}) else 1)")
+
+        def on_write(text):
+            if "50%" in text:
+                open(sentinel, "w").close()
+
+        stdout = CountingOutput()
+        result = self.stream(code, stdout=stdout, stderr=CountingOutput(on_write))
+        assert result.returncode == 0 and stdout.end == "done\n"
+
+    def test_large_output(self):
+        # Hundreds of MB of progress bars redrawn on stderr, and lines on stdout, then an error at the end
+        code = ("import sys\n"
+                "progress = ''.join(f'\\rtransferring {i % 100}%' for i in range(50000)).encode()\n"
+                "for i in range(300):\n"
+                "    sys.stderr.buffer.write(progress)\n"
+                "    sys.stdout.buffer.write(b'line %d\\n' % i)\n"
+                "sys.stderr.write('\\nERROR: 401 Unauthorized\\n')")
+        stdout, stderr = CountingOutput(), CountingOutput()
+        tracemalloc.start()
+        try:
+            result = self.stream(code, stdout=stdout, stderr=stderr)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert stderr.size > 200 * 1024 * 1024 and stderr.end.endswith("ERROR: 401 Unauthorized\n")
+        assert stdout.end.endswith("line 299\n")
+        assert len(result.stderr) == STREAM_TAIL_SIZE and b"401 Unauthorized" in result.stderr
+        assert result.stdout.endswith(b"line 299\n")
+        # Only the ends are kept
+        assert peak < 4 * 1024 * 1024
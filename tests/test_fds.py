@@ -1,4 +1,10 @@
+import io
+import os
+import sys
+import tempfile
 import unittest
+from contextlib import redirect_stdout
+from subprocess import CompletedProcess
 from unittest.mock import patch
 import pytest
 import re
@@ -6,6 +12,7 @@ import re
 from fds.version import __version__
 from fds.services.fds_service import FdsService
 from fds.run import HooksRunner
+from fds.services.toolchain import Toolchain
 
 BOOLS = [True, False]
 
@@ -52,33 +59,100 @@ class TestFds(unittest.TestCase):
         assert mock_git_service.init.called
         assert mock_dvc_service.init.called
 
+    @staticmethod
+    def _run_commands(*outputs):
+        def execute_commands(commands, on_result=None, env=None):
+            results = [CompletedProcess(command, return_code, stdout, b'')
+                       for command, (return_code, stdout) in zip(commands, outputs)]
+            for index, result in enumerate(results):
+                if on_result is not None:
+                    on_result(index, result)
+            return results
+        return execute_commands
+
+    @patch('fds.services.fds_service.execute_commands')
     @patch('fds.services.dvc_service.DVCService')
     @patch('fds.services.git_service.GitService')
-    def test_status_success(self, mock_git_service, mock_dvc_service):
+    def test_status_success(self, mock_git_service, mock_dvc_service, execute_commands):
+        os.chdir(tempfile.gettempdir())
+        execute_commands.side_effect = self._run_commands(
+            (0, b"# branch.head main\0" + b"1 M. N... 100644 100644 100644 a b README.md\0"),
+            (0, b'{"data.dvc": [{"changed outs": {"data": "deleted"}}]}'))
+        mock_git_service.repo_path = tempfile.gettempdir()
+        mock_git_service.get_status_command.return_value = ["git", "status"]
+        mock_dvc_service.get_status_command.return_value = ["dvc", "status"]
+        mock_dvc_service.backend.in_process = False
         fds_service = FdsService(mock_git_service, mock_dvc_service)
-        fds_service.status()
-        assert mock_git_service.status.called
-        assert mock_dvc_service.status.called
+        status = fds_service.get_status()
+        # Both at once
+        assert execute_commands.call_count == 1
+        assert execute_commands.call_args[0][0] == [["git", "status"], ["dvc", "status"]]
+        assert status.branch == "main"
+        assert [(entry.path, entry.state) for entry in status.tracked] == [("README.md", "modified")]
+        assert [(entry.path, entry.state, entry.stage) for entry in status.dvc_changed] == [
+            ("data", "deleted", "data.dvc")]
+        fds_service.status(as_json=True)
+
+    @patch('fds.services.fds_service.execute_commands')
+    @patch('fds.services.dvc_service.DVCService')
+    @patch('fds.services.git_service.GitService')
+    def test_status_dvc_in_process(self, mock_git_service, mock_dvc_service, execute_commands):
+        os.chdir(tempfile.gettempdir())
+        execute_commands.side_effect = self._run_commands((0, b"# branch.head main\0"))
+        mock_git_service.repo_path = tempfile.gettempdir()
+        mock_git_service.get_status_command.return_value = ["git", "status"]
+        # dvc imported in process, e.g. by the daemon
+        mock_dvc_service.backend.in_process = True
+        mock_dvc_service.backend.status.return_value = CompletedProcess(
+            ["dvc", "status"], 0, b'{"data.dvc": [{"changed outs": {"data": "modified"}}]}', b'')
+        fds_service = FdsService(mock_git_service, mock_dvc_service)
+        status = fds_service.get_status()
+        assert execute_commands.call_args[0][0] == [["git", "status"]]
+        assert [(entry.path, entry.state) for entry in status.dvc_changed] == [("data", "modified")]
+
+    @patch('fds.services.fds_service.Toolchain')
+    @patch('fds.services.fds_service.execute_commands')
+    @patch('fds.services.dvc_service.DVCService')
+    @patch('fds.services.git_service.GitService')
+    def test_status_old_git(self, mock_git_service, mock_dvc_service, execute_commands, toolchain):
+        os.chdir(tempfile.gettempdir())
+        # Before git 2.11, without git status --porcelain=v2
+        toolchain.get.return_value.supports.return_value = False
+        execute_commands.side_effect = self._run_commands((0, b"On branch main"), (0, b"Data and pipelines are up to date."))
+        mock_git_service.get_plain_status_command.return_value = ["git", "status"]
+        mock_dvc_service.get_plain_status_command.return_value = ["dvc", "status"]
+        fds_service = FdsService(mock_git_service, mock_dvc_service)
+        with redirect_stdout(io.StringIO()) as output:
+            fds_service.status()
+        # Shown as git and dvc print it
+        assert execute_commands.call_args[0][0] == [["git", "status"], ["dvc", "status"]]
+        assert "On branch main" in output.getvalue()
+        with self.assertRaises(Exception):
+            fds_service.status(as_json=True)
 
+    @patch('fds.services.fds_service.execute_commands')
     @patch('fds.services.dvc_service.DVCService')
     @patch('fds.services.git_service.GitService')
-    def test_status_git_failure(self, mock_git_service, mock_dvc_service):
-        mock_git_service.status.side_effect = Exception
+    def test_status_git_failure(self, mock_git_service, mock_dvc_service, execute_commands):
+        os.chdir(tempfile.gettempdir())
+        execute_commands.side_effect = self._run_commands((128, b''), (0, b'{}'))
         fds_service = FdsService(mock_git_service, mock_dvc_service)
-        self.assertRaises(Exception, mock_git_service.status)
-        self.assertRaises(Exception, fds_service.status)
-        assert mock_git_service.status.called
-        assert mock_dvc_service.status.notcalled
+        with self.assertRaises(Exception) as e:
+            fds_service.status()
+        assert str(e.exception) == "Git status failed to execute"
 
+    @patch('fds.services.fds_service.execute_commands')
     @patch('fds.services.dvc_service.DVCService')
     @patch('fds.services.git_service.GitService')
-    def test_status_dvc_failure(self, mock_git_service, mock_dvc_service):
-        mock_dvc_service.status.side_effect = Exception
+    def test_status_dvc_failure(self, mock_git_service, mock_dvc_service, execute_commands):
+        os.chdir(tempfile.gettempdir())
+        execute_commands.side_effect = self._run_commands((0, b''), (1, b''))
+        mock_git_service.repo_path = tempfile.gettempdir()
+        mock_dvc_service.backend.in_process = False
         fds_service = FdsService(mock_git_service, mock_dvc_service)
-        self.assertRaises(Exception, fds_service.status)
-        self.assertRaises(Exception, mock_dvc_service.status)
-        assert mock_git_service.status.called
-        assert mock_dvc_service.status.called
+        with self.assertRaises(Exception) as e:
+            fds_service.status()
+        assert str(e.exception) == "DVC status failed to execute"
 
     @patch('fds.services.dvc_service.DVCService')
     @patch('fds.services.git_service.GitService')
@@ -168,7 +242,7 @@ class TestFdsHooks:
     @patch('fds.run.execute_command')
     @patch('fds.run.get_confirm_from_user')
     @patch('fds.services.fds_service.FdsService')
-    @patch('fds.run.which')
+    @patch('fds.services.toolchain.which')
     def test_dvc_installed(
         self,
         mock_which,
@@ -176,15 +250,17 @@ class TestFdsHooks:
         mock_prompt,
         mock_execute_command,
         dvc_preinstalled: bool,
-        install_prompt_accept: bool
+        install_prompt_accept: bool,
+        tmp_path,
     ):
-        mock_which.return_value = dvc_preinstalled or None
+        mock_which.return_value = sys.executable if dvc_preinstalled else None
         mock_prompt.return_value = install_prompt_accept
         hooks_runner = HooksRunner(
             mock_fds_service.service,
             mock_fds_service.printer,
             mock_fds_service.logger,
         )
+        hooks_runner.toolchain = Toolchain(str(tmp_path / "toolchain.json"))
         ret = hooks_runner._ensure_dvc_installed()
         mock_which.assert_called_with("dvc")
         if dvc_preinstalled:
@@ -205,20 +281,22 @@ class TestFdsHooks:
     @pytest.mark.parametrize("git_preinstalled", BOOLS)
     @patch('fds.run.sys.exit')
     @patch('fds.services.fds_service.FdsService')
-    @patch('fds.run.which')
+    @patch('fds.services.toolchain.which')
     def test_git_installed(
         self,
         mock_which,
         mock_fds_service,
         mock_sys_exit,
         git_preinstalled: bool,
+        tmp_path,
     ):
-        mock_which.return_value = git_preinstalled or None
+        mock_which.return_value = sys.executable if git_preinstalled else None
         hooks_runner = HooksRunner(
             mock_fds_service.service,
             mock_fds_service.printer,
             mock_fds_service.logger,
         )
+        hooks_runner.toolchain = Toolchain(str(tmp_path / "toolchain.json"))
         ret = hooks_runner._ensure_git_installed()
         mock_which.assert_called_with("git")
         if git_preinstalled:
@@ -230,32 +308,17 @@ class TestFdsHooks:
 
     @pytest.mark.parametrize("is_latest", BOOLS)
     @pytest.mark.parametrize("install_prompt_accept", BOOLS)
-    @patch('fds.run.rerun_in_new_shell_and_exit')
     @patch('fds.run.execute_command')
     @patch('fds.run.get_confirm_from_user')
     @patch('fds.services.fds_service.FdsService')
-    @patch('fds.run.requests.get')
     def test_fds_update(
         self,
-        mock_requests_get,
         mock_fds_service,
         mock_prompt,
         mock_execute_command,
-        mock_rerun,
         is_latest: bool,
         install_prompt_accept: bool
     ):
-        mock_requests_get.return_value = type(
-            "Response",
-            (),
-            {
-                "json": lambda self: {
-                    "info": {
-                        "version": __version__ + ("b3" if not is_latest else "")
-                    }
-                }
-            }
-        )()
         mock_prompt.return_value = install_prompt_accept
 
         hooks_runner = HooksRunner(
@@ -263,10 +326,11 @@ class TestFdsHooks:
             mock_fds_service.printer,
             mock_fds_service.logger,
         )
+        hooks_runner.update_checker.latest_version = __version__ + ("b3" if not is_latest else "")
         ret = hooks_runner._ensure_fds_updated()
-        mock_requests_get.assert_called_with("https://pypi.python.org/pypi/fastds/json")
         assert ret == 0
         if is_latest:
+            assert mock_prompt.call_count == 0
             return
         assert mock_prompt.call_count == 1
         # # TODO validate stdout contains "Should we upgrade..."
@@ -278,8 +342,28 @@ class TestFdsHooks:
         lst = mock_execute_command.call_args_list[0]
         assert re.findall(r"^pip3 install .*fastds.*--upgrade", lst.args[0][0])
 
-        assert mock_rerun.call_count == 1
-        mock_rerun.assert_called_with()
+    @patch('fds.run.get_confirm_from_user')
+    @patch('fds.services.fds_service.FdsService')
+    def test_fds_update_unknown(self, mock_fds_service, mock_prompt):
+        hooks_runner = HooksRunner(
+            mock_fds_service.service,
+            mock_fds_service.printer,
+            mock_fds_service.logger,
+        )
+        # The lookup didn't finish, or PyPI couldn't be reached
+        hooks_runner.update_checker.latest_version = None
+        assert hooks_runner._ensure_fds_updated() == 0
+        assert mock_prompt.call_count == 0
+
+    @pytest.mark.parametrize("stdin_tty", BOOLS)
+    @pytest.mark.parametrize("stdout_tty", BOOLS)
+    @pytest.mark.parametrize("as_json", BOOLS)
+    @patch('fds.run.sys')
+    def test_can_offer_update(self, mock_sys, stdin_tty: bool, stdout_tty: bool, as_json: bool):
+        mock_sys.stdin.isatty.return_value = stdin_tty
+        mock_sys.stdout.isatty.return_value = stdout_tty
+        # Not into the json, and not blocking on a prompt nobody answers
+        assert HooksRunner.can_offer_update(as_json) == (stdin_tty and stdout_tty and not as_json)
 
     @pytest.mark.parametrize("raise_on_reject", BOOLS)
     @pytest.mark.parametrize("service_preinitialized", BOOLS)
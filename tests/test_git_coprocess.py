@@ -0,0 +1,59 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from fds.services.git_coprocess import GitCoprocessManager
+
+
+class TestGitCoprocessManager(unittest.TestCase):
+
+    def setUp(self):
+        self.repo_path = tempfile.mkdtemp()
+        os.chdir(self.repo_path)
+        subprocess.run(["git", "init", "-q"], check=True)
+        with open(".gitignore", "w") as f:
+            f.write("*.log\n!keep.log\nbuild/\n")
+        # Directory only patterns need the directory to exist
+        os.mkdir("build")
+        self.manager = GitCoprocessManager()
+
+    def tearDown(self):
+        self.manager.close()
+        shutil.rmtree(self.repo_path)
+
+    def test_check_ignore(self):
+        result = self.manager.check_ignore(["a.log", "keep.log", "build", "build/out.bin", "src/main.py"])
+        assert result == {
+            "a.log": True,
+            "keep.log": False,
+            "build": True,
+            "build/out.bin": True,
+            "src/main.py": False,
+        }
+
+    def test_reuses_process(self):
+        self.manager.check_ignore(["a.log"])
+        coprocess = self.manager._get_coprocess(GitCoprocessManager.CHECK_IGNORE_ARGS)
+        pid = coprocess.process.pid
+        self.manager.check_ignore(["b.log"])
+        assert coprocess.process.pid == pid
+
+    def test_large_batch(self):
+        paths = [f"dir/sub-{i}/file-{i}.{'log' if i % 2 else 'txt'}" for i in range(20000)]
+        result = self.manager.check_ignore(paths)
+        assert len(result) == len(paths)
+        assert sum(result.values()) == 10000
+
+    def test_invalidate_reloads_rules(self):
+        assert self.manager.check_ignore(["data.csv"]) == {"data.csv": False}
+        with open(".gitignore", "a") as f:
+            f.write("data.csv\n")
+        self.manager.invalidate()
+        assert self.manager.check_ignore(["data.csv"]) == {"data.csv": True}
+
+    def test_failure_raises_and_recovers(self):
+        with self.assertRaises(Exception):
+            self.manager.check_ignore(["../outside"])
+        assert self.manager.check_ignore(["a.log"]) == {"a.log": True}
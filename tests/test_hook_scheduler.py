@@ -0,0 +1,68 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from fds.services.hook_scheduler import Hook, HookScheduler
+
+
+class TestHookScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = MagicMock()
+        self.scheduler = HookScheduler(self.logger)
+        self.ensured = []
+
+    def _ensure(self, name, ret_code=0):
+        def ensure():
+            self.ensured.append(name)
+            return ret_code
+        return ensure
+
+    def test_checks_run_concurrently(self):
+        # Only passes if both checks wait at the same time
+        barrier = threading.Barrier(2, timeout=5)
+
+        def check():
+            barrier.wait()
+            return True
+
+        hooks = [Hook("a", 1, check, self._ensure("a")), Hook("b", 2, check, self._ensure("b"))]
+        assert self.scheduler.run(hooks) == 0
+        assert self.ensured == []
+
+    def test_failed_checks_are_ensured_in_order(self):
+        hooks = [
+            Hook("a", 1, lambda: False, self._ensure("a")),
+            Hook("b", 2, lambda: True, self._ensure("b")),
+            Hook("c", 4, lambda: False, self._ensure("c", 1)),
+            Hook("d", 8, lambda: False, self._ensure("d", 1)),
+        ]
+        assert self.scheduler.run(hooks) == 4 | 8
+        assert self.ensured == ["a", "c", "d"]
+
+    def test_skipped_after_failed_hook(self):
+        hooks = [
+            Hook("installed", 1, lambda: False, self._ensure("installed", 1)),
+            Hook("initialized", 2, lambda: False, self._ensure("initialized"), after=("installed",)),
+            Hook("configured", 4, lambda: False, self._ensure("configured"), after=("initialized",)),
+            Hook("other", 8, lambda: False, self._ensure("other")),
+        ]
+        assert self.scheduler.run(hooks) == 1
+        assert self.ensured == ["installed", "other"]
+
+    def test_ensured_after_succeeded_hook(self):
+        hooks = [
+            Hook("installed", 1, lambda: False, self._ensure("installed")),
+            Hook("initialized", 2, lambda: False, self._ensure("initialized"), after=("installed",)),
+        ]
+        assert self.scheduler.run(hooks) == 0
+        assert self.ensured == ["installed", "initialized"]
+
+    def test_timing_is_logged(self):
+        self.scheduler.run([Hook("a", 1, lambda: False, self._ensure("a"))])
+        messages = [call[0][0] for call in self.logger.debug.call_args_list]
+        assert any(message.startswith("Hook a check took") for message in messages)
+        assert any(message.startswith("Hook a ensure took") for message in messages)
+
+    def test_no_hooks(self):
+        assert self.scheduler.run([]) == 0
@@ -0,0 +1,170 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from shutil import which
+from unittest.mock import patch
+
+import pytest
+
+from fds.services import ignore_matcher
+from fds.services.git_coprocess import GitCoprocessManager
+from fds.services.ignore_matcher import GitIgnoreMatcher, DvcIgnoreMatcher, IgnoreMatchers, parse_ignore_line
+from fds.services.repo_root import find_git_root, invalidate_repo_roots
+from fds.utils import check_git_ignore_paths
+
+IGNORE_FILES = {
+    ".gitignore": "# comment\n*.log\n!important.log\n/root_only.txt\nbuild/\ndata/**/*.bin\n"
+                  "**/cache\ndocs/*.pdf\nspace\\ \n\\#hash\nlogs/\n!logs/keep.txt\n[abc]x.tmp\n[!a]y.tmp\n",
+    "sub/.gitignore": "*.csv\n!keep.csv\nnested/\n/local.txt\n",
+    "sub/deeper/.gitignore": "!*.log\n",
+    "data/.gitignore": "raw\n",
+}
+
+PATHS = [
+    "a.log", "important.log", "sub/a.log", "sub/deeper/a.log", "root_only.txt", "sub/root_only.txt",
+    "build", "build/out.o", "sub/build", "sub/build/x", "data/x/y/z.bin", "data/z.bin", "data/raw",
+    "data/raw/file", "other/raw", "a/b/cache", "cache", "docs/a.pdf", "docs/sub/a.pdf", "space ", "#hash",
+    "logs", "logs/keep.txt", "logs/other.txt", "sub/a.csv", "sub/keep.csv", "sub/deeper/b.csv",
+    "sub/nested", "sub/nested/file", "sub/local.txt", "sub/deeper/local.txt", "ax.tmp", "dx.tmp",
+    "ay.tmp", "by.tmp", "excluded_by_info", "globally_excluded", "tracked.log", "plain.txt",
+]
+
+DIRECTORIES = {"build", "sub/build", "data/raw", "other/raw", "a/b/cache", "cache", "logs", "sub/nested", "sub/deeper"}
+
+
+class TestIgnorePatterns(unittest.TestCase):
+
+    def match(self, line: str, path: str, is_dir: bool = False) -> bool:
+        pattern = parse_ignore_line(line, '', '.gitignore', 1)
+        return pattern.matches(path, is_dir)
+
+    def test_basename_patterns(self):
+        assert self.match("*.log", "a/b/c.log")
+        assert not self.match("*.log", "a/b/c.log.txt")
+        assert self.match("foo", "a/foo")
+
+    def test_anchored_patterns(self):
+        assert self.match("/foo", "foo")
+        assert not self.match("/foo", "a/foo")
+        assert self.match("a/*.txt", "a/b.txt")
+        assert not self.match("a/*.txt", "a/b/c.txt")
+
+    def test_double_star(self):
+        assert self.match("**/foo", "foo")
+        assert self.match("**/foo", "a/b/foo")
+        assert self.match("a/**/b", "a/b")
+        assert self.match("a/**/b", "a/x/y/b")
+        assert self.match("a/**", "a/x/y")
+        assert not self.match("a/**", "a")
+
+    def test_dir_only(self):
+        assert self.match("build/", "build", is_dir=True)
+        assert not self.match("build/", "build", is_dir=False)
+
+    def test_comments_and_blank_lines(self):
+        assert parse_ignore_line("# comment", '', '.gitignore', 1) is None
+        assert parse_ignore_line("   ", '', '.gitignore', 1) is None
+        assert self.match("\\#file", "#file")
+
+    def test_negation(self):
+        pattern = parse_ignore_line("!keep.log", '', '.gitignore', 1)
+        assert pattern.negate
+        assert pattern.matches("keep.log", False)
+
+
+class TestIgnoreMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.repo_path = tempfile.mkdtemp()
+        os.chdir(self.repo_path)
+        subprocess.run(["git", "init", "-q"], check=True)
+        for name, content in IGNORE_FILES.items():
+            self.write(name, content)
+        for path in PATHS:
+            if path in DIRECTORIES:
+                Path(path).mkdir(parents=True, exist_ok=True)
+            else:
+                self.write(path, "x")
+        for directory in DIRECTORIES:
+            self.write(f"{directory}/inside", "x")
+        self.write(".git/info/exclude", "excluded_by_info\n")
+        self.write("global_ignore", "globally_excluded\n")
+        subprocess.run(["git", "config", "core.excludesFile", os.path.join(self.repo_path, "global_ignore")],
+                       check=True)
+        subprocess.run(["git", "add", "-f", "tracked.log"], check=True)
+        self.coprocesses = GitCoprocessManager()
+
+    def tearDown(self):
+        self.coprocesses.close()
+        shutil.rmtree(self.repo_path)
+
+    def write(self, name: str, content: str):
+        Path(name).parent.mkdir(parents=True, exist_ok=True)
+        with open(name, "w") as f:
+            f.write(content)
+
+    def all_paths(self):
+        return PATHS + [f"{directory}/inside" for directory in DIRECTORIES]
+
+    def test_same_as_git_check_ignore(self):
+        paths = self.all_paths()
+        expected = self.coprocesses.check_ignore(paths)
+        assert GitIgnoreMatcher(self.repo_path).check(paths) == expected
+
+    def test_relative_to_cwd(self):
+        os.chdir("sub")
+        paths = ["a.csv", "keep.csv", "deeper/a.log", "../a.log", "nested/file"]
+        expected = self.coprocesses.check_ignore(paths)
+        assert GitIgnoreMatcher(self.repo_path).check(paths) == expected
+
+    def test_cache_follows_mtime(self):
+        matcher = GitIgnoreMatcher(self.repo_path)
+        assert not matcher.is_ignored("plain.txt")
+        with open(".gitignore", "a") as f:
+            f.write("plain.txt\n")
+        # Cached until invalidated
+        assert not matcher.is_ignored("plain.txt")
+        matcher.invalidate()
+        assert matcher.is_ignored("plain.txt")
+
+    def test_outside_repository(self):
+        with self.assertRaises(Exception):
+            GitIgnoreMatcher(self.repo_path).is_ignored("../outside")
+
+    def test_verify_mode(self):
+        matchers = IgnoreMatchers()
+        with patch("fds.utils.IGNORE_CHECK_MODE", "verify"), \
+                patch("fds.utils.IgnoreMatchers.get", return_value=matchers):
+            check_git_ignore_paths(self.all_paths())
+        assert matchers.mismatches == []
+
+    def test_matchers_share_the_repo_roots(self):
+        os.makedirs("sub/deeper", exist_ok=True)
+        os.chdir("sub/deeper")
+        invalidate_repo_roots()
+        run_git = ignore_matcher._run_git
+
+        def no_rev_parse(args, cwd):
+            assert args[0] != "rev-parse"
+            return run_git(args, cwd)
+
+        # Found like GitService finds it, without asking git
+        with patch("fds.services.ignore_matcher._run_git", side_effect=no_rev_parse):
+            matcher = IgnoreMatchers().git()
+        assert matcher.root == os.path.realpath(find_git_root())
+        assert IgnoreMatchers().git().is_ignored("a.csv")
+
+    @pytest.mark.skipif(which("dvc") is None, reason="dvc is not installed")
+    def test_same_as_dvc_check_ignore(self):
+        subprocess.run(["dvc", "init", "-q"], check=True)
+        # dvc rejects escaped trailing spaces
+        self.write(".dvcignore", IGNORE_FILES[".gitignore"].replace("space\\ \n", ""))
+        shutil.copy("sub/.gitignore", "sub/.dvcignore")
+        paths = [path for path in self.all_paths() if path not in ("tracked.log", "space ")]
+        output = subprocess.run(["dvc", "check-ignore"] + paths, stdout=subprocess.PIPE)
+        ignored = set(output.stdout.decode("utf-8").splitlines())
+        expected = {path: path in ignored for path in paths}
+        assert DvcIgnoreMatcher(self.repo_path).check(paths) == expected
@@ -0,0 +1,111 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from fds.services.ignore_writer import IgnoreWriter, compact_ignore_file, find_compactions, read_lines
+
+
+class TestIgnoreWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def __path(self, *parts: str) -> str:
+        return os.path.join(self.directory, *parts)
+
+    def __touch(self, *names: str) -> None:
+        for name in names:
+            os.makedirs(os.path.dirname(self.__path(name)), exist_ok=True)
+            open(self.__path(name), "w").close()
+
+    def test_flush_dedupes(self):
+        with open(self.__path(".gitignore"), "w") as f:
+            f.write("# data\nbig.bin\n")
+        writer = IgnoreWriter(self.directory)
+        writer.add("./big.bin")
+        writer.add("./other.bin")
+        writer.add("other.bin")
+        assert read_lines(self.__path(".gitignore")) == ["# data", "big.bin"]
+        writer.flush()
+        assert read_lines(self.__path(".gitignore")) == ["# data", "big.bin", "other.bin"]
+        assert read_lines(self.__path(".dvcignore")) == ["big.bin", "other.bin"]
+        # Nothing pending anymore
+        writer.flush()
+        assert read_lines(self.__path(".dvcignore")) == ["big.bin", "other.bin"]
+
+    def test_compact_whole_directory(self):
+        names = [f"data/file-{i}.bin" for i in range(10)]
+        self.__touch(*names)
+        lines = ["keep"] + names
+        compactions = find_compactions(self.__path(".gitignore"), lines)
+        assert [compaction.pattern for compaction in compactions] == ["/data/"]
+        assert compactions[0].apply(lines) == ["keep", "/data/"]
+
+    def test_compact_extension(self):
+        names = [f"data/file-{i}.bin" for i in range(10)]
+        self.__touch(*names, "data/labels.csv")
+        compactions = find_compactions(self.__path(".gitignore"), names)
+        assert [compaction.pattern for compaction in compactions] == ["/data/*.bin"]
+
+    def test_compact_root(self):
+        names = [f"file-{i}.bin" for i in range(10)]
+        self.__touch(*names, "labels.csv", "nested/file-0.bin")
+        # Only anchored lines, the bare names also ignore nested/file-0.bin
+        assert find_compactions(self.__path(".gitignore"), names) == []
+        anchored = [f"/{name}" for name in names]
+        compactions = find_compactions(self.__path(".gitignore"), anchored)
+        assert [compaction.pattern for compaction in compactions] == ["/*.bin"]
+
+    def test_no_compaction_ignoring_more(self):
+        names = [f"data/file-{i}.bin" for i in range(10)]
+        self.__touch(*names, "data/other.bin")
+        assert find_compactions(self.__path(".gitignore"), names) == []
+        # Too few siblings
+        assert find_compactions(self.__path(".gitignore"), names[:9]) == []
+        # Negations are left alone
+        assert find_compactions(self.__path(".gitignore"), names + ["!data/file-1.bin"]) == []
+
+    def test_flush_offers_compaction(self):
+        names = [f"logs/run-{i}.log" for i in range(10)]
+        self.__touch(*names)
+        writer = IgnoreWriter(self.directory)
+        for name in names:
+            writer.add(name)
+        offered = []
+        writer.flush(lambda compaction: offered.append(compaction.pattern) or True)
+        assert offered == ["/logs/", "/logs/"]
+        assert read_lines(self.__path(".gitignore")) == ["/logs/"]
+
+    def test_compact_ignore_file(self):
+        names = [f"data/file-{i}.bin" for i in range(10)]
+        self.__touch(*names)
+        with open(self.__path(".gitignore"), "w") as f:
+            f.write("\n".join(["a", "a"] + names) + "\n")
+        assert compact_ignore_file(self.__path(".gitignore"), lambda compaction: False) == 1
+        assert read_lines(self.__path(".gitignore")) == ["a"] + names
+        assert compact_ignore_file(self.__path(".gitignore"), lambda compaction: True) == 9
+        assert read_lines(self.__path(".gitignore")) == ["a", "/data/"]
+
+    def test_dry_run(self):
+        names = [f"data/file-{i}.bin" for i in range(10)]
+        self.__touch(*names)
+        with open(self.__path(".gitignore"), "w") as f:
+            f.write("\n".join(["a", "a"] + names) + "\n")
+        writer = IgnoreWriter(self.directory, dry_run=True)
+        writer.add("big.bin")
+        output = io.StringIO()
+        with redirect_stdout(output):
+            writer.flush()
+            assert compact_ignore_file(self.__path(".gitignore"), lambda compaction: True, dry_run=True) == 10
+        assert read_lines(self.__path(".gitignore")) == ["a", "a"] + names
+        assert not os.path.exists(self.__path(".dvcignore"))
+        assert output.getvalue().splitlines() == [
+            f"Would append big.bin to {self.__path('.gitignore')}",
+            f"Would append big.bin to {self.__path('.dvcignore')}",
+            f"Would remove 10 lines from {self.__path('.gitignore')}"]
@@ -0,0 +1,29 @@
+import unittest
+
+from fds.services.path_trie import PathTrie
+
+
+class TestPathTrie(unittest.TestCase):
+
+    def test_contains_ancestor(self):
+        trie = PathTrie()
+        trie.add("./data/images")
+        assert trie.contains_ancestor("data/images")
+        assert trie.contains_ancestor("./data/images/train/1.png")
+        assert not trie.contains_ancestor("data")
+        assert not trie.contains_ancestor("data/images2")
+        assert not trie.contains_ancestor("other")
+
+    def test_ancestor_covers_descendants(self):
+        trie = PathTrie()
+        trie.add("data/images/train")
+        trie.add("data")
+        trie.add("data/labels")
+        assert trie.contains_ancestor("data/images/test")
+        assert trie.contains_ancestor("data/labels/1.txt")
+
+    def test_root(self):
+        trie = PathTrie()
+        assert not trie.contains_ancestor(".")
+        trie.add(".")
+        assert trie.contains_ancestor("./anything/below")
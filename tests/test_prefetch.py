@@ -0,0 +1,51 @@
+import threading
+import time
+import unittest
+
+from fds.services.prefetch import Prefetcher
+
+
+class TestPrefetcher(unittest.TestCase):
+
+    def test_same_items_in_order(self):
+        with Prefetcher(range(100), 8) as items:
+            assert list(items) == list(range(100))
+
+    def test_runs_ahead_but_bounded(self):
+        produced = []
+
+        def generate():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        with Prefetcher(generate(), 4) as items:
+            assert next(items) == 0
+            time.sleep(0.2)
+            # The one taken, the queue, and the one waiting to be queued
+            assert 4 <= len(produced) <= 6
+
+    def test_errors_are_raised_in_the_consumer(self):
+        def generate():
+            yield 1
+            raise ValueError("broken")
+
+        with Prefetcher(generate(), 4) as items:
+            assert next(items) == 1
+            with self.assertRaises(ValueError):
+                next(items)
+
+    def test_close_cancels_the_worker(self):
+        closed = threading.Event()
+
+        def generate():
+            try:
+                while True:
+                    yield 1
+            finally:
+                closed.set()
+
+        items = Prefetcher(generate(), 2)
+        next(items)
+        items.close()
+        assert closed.is_set()
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fds.services.dvc_backend import InProcessDvcBackend, get_in_process_incompatibility
+from fds.services.prehash import PreHasher, collect_files, md5_file
+from fds.services.repo_root import invalidate_repo_roots
+
+
+class TestPreHash(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_md5(self):
+        data = os.urandom(3 * 1024 + 7)
+        path = self.write("data.bin", data)
+        # Chunks smaller than the file, the last one partial
+        hashed = md5_file(path, chunk_size=1024)
+        assert hashed.md5 == hashlib.md5(data).hexdigest()
+        st = os.stat(path)
+        assert (hashed.size, hashed.inode, hashed.mtime) == (st.st_size, st.st_ino, st.st_mtime)
+        assert md5_file(self.write("empty", b"")).md5 == hashlib.md5(b"").hexdigest()
+        assert md5_file(os.path.join(self.root, "missing")) is None
+
+    def test_md5_without_mmap(self):
+        data = os.urandom(5000)
+        path = self.write("data.bin", data)
+        with patch("fds.services.prehash.mmap.mmap", side_effect=OSError("can't map")):
+            assert md5_file(path, chunk_size=1024).md5 == hashlib.md5(data).hexdigest()
+
+    def test_changed_while_hashing(self):
+        path = self.write("data.bin", b"before")
+        real_stat = os.stat
+
+        def stat(p, *args, **kwargs):
+            # The file is written to while it is hashed
+            with open(path, "ab") as f:
+                f.write(b"after")
+            return real_stat(p, *args, **kwargs)
+
+        with patch("fds.services.prehash.os.stat", side_effect=stat):
+            assert md5_file(path) is None
+
+    def test_collect_files(self):
+        self.write("large.bin", b"x" * 100)
+        self.write("small.txt", b"x")
+        self.write("dir/nested/large.bin", b"x" * 200)
+        self.write("dir/.dvc/cache/large", b"x" * 200)
+        files = collect_files([self.root, os.path.join(self.root, "missing")], min_size=100)
+        assert sorted(files) == [(os.path.join(self.root, "dir", "nested", "large.bin"), 200),
+                                 (os.path.join(self.root, "large.bin"), 100)]
+
+    def test_hash_files(self):
+        first = self.write("first.bin", b"1" * 100)
+        second = self.write("dir/second.bin", b"2" * 300)
+        self.write("small.bin", b"3")
+        reports = []
+        hashed = PreHasher(jobs=2, min_size=100, report=reports.append).hash_files(
+            [first, os.path.join(self.root, "dir"), os.path.join(self.root, "small.bin")])
+        assert {path: file.md5 for path, file in hashed.items()} == {
+            first: hashlib.md5(b"1" * 100).hexdigest(), second: hashlib.md5(b"2" * 300).hexdigest()}
+        assert len(reports) == 2 and reports[-1].startswith("Hashed 2/2 files")
+        assert PreHasher(jobs=0, min_size=0).hash_files([first]) == {}
+
+
+@unittest.skipIf(shutil.which("dvc") is None or get_in_process_incompatibility() is not None,
+                 "dvc can't run in process")
+class TestPreHashedAdd(unittest.TestCase):
+
+    def setUp(self):
+        self.repo_path = tempfile.mkdtemp()
+        os.chdir(self.repo_path)
+        subprocess.run(["dvc", "init", "--no-scm", "-q"], check=True)
+        invalidate_repo_roots()
+        self.backend = InProcessDvcBackend()
+
+    def tearDown(self):
+        self.backend.close()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.repo_path)
+
+    def test_dvc_uses_the_hashes(self):
+        data = os.urandom(4096)
+        os.makedirs("dir")
+        for path in ("large.bin", os.path.join("dir", "large.bin")):
+            with open(path, "wb") as f:
+                f.write(data + path.encode())
+        with open("small.bin", "wb") as f:
+            f.write(b"small")
+        from dvc_data.hashfile import hash as dvc_hash
+        real_hash_file = dvc_hash._hash_file
+        with patch("fds.services.prehash.PREHASH_JOBS", 2), \
+                patch("fds.services.dvc_backend.PreHasher", side_effect=lambda **kwargs: PreHasher(
+                    min_size=1024, **kwargs)), \
+                patch.object(dvc_hash, "_hash_file", side_effect=real_hash_file) as hash_file:
+            self.backend.add(["large.bin", "dir", "small.bin"])
+        # dvc only hashed the small file itself, and the listing of the directory
+        hashed = [call[0][0] for call in hash_file.call_args_list if not call[0][0].startswith("memory://")]
+        assert hashed == [os.path.join(self.repo_path, "small.bin")]
+        md5 = hashlib.md5(data + b"large.bin").hexdigest()
+        with open("large.bin.dvc") as f:
+            assert f"md5: {md5}" in f.read()
+        assert os.path.exists(os.path.join(".dvc", "cache", "files", "md5", md5[:2], md5[2:]))
+        assert self.backend.status().stdout == b"{}"
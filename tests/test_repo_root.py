@@ -0,0 +1,96 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fds.services.repo_root import ExoticLayout, find_dvc_root, find_git_root, invalidate_repo_roots
+
+
+def _git(*args, cwd):
+    subprocess.run(["git", *args], cwd=cwd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+class TestRepoRoot(unittest.TestCase):
+
+    def setUp(self):
+        invalidate_repo_roots()
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        self.repo = os.path.join(self.root, "repo")
+        os.makedirs(os.path.join(self.repo, "data", "images"))
+        _git("init", "-q", self.repo, cwd=self.root)
+        self.env = patch.dict(os.environ)
+        self.env.start()
+        for variable in ("GIT_DIR", "GIT_WORK_TREE", "GIT_CEILING_DIRECTORIES", "GIT_DISCOVERY_ACROSS_FILESYSTEM"):
+            os.environ.pop(variable, None)
+
+    def tearDown(self):
+        self.env.stop()
+        invalidate_repo_roots()
+        shutil.rmtree(self.root)
+
+    def test_git_root_from_sub_directory(self):
+        assert find_git_root(os.path.join(self.repo, "data", "images")) == self.repo
+        assert find_git_root(self.repo) == self.repo
+
+    def test_git_root_of_worktree(self):
+        _git("-c", "user.name=fds", "-c", "user.email=fds@example.com", "commit", "-q", "--allow-empty", "-m", "init",
+             cwd=self.repo)
+        worktree = os.path.join(self.root, "worktree")
+        _git("worktree", "add", "-q", worktree, cwd=self.repo)
+        os.makedirs(os.path.join(worktree, "sub"))
+        assert os.path.isfile(os.path.join(worktree, ".git"))
+        assert find_git_root(os.path.join(worktree, "sub")) == worktree
+
+    def test_git_root_of_submodule(self):
+        # Like git submodule absorbgitdirs lays it out
+        module = os.path.join(self.repo, "module")
+        git_dir = os.path.join(self.repo, ".git", "modules", "module")
+        os.makedirs(os.path.dirname(git_dir))
+        _git("init", "-q", "--separate-git-dir", git_dir, module, cwd=self.repo)
+        _git("config", "core.worktree", "../../../module", cwd=module)
+        assert find_git_root(module) == module
+        # A work tree configured somewhere else is left to git
+        _git("config", "core.worktree", "../../../data", cwd=module)
+        invalidate_repo_roots()
+        with self.assertRaises(ExoticLayout):
+            find_git_root(module)
+
+    def test_git_root_not_found(self):
+        outside = os.path.join(self.root, "outside")
+        os.makedirs(outside)
+        assert find_git_root(outside) is None
+
+    def test_git_environment_is_exotic(self):
+        with patch.dict(os.environ, {"GIT_DIR": os.path.join(self.repo, ".git")}):
+            with self.assertRaises(ExoticLayout):
+                find_git_root(self.repo)
+
+    def test_inside_git_directory_is_exotic(self):
+        with self.assertRaises(ExoticLayout):
+            find_git_root(os.path.join(self.repo, ".git", "objects"))
+
+    def test_dvc_root_of_sub_directory(self):
+        os.makedirs(os.path.join(self.repo, "data", ".dvc"))
+        assert find_dvc_root(os.path.join(self.repo, "data", "images")) == os.path.join(self.repo, "data")
+        assert find_dvc_root(self.repo) is None
+
+    def test_current_directory(self):
+        os.makedirs(os.path.join(self.repo, ".dvc"))
+        os.chdir(os.path.join(self.repo, "data"))
+        try:
+            assert find_git_root() == self.repo
+            assert find_dvc_root() == self.repo
+        finally:
+            os.chdir(tempfile.gettempdir())
+
+    def test_only_found_roots_are_memoized(self):
+        images = os.path.join(self.repo, "data", "images")
+        assert find_dvc_root(images) is None
+        os.makedirs(os.path.join(self.repo, ".dvc"))
+        assert find_dvc_root(images) == self.repo
+        shutil.rmtree(os.path.join(self.repo, ".dvc"))
+        assert find_dvc_root(images) == self.repo
+        invalidate_repo_roots()
+        assert find_dvc_root(images) is None
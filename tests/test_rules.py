@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fds.services.rules import RuleCandidate, RuleSet, RULES_FILE_NAME, get_extensions
+
+RULES = """
+default: skip
+rules:
+  - glob: "data/raw/"
+    action: ignore
+  - glob: "data/**/*.parquet"
+    action: dvc
+  - extension: [log, .TMP]
+    action: ignore
+  - glob: "*.csv"
+    max_size: 1MB
+    action: git
+  - type: dir
+    min_files: 100
+    action: dvc
+  - glob: checkpoints
+    action: skip
+"""
+
+
+class TestRules(unittest.TestCase):
+
+    def setUp(self):
+        self.repo_path = tempfile.mkdtemp()
+        with open(os.path.join(self.repo_path, RULES_FILE_NAME), "w") as f:
+            f.write(RULES)
+        self.rules = RuleSet.load(self.repo_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_path)
+
+    def choice(self, path: str, is_dir: bool = False, size: int = 0, file_count=None, auto: bool = False):
+        return self.rules.get_choice(RuleCandidate(path, is_dir, lambda: size, file_count), auto)
+
+    def test_globs(self):
+        assert self.choice("data/raw", is_dir=True) == "Ignore"
+        assert self.choice("data/raw") is None
+        assert self.choice("data/a/b/x.parquet") == "Add to DVC"
+        assert self.choice("other/x.parquet") is None
+        assert self.choice("a/b/checkpoints", is_dir=True) == "Skip"
+
+    def test_extensions(self):
+        assert self.choice("a/b.LOG") == "Ignore"
+        assert self.choice("b.tmp") == "Ignore"
+        assert get_extensions("a/b.tar.gz") == [".tar.gz", ".gz"]
+        assert get_extensions(".hidden") == []
+
+    def test_size_and_file_count(self):
+        assert self.choice("small.csv", size=100) == "Add to Git"
+        assert self.choice("big.csv", size=2 * 1000 * 1000) is None
+        assert self.choice("many", is_dir=True, file_count=1000) == "Add to DVC"
+        assert self.choice("few", is_dir=True, file_count=10) is None
+        assert self.choice("unknown", is_dir=True) is None
+
+    def test_first_rule_wins(self):
+        # Matches both the ignore glob and the file count rule
+        assert self.choice("data/raw", is_dir=True, file_count=1000) == "Ignore"
+
+    def test_size_is_lazy(self):
+        def get_size():
+            raise AssertionError("size should not be needed")
+        assert self.rules.get_choice(RuleCandidate("a.log", False, get_size, 1)) == "Ignore"
+
+    def test_auto(self):
+        assert self.choice("nothing.bin") is None
+        assert self.choice("nothing.bin", auto=True) == "Skip"
+        assert RuleSet.load(tempfile.gettempdir() + "/missing").get_choice(
+            RuleCandidate("x", False, lambda: 0, 1), auto=True) == "Add to DVC"
+
+    def test_invalid_rules(self):
+        for rules in ["rules: [{glob: x}]", "rules: [{glob: x, action: nope}]",
+                      "rules: [{glob: x, action: dvc, unknown: 1}]", "rules: [{min_size: big, action: dvc}]",
+                      "default: step_into", "rules: {glob: x}"]:
+            with open(os.path.join(self.repo_path, RULES_FILE_NAME), "w") as f:
+                f.write(rules)
+            with self.assertRaises(Exception):
+                RuleSet.load(self.repo_path)
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fds.services.fds_dir import FDS_DIR
+from fds.services.scan_index import ScanIndex, INDEX_FILE_NAME
+from fds.services.scanner import scan_dir
+from fds.services.size_tree import SizeTree
+
+
+class TestScanIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.write("a/b/file-1", 10)
+        self.write("a/file-2", 20)
+        self.write("c/file-3", 5)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name: str, size: int):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+
+    def build(self, **kwargs):
+        index = ScanIndex(self.root, **kwargs)
+        try:
+            return SizeTree.build(self.root, [FDS_DIR], index)
+        finally:
+            index.close()
+
+    def test_unchanged_dirs_are_not_listed(self):
+        self.build()
+        with patch("fds.services.size_tree.scan_dir", wraps=scan_dir) as listed:
+            tree = self.build()
+        assert listed.call_count == 0
+        assert tree.get_size(self.root) == 35
+
+    def test_changed_dirs_are_listed(self):
+        self.build()
+        self.write("a/b/file-4", 100)
+        with patch("fds.services.size_tree.scan_dir", wraps=scan_dir) as listed:
+            tree = self.build()
+        assert [call[0][0] for call in listed.call_args_list] == [os.path.join(self.root, "a", "b")]
+        assert tree.get_size(os.path.join(self.root, "a")) == 130
+
+    def test_files_changed_in_place(self):
+        self.build()
+        with open(os.path.join(self.root, "c", "file-3"), "ab") as f:
+            f.write(b"x" * 1000)
+        tree = self.build()
+        assert tree.get_size(os.path.join(self.root, "c")) == 1005
+
+    def test_trust_mtime(self):
+        self.build()
+        with patch.object(SizeTree, "_is_unchanged") as is_unchanged:
+            self.build(trust_mtime=True)
+        assert is_unchanged.call_count == 0
+
+    def test_removed_dirs_are_dropped(self):
+        self.build()
+        shutil.rmtree(os.path.join(self.root, "a"))
+        tree = self.build()
+        assert tree.get_size(self.root) == 5
+        index = ScanIndex(self.root)
+        assert index.get_size(os.path.join(self.root, "a", "b")) is None
+        assert index.get_size(os.path.join(self.root, "c")) == 5
+        index.close()
+
+    def test_corrupt_index(self):
+        self.build()
+        with open(os.path.join(self.root, FDS_DIR, INDEX_FILE_NAME), "wb") as f:
+            f.write(b"not a database" * 100)
+        tree = self.build()
+        assert tree.get_size(self.root) == 35
+
+    def test_rebuild(self):
+        self.build()
+        with patch("fds.services.size_tree.scan_dir", wraps=scan_dir) as listed:
+            self.build(rebuild=True)
+        assert listed.call_count == 4
+
+    def test_fds_dir_is_git_ignored(self):
+        ScanIndex(self.root).close()
+        with open(os.path.join(self.root, FDS_DIR, ".gitignore")) as f:
+            assert f.read() == "*\n"
+
+    def test_in_memory(self):
+        tree = self.build(in_memory=True)
+        assert tree.get_size(self.root) == 35
+        assert not os.path.exists(os.path.join(self.root, FDS_DIR))
+        self.build()
+        # Even when rebuilding, the index on disk is left alone
+        ScanIndex(self.root, rebuild=True, in_memory=True).close()
+        assert os.path.exists(os.path.join(self.root, FDS_DIR, INDEX_FILE_NAME))
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fds.services.scanner import ParallelScanner, EntryKind, scan_dir
+
+
+class TestParallelScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for name in ["b/2/file", "b/1/file", "a/file", "c/x/y/file", "c/file", "top", ".git/HEAD"]:
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"x" * len(name))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def expected_walk(self):
+        walk = []
+        for root, dirs, files in os.walk(self.root):
+            dirs[:] = sorted(d for d in dirs if d != ".git")
+            walk.append((root, dirs[:], sorted(files)))
+        return walk
+
+    def test_scan_dir(self):
+        entries = scan_dir(self.root)
+        assert [entry[0] for entry in entries] == [".git", "a", "b", "c", "top"]
+        assert entries[-1][1] == EntryKind.FILE
+        assert entries[-1][2] == 3
+        assert scan_dir(os.path.join(self.root, "missing")) == []
+
+    def test_walk_is_sorted_depth_first(self):
+        for jobs in (1, 4):
+            with ParallelScanner(jobs) as scanner:
+                walk = [(root, dirs[:], files) for root, dirs, files in scanner.walk(self.root, [".git"])]
+            assert walk == self.expected_walk()
+
+    def test_walk_prunes(self):
+        with ParallelScanner(4) as scanner:
+            roots = []
+            for root, dirs, _ in scanner.walk(self.root, [".git"]):
+                roots.append(os.path.relpath(root, self.root))
+                if "b" in dirs:
+                    dirs.remove("b")
+        assert roots == [".", "a", "c", os.path.join("c", "x"), os.path.join("c", "x", "y")]
+
+    def test_parallel_tree_is_same_as_serial(self):
+        with ParallelScanner(1) as scanner:
+            serial = dict(scanner.list_tree(self.root, [".git"]))
+        with ParallelScanner(4) as scanner:
+            listed = list(scanner.list_tree(self.root, [".git"]))
+        assert dict(listed) == serial
+        # Parents always come before their sub directories
+        order = [path for path, _ in listed]
+        for path in order[1:]:
+            assert order.index(os.path.dirname(path)) < order.index(path)
@@ -0,0 +1,53 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from fds.services.size_probe import LazySize, SizeProbe, probe_size
+
+
+class TestSizeProbe(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.write("small", 10)
+        self.write("a/big", 1000)
+        self.write("a/b/medium", 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name: str, size: int):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+
+    def test_exact_below_limit(self):
+        assert probe_size(self.root, 10000) == SizeProbe(1110, True)
+        assert probe_size(os.path.join(self.root, "small"), 1) == SizeProbe(10, True)
+
+    def test_stops_at_limit(self):
+        probe = probe_size(self.root, 500)
+        assert not probe.exact
+        assert 500 <= probe.size < 1110
+        assert str(probe).startswith("at least")
+
+    def test_hardlinks_counted_once(self):
+        os.link(os.path.join(self.root, "a", "big"), os.path.join(self.root, "link"))
+        assert probe_size(self.root, 10000).size == 1110
+
+    def test_sparse_files(self):
+        with open(os.path.join(self.root, "sparse"), "wb") as f:
+            f.truncate(100 * 1024 * 1024)
+        # Git would store all of it, so it counts towards the threshold in full
+        assert probe_size(os.path.join(self.root, "sparse"), sys.maxsize) == SizeProbe(100 * 1024 * 1024, True)
+
+    def test_lazy_size(self):
+        assert LazySize(self.root).get() == 1110
+        assert LazySize(self.root, 5).get() == 5
+        LazySize.shutdown()
+        # Started again when needed
+        assert LazySize(self.root).get() == 1110
+        LazySize.shutdown()
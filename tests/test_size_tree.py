@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fds.services.size_tree import SizeTree
+
+
+class TestSizeTree(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.write("a/b/file-1", 10)
+        self.write("a/b/file-2", 20)
+        self.write("a/file-3", 5)
+        self.write("c/b/file-1", 7)
+        self.write("top", 3)
+        os.makedirs(os.path.join(self.root, "empty"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name: str, size: int):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+
+    def test_aggregated_sizes(self):
+        tree = SizeTree.build(self.root)
+        assert tree.get_size(self.root) == 45
+        assert tree.get_size(os.path.join(self.root, "a")) == 35
+        assert tree.get_size(os.path.join(self.root, "a", "b")) == 30
+        assert tree.get_size(os.path.join(self.root, "a", "b", "file-2")) == 20
+        assert tree.get_size(os.path.join(self.root, "c", "b")) == 7
+        assert tree.get_size(os.path.join(self.root, "empty")) == 0
+
+    def test_without_files(self):
+        tree = SizeTree.build(self.root, keep_files=False)
+        full = SizeTree.build(self.root)
+        for path in ["", "a", "a/b", "c", "c/b", "empty"]:
+            path = os.path.join(self.root, path)
+            assert tree.get_size(path) == full.get_size(path)
+            assert tree.get_file_count(path) == full.get_file_count(path)
+        assert tree.get_size(os.path.join(self.root, "a", "file-3")) is None
+        assert len(tree) == 6
+
+    def test_file_counts(self):
+        tree = SizeTree.build(self.root)
+        assert tree.get_file_count(self.root) == 5
+        assert tree.get_file_count(os.path.join(self.root, "a")) == 3
+        assert tree.get_file_count(os.path.join(self.root, "a", "file-3")) == 1
+        assert tree.get_file_count(os.path.join(self.root, "empty")) == 0
+        assert tree.get_file_count(os.path.join(self.root, "missing")) is None
+
+    def test_relative_paths(self):
+        os.chdir(self.root)
+        tree = SizeTree.build(".")
+        assert tree.get_size(".") == 45
+        assert tree.get_size("./a/b") == 30
+        assert tree.get_size("a/file-3") == 5
+
+    def test_missing_paths(self):
+        tree = SizeTree.build(os.path.join(self.root, "a"))
+        assert tree.get_size(os.path.join(self.root, "c")) is None
+        assert tree.get_size(os.path.join(self.root, "a", "missing")) is None
+        assert os.path.join(self.root, "a", "b") in tree
+        assert tree.is_dir(os.path.join(self.root, "a", "b"))
+        assert not tree.is_dir(os.path.join(self.root, "a", "file-3"))
+
+    def test_names_are_interned(self):
+        tree = SizeTree.build(self.root)
+        # Both `b` dirs and both `file-1` files share the same name entry
+        assert len(tree._names) < len(tree)
+
+    def test_file_root(self):
+        tree = SizeTree.build(os.path.join(self.root, "top"))
+        assert tree.get_size(os.path.join(self.root, "top")) == 3
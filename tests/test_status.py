@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fds.domain.constants import MAX_THRESHOLD_SIZE
+from fds.services.status import RepoStatus, StatusEntry, add_sizes, get_dvc_targets, parse_dvc_status, \
+    parse_git_status
+
+
+class TestStatus(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.directory)
+
+    def test_parse_git_status(self):
+        output = b"\0".join([
+            b"# branch.oid 1234",
+            b"# branch.head main",
+            b"1 .M N... 100644 100644 100644 aaaa aaaa file with spaces.txt",
+            b"1 AM N... 000000 100644 100644 0000 bbbb new.txt",
+            b"2 R. N... 100644 100644 100644 cccc cccc R100 sub/t.txt",
+            b"sub/s.txt",
+            b"u UU N... 100644 100644 100644 100644 d e f conflict.txt",
+            b"? data/",
+            b"",
+        ])
+        status = parse_git_status(output)
+        assert status.branch == "main"
+        assert [(e.path, e.state, e.original_path) for e in status.tracked] == [
+            ("new.txt", "added", None), ("sub/t.txt", "renamed", "sub/s.txt")]
+        assert [(e.path, e.state) for e in status.modified] == [
+            ("file with spaces.txt", "modified"), ("new.txt", "modified"), ("conflict.txt", "unmerged")]
+        assert [e.path for e in status.untracked] == ["data/"]
+
+    def test_parse_dvc_status(self):
+        output = b'{"data.dvc": [{"changed outs": {"data": "modified"}}], "train": ["always changed"]}'
+        entries = parse_dvc_status(output, os.path.abspath(os.curdir))
+        assert [(e.path, e.state, e.stage) for e in entries] == [
+            ("data", "modified", "data.dvc"), ("train", "always changed", "train")]
+        assert parse_dvc_status(b"{}", os.curdir) == []
+
+    def test_dvc_targets(self):
+        os.mkdir("dir")
+        for name in ("data.dvc", "plain.txt"):
+            open(name, "w").close()
+        assert get_dvc_targets(["dir", "data", "data.dvc", "plain.txt"]) == ["dir", "data", "data.dvc"]
+
+    def test_untracked_large(self):
+        with open(os.path.join(self.directory, "big"), "wb") as f:
+            f.write(b"x" * MAX_THRESHOLD_SIZE)
+        os.mkdir(os.path.join(self.directory, "small"))
+        with open(os.path.join(self.directory, "small", "a"), "wb") as f:
+            f.write(b"x")
+        status = RepoStatus(untracked=[StatusEntry("big", "untracked"), StatusEntry("small/", "untracked")])
+        add_sizes(status, self.directory)
+        assert [(e.path, e.size) for e in status.untracked_large] == [("big", MAX_THRESHOLD_SIZE)]
+        assert [(e.path, e.size) for e in status.untracked] == [("small/", 1)]
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from fds.services.toolchain import Toolchain, get_capabilities
+
+
+class TestToolchain(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.bin = os.path.join(self.directory, "bin")
+        os.makedirs(self.bin)
+        self.cache_path = os.path.join(self.directory, "cache", "toolchain.json")
+        self.probes = os.path.join(self.directory, "probes")
+        self.env = patch.dict(os.environ, {"PATH": self.bin})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        shutil.rmtree(self.directory)
+
+    def _install(self, name: str, version: str) -> str:
+        # Records every time it is run
+        path = os.path.join(self.bin, name)
+        with open(path, "w") as f:
+            f.write(f"#!/bin/sh\necho {name} >> {self.probes}\necho '{name} version {version}'\n")
+        os.chmod(path, 0o755)
+        return path
+
+    def _count_probes(self) -> int:
+        if not os.path.exists(self.probes):
+            return 0
+        with open(self.probes) as f:
+            return len(f.read().splitlines())
+
+    def test_not_found(self):
+        toolchain = Toolchain(self.cache_path)
+        assert toolchain.find("git") is None
+        with self.assertRaises(Exception):
+            toolchain.get_version("git")
+
+    def test_version_is_cached(self):
+        path = self._install("git", "2.30.1")
+        toolchain = Toolchain(self.cache_path)
+        assert toolchain.find("git").path == path
+        # Finding it doesn't run it
+        assert self._count_probes() == 0
+        assert toolchain.get_version("git") == "git version 2.30.1"
+        assert toolchain.supports("git", "pathspec_from_file")
+        assert self._count_probes() == 1
+        # Another fds command
+        toolchain = Toolchain(self.cache_path)
+        assert toolchain.get_version("git") == "git version 2.30.1"
+        assert toolchain.supports("git", "porcelain_v2")
+        assert self._count_probes() == 1
+
+    def test_replaced_executable_is_probed_again(self):
+        self._install("git", "2.20.0")
+        toolchain = Toolchain(self.cache_path)
+        assert not toolchain.supports("git", "pathspec_from_file")
+        # The mtime has to change even on file systems with a coarse one
+        time.sleep(0.01)
+        path = self._install("git", "2.39.5")
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        toolchain = Toolchain(self.cache_path)
+        assert toolchain.supports("git", "pathspec_from_file")
+        assert self._count_probes() == 2
+
+    def test_uninstalled(self):
+        path = self._install("dvc", "3.0.0")
+        toolchain = Toolchain(self.cache_path)
+        assert toolchain.find("dvc") is not None
+        os.remove(path)
+        assert Toolchain(self.cache_path).find("dvc") is None
+
+    def test_versions_probed_together(self):
+        self._install("git", "2.39.5")
+        self._install("dvc", "3.0.0")
+        toolchain = Toolchain(self.cache_path)
+        assert toolchain.get_versions(["git", "dvc"]) == ["git version 2.39.5", "dvc version 3.0.0"]
+        assert self._count_probes() == 2
+
+    def test_concurrent_lookups(self):
+        names = [f"tool{i}" for i in range(8)]
+        for name in names:
+            self._install(name, "1.0")
+        toolchain = Toolchain(self.cache_path)
+        # Like the hooks, which check git and dvc on their own threads
+        with ThreadPoolExecutor(max_workers=len(names)) as executor:
+            versions = list(executor.map(toolchain.get_version, names))
+        assert versions == [f"{name} version 1.0" for name in names]
+        assert len(Toolchain(self.cache_path).tools) == len(names)
+
+    def test_capabilities(self):
+        assert get_capabilities("git", "git version 2.25.0") == {"pathspec_from_file": True, "porcelain_v2": True}
+        assert get_capabilities("git", "git version 2.10.5") == {"pathspec_from_file": False, "porcelain_v2": False}
+        assert get_capabilities("git", "unexpected") == {"pathspec_from_file": False, "porcelain_v2": False}
+        assert get_capabilities("dvc", "3.0.0") == {}
@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from fds.services.update_check import PYPI_URL, UpdateCheck
+
+
+class TestUpdateCheck(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.directory, "fds", "update_check.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write_cache(self, version, age):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path, "w") as f:
+            json.dump({"checked_at": time.time() - age, "version": version}, f)
+
+    @patch('requests.get')
+    def test_lookup(self, mock_get):
+        mock_get.return_value.json.return_value = {"info": {"version": "9.9.9"}}
+        check = UpdateCheck(self.cache_path, ttl=60, enabled=True)
+        check.start()
+        check.thread.join()
+        mock_get.assert_called_once()
+        assert mock_get.call_args[0] == (PYPI_URL,)
+        assert mock_get.call_args[1]["timeout"] > 0
+        assert check.get_newer_version("0.6.0") == "9.9.9"
+        assert check.get_newer_version("9.9.9") is None
+        assert check.read_cache()["version"] == "9.9.9"
+
+    @patch('requests.get')
+    def test_cached(self, mock_get):
+        self._write_cache("9.9.9", age=10)
+        check = UpdateCheck(self.cache_path, ttl=60, enabled=True)
+        check.start()
+        assert check.thread is None
+        assert mock_get.call_count == 0
+        assert check.get_newer_version("0.6.0") == "9.9.9"
+
+    @patch('requests.get')
+    def test_expired_cache(self, mock_get):
+        self._write_cache("1.0.0", age=120)
+        mock_get.return_value.json.return_value = {"info": {"version": "9.9.9"}}
+        check = UpdateCheck(self.cache_path, ttl=60, enabled=True)
+        check.start()
+        check.thread.join()
+        assert check.get_newer_version("0.6.0") == "9.9.9"
+
+    @patch('requests.get')
+    def test_network_unavailable(self, mock_get):
+        mock_get.side_effect = requests.ConnectionError("Network is unreachable")
+        check = UpdateCheck(self.cache_path, ttl=60, enabled=True)
+        check.start()
+        check.thread.join()
+        assert check.get_newer_version("0.6.0") is None
+        # The failure is remembered too, PyPI isn't tried again until the TTL expires
+        check = UpdateCheck(self.cache_path, ttl=60, enabled=True)
+        check.start()
+        assert check.thread is None
+        assert mock_get.call_count == 1
+
+    @patch('requests.get')
+    def test_disabled(self, mock_get):
+        check = UpdateCheck(self.cache_path, ttl=60, enabled=False)
+        check.start()
+        assert check.thread is None
+        assert mock_get.call_count == 0
+        assert check.get_newer_version("0.6.0") is None
+        assert not os.path.exists(self.cache_path)
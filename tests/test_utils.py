@@ -1,6 +1,13 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
 import unittest
+from unittest.mock import patch
 
-from fds.utils import get_git_repo_name_from_url, construct_dvc_url_from_git_url_dagshub
+from fds.utils import get_git_repo_name_from_url, construct_dvc_url_from_git_url_dagshub, execute_command, \
+    execute_commands, write_file_atomically
 
 
 class TestFds(unittest.TestCase):
@@ -20,3 +27,43 @@ class TestFds(unittest.TestCase):
     def test_construct_dvc_url_from_git_url_dagshub(self):
         repo_url = construct_dvc_url_from_git_url_dagshub("https://github.com/DAGsHub/fds.git")
         assert repo_url == "https://github.com/DAGsHub/fds.dvc"
+
+    def test_execute_commands_concurrently(self):
+        sleep = [sys.executable, "-c", "import time; time.sleep(0.5)"]
+        start = time.monotonic()
+        execute_commands([sleep, sleep, sleep])
+        assert time.monotonic() - start < 1.2
+
+    def test_execute_commands_in_order(self):
+        shown = []
+        results = execute_commands([
+            [sys.executable, "-c", "import time; time.sleep(0.3); print('first')"],
+            [sys.executable, "-c", "import os, sys; print(os.environ['FDS_TEST']); sys.exit(3)"],
+            ["fds-command-which-does-not-exist"],
+        ], lambda index, result: shown.append((index, result.stdout.strip())), env={"FDS_TEST": "second"})
+        # The output is kept per command, and shown in the order of the commands even if they finish in another one
+        assert shown == [(0, b"first"), (1, b"second"), (2, b"")]
+        assert [result.returncode for result in results] == [0, 3, 127]
+
+    def test_only_changing_commands_invalidate_ignore_checks(self):
+        with patch("fds.utils.invalidate_ignore_checks") as invalidate:
+            # Read only, e.g. the dvc check-ignore of every walk step with FDS_IGNORE_CHECK=subprocess
+            execute_command(["git", "status", "--porcelain"], ignorable_return_codes=[0, 128])
+            execute_commands([["git", "--version"], ["git", "rev-parse", "--show-toplevel"]])
+            invalidate.assert_not_called()
+            execute_commands([["git", "--version"], ["git", "config", "fds.test"]])
+            invalidate.assert_called_once_with()
+
+    def test_write_file_atomically(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, "sub", "file")
+        write_file_atomically(filename, "first")
+        assert os.stat(filename).st_mode & 0o777 == 0o644
+        os.chmod(filename, 0o600)
+        write_file_atomically(filename, "second")
+        with open(filename) as f:
+            assert f.read() == "second"
+        # The permissions are kept, and nothing is left behind
+        assert os.stat(filename).st_mode & 0o777 == 0o600
+        assert os.listdir(os.path.dirname(filename)) == ["file"]